@@ -1,25 +1,29 @@
 import os
 import json
+import shutil
+import hashlib
 import datetime
 from logger import log_action
+from report_stream import latest_report_path, read_report_header, iter_tests, load_report, file_digest
+from history_store import ANALYSIS_STATE_FILE
 from trend_analyzer import analyze_trends
+from flakiness_analytics import analyze_flakiness
+from drift_detector import detect_drift
 
 # --- Constants ---
-EXECUTION_REPORT_FILE = "execution_report.json"
 AGENT_MEMORY_FILE = "agent_memory.json"
 ANALYSIS_PACKAGE_FILE = os.path.join("reports", "ai_analysis_package.json")
+ARTIFACTS_DIR = os.path.join("reports", "artifacts")  # Full sections, referenced from packages by artifact ID
 READY_FLAG_FILE = "READY_FOR_AI_ANALYSIS.flag"
+TOKEN_BUDGET_ENV = "TACHTACH_PACKAGE_TOKENS"
+DEFAULT_TOKEN_BUDGET = 8000  # Fits comfortably in the dashboard prompt alongside its template
+CHARS_PER_TOKEN = 4  # Rough estimate for JSON text
+MAX_ERROR_CHARS = 300  # Error messages are truncated in the package (full text is in the report artifact)
+ARTIFACT_EXTENSIONS = (".json", ".ndjson.gz", ".ndjson")
 
 def get_latest_report():
-    """Loads the main execution report."""
-    if not os.path.exists(EXECUTION_REPORT_FILE):
-        return None
-    try:
-        with open(EXECUTION_REPORT_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        log_action(f"Error loading execution report: {e}", is_error=True)
-        return None
+    """Loads the whole latest execution report (prefer the streaming readers for large runs)."""
+    return load_report()
 
 def get_agent_goals():
     """Loads just the goals from the agent's memory."""
@@ -33,29 +37,217 @@ def get_agent_goals():
         log_action(f"Error loading agent goals: {e}", is_error=True)
         return {}
 
-def create_analysis_package():
+# --- Package State & Artifacts ---
+
+def load_package_state():
+    """Loads what the previous package reported (empty on the first run)."""
+    if not os.path.exists(ANALYSIS_STATE_FILE):
+        return {}
+    try:
+        with open(ANALYSIS_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        log_action(f"Error loading analysis package state, building a full package: {e}", is_error=True)
+        return {}
+
+def save_package_state(state):
+    try:
+        with open(ANALYSIS_STATE_FILE, 'w') as f:
+            json.dump(state, f)
+    except Exception as e:
+        log_action(f"Error saving analysis package state: {e}", is_error=True)
+
+def _touch(path):
+    """Marks a reused artifact as recent, so history roll-up doesn't release it."""
+    try:
+        os.utime(path)
+    except OSError as e:
+        log_action(f"Could not touch artifact {path}: {e}", is_error=True)
+
+def store_artifact(section, data):
+    """
+    Writes a large section to reports/artifacts/ under a content-addressed ID
+    (unchanged sections are not rewritten, only touched).
+    :return: The artifact ID, or None if it could not be written.
+    """
+    body = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    artifact_id = f"{section}-{hashlib.sha1(body.encode('utf-8')).hexdigest()[:12]}"
+    path = os.path.join(ARTIFACTS_DIR, f"{artifact_id}.json")
+    if os.path.exists(path):
+        _touch(path)
+    else:
+        try:
+            os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(body)
+        except Exception as e:
+            log_action(f"Error writing artifact {artifact_id}: {e}", is_error=True)
+            return None
+    return artifact_id
+
+def store_file_artifact(section, path):
+    """
+    Copies a file (e.g. the report stream) to reports/artifacts/ under a
+    content-addressed ID, keeping its extension.
+    :return: The artifact ID, or None if it could not be stored.
+    """
+    try:
+        artifact_id = f"{section}-{file_digest(path)[:12]}"
+        extension = next((ext for ext in ARTIFACT_EXTENSIONS if path.endswith(ext)), "")
+        target = os.path.join(ARTIFACTS_DIR, f"{artifact_id}{extension}")
+        if os.path.exists(target):
+            _touch(target)
+        else:
+            os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+            shutil.copyfile(path, target)
+        return artifact_id
+    except Exception as e:
+        log_action(f"Error storing {path} as an artifact: {e}", is_error=True)
+        return None
+
+def load_artifact(artifact_id):
+    """Loads an artifact referenced by a package (report streams are loaded whole)."""
+    try:
+        for extension in ARTIFACT_EXTENSIONS:
+            path = os.path.join(ARTIFACTS_DIR, f"{artifact_id}{extension}")
+            if not os.path.exists(path):
+                continue
+            if extension != ".json":
+                return load_report(path)
+            with open(path, 'r') as f:
+                return json.load(f)
+        raise FileNotFoundError(artifact_id)
+    except Exception as e:
+        log_action(f"Error loading artifact {artifact_id}: {e}", is_error=True)
+        return None
+
+# --- Delta & Budget ---
+
+def _size(data):
+    """Characters the data takes once the dashboard pretty-prints it into the prompt."""
+    return len(json.dumps(data, indent=2))
+
+def _failure_entry(test, diagnostics_id=None):
+    error = test.get("error") or ""
+    entry = {
+        "name": test.get("name"),
+        "failed_step": test.get("failed_step"),
+        "step_description": test.get("step_description"),
+        "error": error if len(error) <= MAX_ERROR_CHARS else error[:MAX_ERROR_CHARS] + "...",
+        "screenshot": test.get("screenshot")
+    }
+    if diagnostics_id:
+        entry["diagnostics_artifact"] = diagnostics_id
+    return entry
+
+def _flaky_names(trends, flakiness):
+    names = {t["name"] for t in (trends or {}).get("flaky_tests", [])}
+    names.update(t["name"] for t in (flakiness or {}).get("flaky_by_flip_rate", []))
+    return names
+
+def _fit_to_budget(package, sections, max_chars):
     """
-    Gathers all necessary data for AI analysis and creates a single package file.
+    Adds delta items to the package, highest-priority section first, until the
+    budget is used up. Items that don't fit are counted under "omitted" (they
+    stay available in the referenced artifacts).
+    :param sections: List of (key, items) in priority order.
+    """
+    used = _size(package)
+    omitted = {}
+    for key, items in sections:
+        package["changes"][key] = []
+        used += _size({key: []})
+        for item in items:
+            cost = _size(item) + 2
+            if used + cost > max_chars:
+                omitted[key] = omitted.get(key, 0) + 1
+                continue
+            package["changes"][key].append(item)
+            used += cost
+    # The per-item estimate ignores nesting indentation; trim the lowest-priority items until it really fits.
+    for key, _ in reversed(sections):
+        while package["changes"][key] and _size(package) > max_chars:
+            package["changes"][key].pop()
+            omitted[key] = omitted.get(key, 0) + 1
+    if omitted:
+        package["omitted"] = omitted
+    return package
+
+def create_analysis_package(max_tokens=None, full=False):
+    """
+    Builds a size-budgeted analysis package holding only what changed since the
+    previous package: new failures, fixed tests, new regressions, newly flaky
+    tests and new latency drift. The full report and analyses are stored as
+    artifacts and referenced by ID instead of being inlined.
+    :param max_tokens: Token budget (defaults to $TACHTACH_PACKAGE_TOKENS or DEFAULT_TOKEN_BUDGET).
+    :param full: Ignore the previous package and report every current finding.
     """
     log_action("Creating AI analysis package...")
 
-    latest_report = get_latest_report()
-    if not latest_report:
+    report_path = latest_report_path()
+    header = read_report_header(report_path) if report_path else None
+    if not header:
         log_action("Cannot create analysis package: no execution report found.", is_error=True)
         return
 
+    state = {} if full else load_package_state()
+    report_timestamp = header.get("timestamp")
+    if state.get("report_timestamp") == report_timestamp and os.path.exists(ANALYSIS_PACKAGE_FILE):
+        log_action(f"Analysis package for report {report_timestamp} is already up to date.")
+        return
+
+    if max_tokens is None:
+        try:
+            max_tokens = int(os.environ.get(TOKEN_BUDGET_ENV, DEFAULT_TOKEN_BUDGET))
+        except ValueError:
+            log_action(f"Ignoring invalid {TOKEN_BUDGET_ENV}={os.environ[TOKEN_BUDGET_ENV]!r}; "
+                       f"using {DEFAULT_TOKEN_BUDGET} tokens.", is_error=True)
+            max_tokens = DEFAULT_TOKEN_BUDGET
+
     trends = analyze_trends()
+    flakiness = analyze_flakiness()
+    drift = detect_drift()
     goals = get_agent_goals()
 
     # Add current success rate to goals for context
-    current_success_rate = latest_report.get("summary", {}).get("success_rate", 0)
+    current_success_rate = header.get("summary", {}).get("success_rate", 0)
     goals["current_success_rate"] = current_success_rate
     goals["action_needed"] = current_success_rate < goals.get("target_success_rate", 95.0)
 
+    previous_failing = set(state.get("failing", []))
+    previous_drifting = set(state.get("drifting", []))
+
+    # One pass over the report stream; only compact entries for new failures are kept in memory.
+    failing, new_failures, regressing = set(), {}, set()
+    for test in iter_tests(report_path):
+        name = test.get("name")
+        if test.get("performance", {}).get("has_regression"):
+            regressing.add(name)
+        if test.get("status") == "PASSED":
+            continue
+        failing.add(name)
+        if name not in previous_failing:
+            diagnostics_id = store_artifact("diagnostics", test["diagnostics"]) if test.get("diagnostics") else None
+            new_failures[name] = _failure_entry(test, diagnostics_id)
+
+    flaky = _flaky_names(trends, flakiness)
+    drifting = {}
+    for f in drift:  # Largest shift first; a step drifting in several tiers is reported once
+        if (f.get("total_shift_percent") or 0) > 0:
+            drifting.setdefault(f"{f['test_name']}#{f['step']}", f)
+
     analysis_package = {
-        "report_timestamp": latest_report.get("timestamp"),
-        "execution_report": latest_report,
-        "trends": trends,
+        "report_timestamp": report_timestamp,
+        "previous_report_timestamp": state.get("report_timestamp"),
+        "summary": header.get("summary", {}),
+        "changes": {},
+        # Full sections, loadable with load_artifact(<id>) from reports/artifacts/.
+        "artifacts": {
+            "execution_report": store_file_artifact("execution_report", report_path),
+            "trends": store_artifact("trends", trends),
+            "flakiness": store_artifact("flakiness", flakiness),
+            "performance_drift": store_artifact("performance_drift", drift)
+        },
         # For now, coverage gaps are a placeholder for future functionality
         "coverage_gaps": [
             "Note: Coverage analysis is not yet implemented."
@@ -63,10 +255,44 @@ def create_analysis_package():
         "agent_goals": goals
     }
 
+    sections = [
+        ("new_failures", [new_failures[name] for name in sorted(new_failures)]),
+        ("new_regressions", [{"name": name} for name in sorted(regressing - set(state.get("regressing", [])))]),
+        ("newly_flaky", [{"name": name} for name in sorted(flaky - set(state.get("flaky", [])))]),
+        ("new_drift", [{"test_name": f["test_name"], "step": f["step"], "total_shift_percent": f["total_shift_percent"],
+                        "changed_at": f["changes"][0]["changed_at"]}
+                       for key, f in sorted(drifting.items()) if key not in previous_drifting]),
+        ("fixed", [{"name": name} for name in sorted(previous_failing - failing)]),
+        ("still_failing", sorted(name for name in failing if name in previous_failing))
+    ]
+    _fit_to_budget(analysis_package, sections, max_tokens * CHARS_PER_TOKEN)
+
     try:
         with open(ANALYSIS_PACKAGE_FILE, 'w') as f:
-            json.dump(analysis_package, f, indent=4)
-        log_action(f"Successfully created AI analysis package at {ANALYSIS_PACKAGE_FILE}")
+            json.dump(analysis_package, f, separators=(",", ":"))
+        log_action(f"Successfully created AI analysis package at {ANALYSIS_PACKAGE_FILE} "
+                   f"(~{_size(analysis_package) // CHARS_PER_TOKEN} of {max_tokens} tokens).")
+
+        # Only what made it into the package counts as reported; omitted items are offered again next time.
+        changes = analysis_package["changes"]
+        reported_failing = (failing & previous_failing) | {t["name"] for t in changes["new_failures"]}
+        # Diagnostics stay referenced for as long as their failure is tracked.
+        diagnostics = {name: artifact_id for name, artifact_id in state.get("diagnostics", {}).items()
+                       if name in reported_failing}
+        diagnostics.update({t["name"]: t["diagnostics_artifact"] for t in changes["new_failures"]
+                            if t.get("diagnostics_artifact")})
+        save_package_state({
+            "report_timestamp": report_timestamp,
+            "failing": sorted(reported_failing),
+            "diagnostics": diagnostics,
+            # Everything this package (and the failures it tracks) points to; roll-up never releases these.
+            "artifacts": sorted({a for a in analysis_package["artifacts"].values() if a} | set(diagnostics.values())),
+            "regressing": sorted((regressing & set(state.get("regressing", []))) |
+                                 {t["name"] for t in changes["new_regressions"]}),
+            "flaky": sorted((flaky & set(state.get("flaky", []))) | {t["name"] for t in changes["newly_flaky"]}),
+            "drifting": sorted((set(drifting) & previous_drifting) |
+                               {f"{f['test_name']}#{f['step']}" for f in changes["new_drift"]})
+        })
 
         # Create a flag file to notify the user
         with open(READY_FLAG_FILE, 'w') as f:
@@ -78,4 +304,4 @@ def create_analysis_package():
 
 if __name__ == '__main__':
     # For standalone testing of this module
-    create_analysis_package()
\ No newline at end of file
+    create_analysis_package()
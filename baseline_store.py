@@ -0,0 +1,258 @@
+import os
+import json
+import sqlite3
+import datetime
+import threading
+from logger import log_action
+
+# --- Constants ---
+BASELINE_DB = os.path.join("knowledge_base", "performance_baselines.db")
+LEGACY_BASELINE_DIR = os.path.join("knowledge_base", "performance_baselines")
+FLUSH_BATCH_SIZE = 50  # Pending tests before an automatic flush
+SQLITE_TIMEOUT = 30  # Seconds to wait for another worker's write lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS baselines (
+    test_name TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    samples TEXT NOT NULL,
+    updated_at TEXT,
+    PRIMARY KEY (test_name, step)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# --- Helpers ---
+
+def normalize_baseline(data, window_size):
+    """
+    Converts a baseline document into the rolling-window format.
+    Legacy baselines (a single recorded run) become one sample per step.
+    """
+    if not data:
+        return None
+
+    steps = []
+    for i, step in enumerate(data.get("steps", [])):
+        if "samples" in step:
+            samples = [float(ms) for ms in step["samples"]]
+        elif step.get("duration_ms") is not None:
+            samples = [float(step["duration_ms"])]
+        else:
+            samples = []
+        steps.append({"step": step.get("step", i + 1), "samples": samples[-window_size:]})
+
+    return {"updated_at": data.get("updated_at"), "steps": steps}
+
+def _append_samples(baseline, durations, window_size, timestamp):
+    """Appends {step_index: duration_ms} to a baseline's windows in place."""
+    steps = baseline["steps"]
+    for index, duration_ms in sorted(durations.items()):
+        while len(steps) <= index:
+            steps.append({"step": len(steps) + 1, "samples": []})
+        window = steps[index]["samples"]
+        window.append(duration_ms)
+        del window[:-window_size]
+    baseline["updated_at"] = timestamp
+
+# --- Store ---
+
+class BaselineStore:
+    """
+    All performance baselines in a single SQLite database.
+
+    Baselines are read in one query the first time they are needed and then
+    served from memory, until another process changes the database (checked
+    with a stat of the database and its WAL on each access). New samples are
+    queued and written in one transaction per flush; each flush re-reads the
+    affected rows inside the write lock, so concurrent workers append to the
+    windows instead of overwriting each other.
+    """
+
+    def __init__(self, db_path=BASELINE_DB, window_size=30, legacy_dir=LEGACY_BASELINE_DIR):
+        self.db_path = db_path
+        self.window_size = window_size
+        self.legacy_dir = legacy_dir
+        self._cache = None
+        self._signature = None  # Database file state the cache was loaded from
+        self._pending = {}  # test_name -> {step_index: [duration_ms, ...]}
+        self._deleted = set()
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _file_signature(self):
+        signature = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _ensure_loaded(self):
+        if self._cache is None or self._file_signature() != self._signature:
+            self.load_all()
+
+    def load_all(self):
+        """(Re)loads every baseline into memory with a single query, keeping queued changes."""
+        with self._lock:
+            cache = {}
+            signature = self._file_signature()  # Taken first: a write during the read triggers another reload
+            try:
+                conn = self._connect()
+                try:
+                    self._import_legacy_files(conn)
+                    rows = conn.execute(
+                        "SELECT test_name, step, samples, updated_at FROM baselines ORDER BY test_name, step"
+                    ).fetchall()
+                finally:
+                    conn.close()
+            except Exception as e:
+                log_action(f"Error loading baseline store {self.db_path}: {e}", is_error=True)
+                rows = []
+
+            for test_name, step, samples, updated_at in rows:
+                baseline = cache.setdefault(test_name, {"updated_at": updated_at, "steps": []})
+                steps = baseline["steps"]
+                while len(steps) < step:
+                    steps.append({"step": len(steps) + 1, "samples": []})
+                steps[step - 1]["samples"] = json.loads(samples)
+                baseline["updated_at"] = max(baseline["updated_at"] or "", updated_at or "") or None
+
+            for test_name in self._deleted:
+                cache.pop(test_name, None)
+            for test_name, steps in self._pending.items():
+                baseline = cache.setdefault(test_name, {"updated_at": None, "steps": []})
+                for index, samples in steps.items():
+                    for duration_ms in samples:
+                        _append_samples(baseline, {index: duration_ms}, self.window_size, baseline["updated_at"])
+
+            self._cache = cache
+            self._signature = signature
+            log_action(f"Loaded {len(cache)} performance baselines from {self.db_path}.")
+            return cache
+
+    def get(self, test_name):
+        """Returns the in-memory baseline for a test, or None."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._cache.get(test_name)
+
+    def record(self, test_name, durations):
+        """
+        Queues one run's step durations for a test.
+        :param durations: A dict {step_index: duration_ms}.
+        """
+        if not durations:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            timestamp = datetime.datetime.now().isoformat()
+            baseline = self._cache.setdefault(test_name, {"updated_at": None, "steps": []})
+            _append_samples(baseline, durations, self.window_size, timestamp)
+
+            pending = self._pending.setdefault(test_name, {})
+            for index, duration_ms in durations.items():
+                pending.setdefault(index, []).append(duration_ms)
+
+            if len(self._pending) >= FLUSH_BATCH_SIZE:
+                self.flush()
+
+    def delete(self, test_name):
+        """
+        Removes a test's baseline (applied on the next flush).
+        :return: Whether the test had a baseline.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            existed = self._cache.pop(test_name, None) is not None
+            self._pending.pop(test_name, None)
+            self._deleted.add(test_name)
+            return existed
+
+    def flush(self):
+        """Writes all queued samples and deletions in a single transaction."""
+        with self._lock:
+            if not self._pending and not self._deleted:
+                return True
+            timestamp = datetime.datetime.now().isoformat()
+            signature = self._file_signature()
+            try:
+                conn = self._connect()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for test_name in self._deleted:
+                        conn.execute("DELETE FROM baselines WHERE test_name = ?", (test_name,))
+                    for test_name, steps in self._pending.items():
+                        for index, new_samples in steps.items():
+                            row = conn.execute(
+                                "SELECT samples FROM baselines WHERE test_name = ? AND step = ?",
+                                (test_name, index + 1)
+                            ).fetchone()
+                            samples = (json.loads(row[0]) if row else []) + new_samples
+                            conn.execute(
+                                "INSERT OR REPLACE INTO baselines (test_name, step, samples, updated_at) VALUES (?, ?, ?, ?)",
+                                (test_name, index + 1, json.dumps(samples[-self.window_size:]), timestamp)
+                            )
+                    conn.execute("COMMIT")
+                finally:
+                    conn.close()
+            except Exception as e:
+                log_action(f"Error writing baseline store {self.db_path}: {e}", is_error=True)
+                return False
+
+            log_action(f"Flushed baselines for {len(self._pending)} tests to {self.db_path}.")
+            self._pending.clear()
+            self._deleted.clear()
+            if self._cache is not None and signature == self._signature:
+                self._signature = self._file_signature()  # Our own write; the cache already has it
+            return True
+
+    def _import_legacy_files(self, conn):
+        """One-time import of the old per-test JSON baseline files."""
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        if not self.legacy_dir or not os.path.isdir(self.legacy_dir):
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', '1')")
+            return
+
+        imported = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for filename in sorted(os.listdir(self.legacy_dir)):
+                if not filename.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.legacy_dir, filename), 'r') as f:
+                        baseline = normalize_baseline(json.load(f), self.window_size)
+                except Exception as e:
+                    log_action(f"Skipping unreadable legacy baseline {filename}: {e}", is_error=True)
+                    continue
+                if not baseline:
+                    continue
+                test_name = filename[:-len(".json")]
+                for step in baseline["steps"]:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO baselines (test_name, step, samples, updated_at) VALUES (?, ?, ?, ?)",
+                        (test_name, step["step"], json.dumps(step["samples"]), baseline["updated_at"])
+                    )
+                imported += 1
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', '1')")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if imported:
+            log_action(f"Imported {imported} legacy baseline files from {self.legacy_dir}.")
@@ -0,0 +1,41 @@
+"""
+In-memory UIA backend exposing the same functions as uia_backend.py.
+Elements are plain dicts; typed text is remembered so assert-uia-text works.
+"""
+_connected = False
+_last_found_element = None
+
+def start_app(path, timeout=30):
+    global _connected
+    _connected = True
+    return True
+
+def connect_to_app(title, timeout=30):
+    global _connected
+    _connected = True
+    return True
+
+def _find(key, value):
+    global _last_found_element
+    _last_found_element = {"key": key, "value": value, "text": ""} if _connected else None
+    return _last_found_element
+
+def find_element_by_name(name, timeout=10):
+    return _find("name", name)
+
+def find_element_by_automation_id(automation_id, timeout=10):
+    return _find("auto_id", automation_id)
+
+def click_element(element=None):
+    return (element or _last_found_element) is not None
+
+def type_into_element(text, element=None):
+    target = element or _last_found_element
+    if target is None:
+        return False
+    target["text"] += text
+    return True
+
+def get_element_text(element=None):
+    target = element or _last_found_element
+    return target["text"] if target is not None else None
@@ -0,0 +1,10 @@
+"""In-memory stand-in for psutil used by the benchmark harnesses."""
+from collections import namedtuple
+
+_VirtualMemory = namedtuple("svmem", "total available percent used free")
+
+def cpu_percent(interval=None):
+    return 0.0
+
+def virtual_memory():
+    return _VirtualMemory(total=8 << 30, available=4 << 30, percent=50.0, used=4 << 30, free=4 << 30)
@@ -0,0 +1,48 @@
+"""
+In-memory stand-in for pyautogui used by the benchmark harnesses.
+It never touches a real display: screenshots are blank images (when Pillow is
+available) and the mouse is a pair of integers.
+"""
+from collections import namedtuple
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+Point = namedtuple("Point", "x y")
+SCREEN_SIZE = (1920, 1080)
+
+class FailSafeException(Exception):
+    pass
+
+_position = Point(0, 0)
+
+def size():
+    return SCREEN_SIZE
+
+def position():
+    return _position
+
+def moveTo(x, y, *args, **kwargs):
+    global _position
+    _position = Point(int(x), int(y))
+
+def click(x=None, y=None, *args, **kwargs):
+    if x is not None and y is not None:
+        moveTo(x, y)
+
+def typewrite(text, *args, **kwargs):
+    pass
+
+write = typewrite
+
+def screenshot(imageFilename=None, region=None):
+    width, height = (region[2], region[3]) if region else SCREEN_SIZE
+    image = Image.new("RGB", (width, height)) if Image else None
+    if image is not None and imageFilename:
+        image.save(imageFilename)
+    return image
+
+def locateOnScreen(*args, **kwargs):
+    return None
@@ -0,0 +1,305 @@
+"""
+Framework overhead benchmarks.
+
+Runs the framework's own code paths -- smart_cursor.execute_scenario,
+test_runner, PerformanceTracker, report writing and analysis_packager --
+against the in-memory fakes in benchmarks/fake_backends, using synthetic
+scenarios of increasing size. Everything runs in a throwaway working
+directory, so the real knowledge_base, reports and history.log are untouched.
+
+Results are compared against the stored numbers in framework_baseline.json;
+any metric more than --tolerance percent worse is reported as a regression
+and the script exits with status 1.
+
+Usage:
+    python benchmarks/framework_benchmark.py
+    python benchmarks/framework_benchmark.py --sizes 1,100,10000 --tolerance 30
+    python benchmarks/framework_benchmark.py --update-baseline
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+import importlib
+import contextlib
+import subprocess
+import tracemalloc
+
+# --- Constants ---
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+FAKE_BACKENDS_DIR = os.path.join(BENCH_DIR, "fake_backends")
+BASELINE_FILE = os.path.join(BENCH_DIR, "framework_baseline.json")
+RESULTS_FILE = os.path.join(REPO_ROOT, "reports", "benchmarks", "framework_latest.json")
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000]
+SUBPROCESS_MAX_STEPS = 20  # test_runner spawns one process per step; keep this tier small
+DEFAULT_TOLERANCE = 25.0  # Percent slower than baseline before a metric counts as a regression
+STARTUP_REPEATS = 3
+
+# Step mix for synthetic scenarios. UIA steps only run in-process, where the
+# fake UIA backend can be swapped in; subprocess steps stick to the others.
+IN_PROCESS_ACTIONS = [
+    {"action": "connect-app", "target": "Synthetic App"},
+    {"action": "find-uia-id", "target": "input_field"},
+    {"action": "type-uia", "target": "hello"},
+    {"action": "assert-uia-text", "target": "hello"},
+    {"action": "find-image", "target": "ok_button"},
+    {"action": "find-text", "target": "Submit"},
+    {"action": "assert-text", "target": "Done"},
+    {"action": "wait", "target": "0"},
+]
+SUBPROCESS_ACTIONS = [
+    {"action": "find-image", "target": "ok_button"},
+    {"action": "find-text", "target": "Submit"},
+    {"action": "assert-text", "target": "Done"},
+    {"action": "wait", "target": "0"},
+]
+
+# Framework modules, imported after we chdir into the sandbox.
+FRAMEWORK_MODULES = ["smart_cursor", "test_runner", "performance_tracker", "scenario_manager",
+                     "command_interface", "analysis_packager"]
+fw = {}
+
+# --- Helpers ---
+
+def synthetic_steps(count, actions):
+    """Builds a scenario of `count` steps cycling through `actions`."""
+    return [dict(actions[i % len(actions)]) for i in range(count)]
+
+def synthetic_results(count):
+    """Builds `count` fake test results shaped like test_runner output."""
+    results = []
+    for i in range(count):
+        steps = [{"step": s + 1, "duration_ms": 10.0 + s, "baseline_ms": 10.0, "baseline_p90_ms": 11.0,
+                  "baseline_samples": 30, "regression": False} for s in range(5)]
+        results.append({
+            "name": f"synthetic_test_{i}",
+            "status": "PASSED" if i % 10 else "FAILED",
+            "steps_executed": 5,
+            "performance": {"total_duration_ms": sum(s["duration_ms"] for s in steps),
+                            "steps": steps, "has_regression": False}
+        })
+    return results
+
+def _child_env():
+    """Environment for subprocesses: fakes first, then the repo."""
+    paths = [FAKE_BACKENDS_DIR, REPO_ROOT]
+    if os.environ.get("PYTHONPATH"):
+        paths.append(os.environ["PYTHONPATH"])
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(paths))
+
+@contextlib.contextmanager
+def quiet():
+    """Silences log_action's console echo while framework code runs."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def flush_framework():
+    """Writes out what the framework buffers until exit (baselines, log lines), while still in the sandbox."""
+    if "performance_tracker" in fw:
+        fw["performance_tracker"].flush_baselines()
+    logger = sys.modules.get("logger")
+    if logger:
+        logger.flush_logs()
+
+def measure(func):
+    """
+    Runs func twice: once for wall time, once under tracemalloc for peak memory.
+    :return: A tuple (elapsed_seconds, peak_kib).
+    """
+    with quiet():
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return elapsed, round(peak / 1024, 1)
+
+# --- Benchmarks ---
+
+def bench_startup(metrics):
+    """Cold-start cost of the entry-point modules (fresh interpreter each time)."""
+    for module in ["smart_cursor", "command_interface"]:
+        timings = []
+        for _ in range(STARTUP_REPEATS):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", f"import {module}"], env=_child_env(),
+                           capture_output=True, check=True)
+            timings.append(time.perf_counter() - start)
+        metrics[f"startup.{module}_ms"] = round(min(timings) * 1000, 2)
+
+def bench_execute_scenario(metrics, size):
+    name = f"synthetic_{size}"
+    with quiet():
+        fw["scenario_manager"].save_scenarios({name: synthetic_steps(size, IN_PROCESS_ACTIONS)})
+    fw["smart_cursor"].uia_backend = importlib.import_module("fake_uia")
+
+    def run():
+        if not fw["smart_cursor"].execute_scenario(name):
+            raise RuntimeError(f"Synthetic scenario '{name}' failed")
+
+    elapsed, peak = measure(run)
+    metrics[f"execute_scenario.per_step_us[n={size}]"] = round(elapsed / size * 1e6, 2)
+    metrics[f"execute_scenario.peak_kib[n={size}]"] = peak
+
+def bench_performance_tracker(metrics, size):
+    pt = fw["performance_tracker"]
+
+    def run():
+        tracker = pt.PerformanceTracker(f"tracker_{size}")
+        for i in range(size):
+            tracker.start_step(i)
+            tracker.stop_step(i)
+        tracker.finalize()
+        pt.flush_baselines()
+
+    elapsed, peak = measure(run)
+    metrics[f"performance_tracker.per_step_us[n={size}]"] = round(elapsed / size * 1e6, 2)
+    metrics[f"performance_tracker.peak_kib[n={size}]"] = peak
+
+def bench_test_runner(metrics, size):
+    runner = fw["test_runner"]
+    runner.PYTHON_CMD = sys.executable
+    runner.SMART_CURSOR_SCRIPT = os.path.join(REPO_ROOT, "smart_cursor.py")
+    steps = synthetic_steps(size, SUBPROCESS_ACTIONS)
+
+    def run():
+        result = runner.run_single_test(f"runner_{size}", steps)
+        if result["status"] != "PASSED":
+            raise RuntimeError(f"Synthetic test failed: {result.get('error')}")
+
+    os.environ["PYTHONPATH"] = _child_env()["PYTHONPATH"]
+    elapsed, peak = measure(run)
+    metrics[f"test_runner.per_step_ms[n={size}]"] = round(elapsed / size * 1000, 2)
+    metrics[f"test_runner.peak_kib[n={size}]"] = peak
+
+def bench_reporting(metrics, size):
+    ci = fw["command_interface"]
+    results = synthetic_results(size)
+
+    def write():
+        ci.write_report(ci._format_test_report(results))
+
+    elapsed, peak = measure(write)
+    metrics[f"write_report.per_test_us[n={size}]"] = round(elapsed / size * 1e6, 2)
+    metrics[f"write_report.peak_kib[n={size}]"] = peak
+
+    # full=True: measure() calls it twice, and an incremental call on an unchanged report returns at once.
+    elapsed, peak = measure(lambda: fw["analysis_packager"].create_analysis_package(full=True))
+    metrics[f"analysis_package.total_ms[n={size}]"] = round(elapsed * 1000, 2)
+    metrics[f"analysis_package.peak_kib[n={size}]"] = peak
+
+# --- Comparison ---
+
+def compare(metrics, baseline, tolerance):
+    """
+    Compares metrics against the stored baseline (all metrics are lower-is-better).
+    :return: A list of regression dicts.
+    """
+    regressions = []
+    for name, value in sorted(metrics.items()):
+        expected = baseline.get(name)
+        if not expected:
+            print(f"  {name:<45} {value:>12}   (no baseline)")
+            continue
+        change = (value - expected) / expected * 100
+        flag = "REGRESSION" if change > tolerance else ""
+        print(f"  {name:<45} {value:>12}   baseline {expected:>12}   {change:+7.1f}%  {flag}")
+        if flag:
+            regressions.append({"metric": name, "value": value, "baseline": expected,
+                                "change_percent": round(change, 1)})
+    return regressions
+
+def load_stored_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, 'r') as f:
+        return json.load(f).get("metrics", {})
+
+# --- Main ---
+
+def run_benchmarks(sizes):
+    metrics = {}
+    bench_startup(metrics)
+
+    start = time.perf_counter()
+    with quiet():
+        for module in FRAMEWORK_MODULES:
+            fw[module] = importlib.import_module(module)
+    metrics["startup.in_process_import_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    for size in sizes:
+        print(f"[*] Benchmarking size {size}...")
+        bench_execute_scenario(metrics, size)
+        bench_performance_tracker(metrics, size)
+        if size <= SUBPROCESS_MAX_STEPS:
+            bench_test_runner(metrics, size)
+        bench_reporting(metrics, size)
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Framework overhead benchmarks with fake backends.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated synthetic scenario sizes (steps / tests).")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown in percent before a metric is flagged.")
+    parser.add_argument("--output", default=RESULTS_FILE, help="Where to write the results JSON.")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run's numbers as the new baseline.")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    sys.path[:0] = [FAKE_BACKENDS_DIR, REPO_ROOT]
+    original_cwd = os.getcwd()
+    sandbox = tempfile.mkdtemp(prefix="tachtach_bench_")
+    os.makedirs(os.path.join(sandbox, "knowledge_base"))
+    os.makedirs(os.path.join(sandbox, "reports"))
+    os.chdir(sandbox)
+    try:
+        metrics = run_benchmarks(sizes)
+    finally:
+        flush_framework()
+        os.chdir(original_cwd)
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+    print("\n--- Framework Benchmark Results ---")
+    regressions = compare(metrics, load_stored_baseline(), args.tolerance)
+
+    document = {
+        "recorded_at": datetime.datetime.now().isoformat(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "sizes": sizes,
+        "metrics": metrics,
+        "regressions": regressions
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=4)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        document.pop("regressions")
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(document, f, indent=4)
+        print(f"Baseline updated: {BASELINE_FILE}")
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance}%.")
+        return 1
+    print("\nNo framework overhead regressions detected.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+Vision engine benchmark corpus and harness.
+
+Generates a reproducible corpus of synthetic screens and templates from
+vision_corpus.json. The corpus varies resolution, DPI scale factor, capture
+noise and look-alike distractor widgets. The harness then measures latency,
+throughput and accuracy of the vision paths behind the smart_cursor actions:
+
+    find-image / assert-image   -> template matching  (match.*)
+    find-text / assert-text     -> OCR word lookup    (ocr.*)
+    assert-visuals              -> visual diff        (diff.*)
+
+Engines whose libraries are missing (pyscreeze, pytesseract + tesseract) are
+skipped and listed as such in the results. Results are written as JSON so they
+can be compared across releases (see --compare).
+
+Usage:
+    python benchmarks/vision_benchmark.py
+    python benchmarks/vision_benchmark.py --limit 20 --repeats 1
+    python benchmarks/vision_benchmark.py --compare reports/benchmarks/vision_previous.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import copy
+import hashlib
+import argparse
+import datetime
+import platform
+import itertools
+import statistics
+
+try:
+    import PIL
+    from PIL import Image, ImageChops, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+# --- Constants ---
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+CORPUS_SPEC_FILE = os.path.join(BENCH_DIR, "vision_corpus.json")
+CORPUS_DIR = os.path.join(REPO_ROOT, "reports", "benchmarks", "vision_corpus")
+RESULTS_DIR = os.path.join(REPO_ROOT, "reports", "benchmarks")
+RESULTS_SCHEMA_VERSION = 1
+GENERATOR_VERSION = 1  # Bump whenever rendering changes, so old corpora are regenerated
+
+WIDGET_SIZE = (150, 40)  # At scale 1.0
+FONT_SIZE = 18  # At scale 1.0
+BACKGROUND = (236, 239, 244)
+TARGET_FILL = (52, 120, 246)
+NOISE_TILE = 128
+DIFF_THRESHOLD = 40  # Grayscale difference that counts as a changed pixel
+HIT_IOU = 0.5  # Minimum overlap with the ground-truth box to count as a hit
+
+# --- Corpus Generation ---
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has only the fixed bitmap font
+        return ImageFont.load_default()
+
+def _scaled(value, scale):
+    return int(round(value * scale))
+
+def _place(rng, width, height, size, taken, attempts=200):
+    """
+    Finds a spot for a widget that doesn't overlap already placed ones.
+    :return: The widget's box, or None when none was found (or it doesn't fit the screen).
+    """
+    w, h = size
+    if w >= width or h >= height:
+        return None
+    for _ in range(attempts):
+        left = rng.randint(0, width - w - 1)
+        top = rng.randint(0, height - h - 1)
+        box = (left, top, left + w, top + h)
+        if all(box[2] < t[0] or box[0] > t[2] or box[3] < t[1] or box[1] > t[3] for t in taken):
+            taken.append(box)
+            return box
+    return None
+
+def build_layout(rng, width, height, scale, labels, target_label, distractors):
+    """
+    Lays out one screen: a target button plus look-alike distractors.
+    Distractors share the target's style; a third of them also share its colour.
+    :return: A list of widget dicts (box, label, fill); the first one is the target.
+    :raises ValueError: If the target widget doesn't fit on the screen.
+    """
+    size = (_scaled(WIDGET_SIZE[0], scale), _scaled(WIDGET_SIZE[1], scale))
+    taken = []
+    target = _place(rng, width, height, size, taken)
+    if target is None:
+        raise ValueError(f"A {size[0]}x{size[1]} target doesn't fit a {width}x{height} screen.")
+    widgets = [{"box": target, "label": target_label, "fill": TARGET_FILL}]
+    others = [label for label in labels if label != target_label]
+    for i in range(distractors):
+        box = _place(rng, width, height, size, taken)
+        if box is None:
+            break
+        fill = TARGET_FILL if i % 3 == 0 else (rng.randint(40, 200), rng.randint(40, 200), rng.randint(40, 200))
+        widgets.append({"box": box, "label": rng.choice(others), "fill": fill})
+    return widgets
+
+def render(layout, width, height, scale):
+    """Renders a layout to an RGB screen image."""
+    image = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    # Static chrome (title bar and side panel) so screens aren't mostly flat colour.
+    draw.rectangle((0, 0, width, _scaled(32, scale)), fill=(45, 52, 64))
+    draw.rectangle((0, _scaled(32, scale), _scaled(220, scale), height), fill=(222, 226, 233))
+    font = _font(_scaled(FONT_SIZE, scale))
+    for widget in layout:
+        _draw_widget(draw, widget["box"], widget["label"], widget["fill"], font)
+    return image
+
+def _draw_widget(draw, box, label, fill, font):
+    draw.rectangle(box, fill=fill, outline=(20, 20, 20))
+    left, top, right, bottom = box
+    text_box = draw.textbbox((0, 0), label, font=font)
+    text_w, text_h = text_box[2] - text_box[0], text_box[3] - text_box[1]
+    draw.text((left + (right - left - text_w) // 2 - text_box[0], top + (bottom - top - text_h) // 2 - text_box[1]),
+              label, fill=(255, 255, 255), font=font)
+
+def render_template(label):
+    """Renders the target widget alone at scale 1.0, as learn.py would have captured it."""
+    w, h = WIDGET_SIZE
+    image = Image.new("RGB", (w + 1, h + 1), BACKGROUND)
+    _draw_widget(ImageDraw.Draw(image), (0, 0, w, h), label, TARGET_FILL, _font(FONT_SIZE))
+    return image
+
+def add_noise(image, rng, sigma):
+    """Adds seeded gaussian capture noise (a tiled noise patch keeps this fast)."""
+    if not sigma:
+        return image
+    tile = Image.new("L", (NOISE_TILE, NOISE_TILE))
+    tile.putdata([max(0, min(255, int(rng.gauss(128, sigma)))) for _ in range(NOISE_TILE * NOISE_TILE)])
+    noise = Image.new("L", image.size)
+    for x in range(0, image.size[0], NOISE_TILE):
+        for y in range(0, image.size[1], NOISE_TILE):
+            noise.paste(tile, (x, y))
+    return ImageChops.add(image, Image.merge("RGB", (noise, noise, noise)), scale=1.0, offset=-128)
+
+def _union(boxes):
+    if not boxes:
+        return None
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+def corpus_hash(spec):
+    payload = json.dumps({"spec": spec, "generator": GENERATOR_VERSION}, sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+def build_corpus(spec, corpus_dir=CORPUS_DIR, limit=None):
+    """
+    Generates (or reuses) the corpus described by `spec`.
+    Every case is seeded from the corpus seed and its index, so a given spec
+    always produces byte-identical images.
+    :return: The corpus manifest dict.
+    """
+    digest = corpus_hash(spec)
+    manifest_path = os.path.join(corpus_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("hash") == digest and manifest.get("limit") == limit:
+            return manifest
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    labels = spec["labels"]
+    cases = []
+
+    matching = spec["matching"]
+    combos = itertools.product(matching["resolution"], matching["scale"], matching["noise"], matching["distractors"])
+    for index, (resolution, scale, noise, distractors) in enumerate(combos):
+        if limit is not None and index >= limit:
+            break
+        rng = random.Random(spec["seed"] * 1000003 + index)
+        width, height = resolution
+        label = labels[index % len(labels)]
+        layout = build_layout(rng, width, height, scale, labels, label, distractors)
+        case_id = f"match_{index:03d}"
+        screen = add_noise(render(layout, width, height, scale), rng, noise)
+        screen.save(os.path.join(corpus_dir, f"{case_id}_screen.png"))
+        template_file = f"template_{label.lower()}.png"
+        if not os.path.exists(os.path.join(corpus_dir, template_file)):
+            render_template(label).save(os.path.join(corpus_dir, template_file))
+        cases.append({
+            "id": case_id, "kind": "match", "screen": f"{case_id}_screen.png", "template": template_file,
+            "label": label, "truth": list(layout[0]["box"]),
+            "dimensions": {"resolution": f"{width}x{height}", "scale": scale, "noise": noise, "distractors": distractors}
+        })
+
+    diff = spec["visual_diff"]
+    for index, (resolution, noise, changes) in enumerate(itertools.product(diff["resolution"], diff["noise"], diff["changes"])):
+        if limit is not None and index >= limit:
+            break
+        rng = random.Random(spec["seed"] * 1000003 + 500000 + index)
+        width, height = resolution
+        layout = build_layout(rng, width, height, 1.0, labels, labels[0], 12)
+        changed = copy.deepcopy(layout)
+        for widget in changed[1:changes + 1]:
+            widget["label"] = rng.choice([l for l in labels if l != widget["label"]])
+        case_id = f"diff_{index:03d}"
+        render(layout, width, height, 1.0).save(os.path.join(corpus_dir, f"{case_id}_baseline.png"))
+        add_noise(render(changed, width, height, 1.0), rng, noise).save(os.path.join(corpus_dir, f"{case_id}_current.png"))
+        cases.append({
+            "id": case_id, "kind": "diff", "baseline": f"{case_id}_baseline.png", "current": f"{case_id}_current.png",
+            "truth": _union([w["box"] for w in changed[1:changes + 1]]),
+            "dimensions": {"resolution": f"{width}x{height}", "noise": noise, "changes": changes}
+        })
+
+    manifest = {"hash": digest, "limit": limit, "generated_at": datetime.datetime.now().isoformat(), "cases": cases}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+# --- Engines ---
+
+def iou(a, b):
+    """Intersection-over-union of two (left, top, right, bottom) boxes."""
+    if a is None or b is None:
+        return 0.0
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+
+def _pyscreeze_locate(grayscale):
+    import pyscreeze
+
+    def locate(screen, template):
+        try:
+            box = pyscreeze.locate(template, screen, grayscale=grayscale)
+        except getattr(pyscreeze, "ImageNotFoundException", ()):  # Raised instead of returning None since 0.1.30
+            return None
+        return None if box is None else [box.left, box.top, box.left + box.width, box.top + box.height]
+    return locate
+
+def _tesseract_find(screen, label):
+    import pytesseract
+    data = pytesseract.image_to_data(screen, output_type=pytesseract.Output.DICT)
+    for i, word in enumerate(data["text"]):
+        if word.strip().lower() == label.lower():
+            return [data["left"][i], data["top"][i], data["left"][i] + data["width"][i], data["top"][i] + data["height"][i]]
+    return None
+
+def _imagechops_diff(baseline, current):
+    mask = ImageChops.difference(baseline, current).convert("L").point(lambda p: 255 if p > DIFF_THRESHOLD else 0)
+    box = mask.getbbox()
+    return list(box) if box else None
+
+def available_engines():
+    """
+    Returns {engine_name: (kind, callable)} for engines usable here, plus a
+    {engine_name: reason} dict of skipped ones.
+    """
+    engines, skipped = {}, {}
+    try:
+        import pyscreeze  # noqa: F401 -- what pyautogui.locateOnScreen uses
+        engines["match.pyscreeze"] = ("match", _pyscreeze_locate(grayscale=False))
+        engines["match.pyscreeze_grayscale"] = ("match", _pyscreeze_locate(grayscale=True))
+    except ImportError:
+        skipped["match.pyscreeze"] = "pyscreeze not installed"
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        engines["ocr.tesseract"] = ("ocr", _tesseract_find)
+    except Exception as e:
+        skipped["ocr.tesseract"] = f"unavailable: {e}"
+    engines["diff.imagechops"] = ("diff", _imagechops_diff)
+    return engines, skipped
+
+# --- Harness ---
+
+def _is_hit(case, found):
+    """A hit finds the right region; for text, the word box must sit inside the button."""
+    truth = case["truth"]
+    if case["kind"] == "diff" and truth is None:
+        return found is None, 1.0 if found is None else 0.0
+    overlap = iou(found, truth)
+    if case["kind"] == "diff" and found is not None:
+        # Only the changed text differs, so the diff box may be smaller than the
+        # changed widgets; it just has to stay within them.
+        inside = found[0] >= truth[0] and found[1] >= truth[1] and found[2] <= truth[2] + 1 and found[3] <= truth[3] + 1
+        return inside and overlap > 0, overlap
+    if case["kind"] == "ocr" and found is not None:
+        cx, cy = (found[0] + found[2]) / 2, (found[1] + found[3]) / 2
+        return truth[0] <= cx <= truth[2] and truth[1] <= cy <= truth[3], overlap
+    return overlap >= HIT_IOU, overlap
+
+def run_case(engine_kind, engine, case, corpus_dir, repeats):
+    """Runs one engine on one case `repeats` times; returns a per-case record."""
+    def load(name):
+        with Image.open(os.path.join(corpus_dir, name)) as img:
+            return img.convert("RGB")
+
+    if case["kind"] == "diff":
+        args = (load(case["baseline"]), load(case["current"]))
+    elif engine_kind == "ocr":
+        args = (load(case["screen"]), case["label"])
+    else:
+        args = (load(case["screen"]), load(case["template"]))
+
+    timings, found, error = [], None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        try:
+            found = engine(*args)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        timings.append((time.perf_counter() - start) * 1000)
+
+    scored = dict(case, kind=engine_kind) if case["kind"] == "match" else case
+    hit, overlap = _is_hit(scored, found) if error is None else (False, 0.0)
+    record = {"case": case["id"], "latency_ms": round(statistics.median(timings), 3), "hit": hit,
+              "iou": round(overlap, 3), "found": found, "dimensions": case["dimensions"]}
+    if error:
+        record["error"] = error
+    return record
+
+def summarize(records):
+    latencies = sorted(r["latency_ms"] for r in records)
+    total_s = sum(latencies) / 1000
+    summary = {
+        "cases": len(records),
+        "accuracy": round(sum(r["hit"] for r in records) / len(records), 4),
+        "latency_ms": {
+            "median": round(statistics.median(latencies), 3),
+            "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+            "mean": round(statistics.fmean(latencies), 3)
+        },
+        "throughput_per_s": round(len(records) / total_s, 2) if total_s else None,
+        "errors": sum(1 for r in records if "error" in r),
+        "by_dimension": {}
+    }
+    groups = {}
+    for r in records:
+        for key, value in r["dimensions"].items():
+            groups.setdefault(f"{key}={value}", []).append(r)
+    for key, group in sorted(groups.items()):
+        summary["by_dimension"][key] = {
+            "cases": len(group),
+            "accuracy": round(sum(r["hit"] for r in group) / len(group), 4),
+            "median_ms": round(statistics.median(r["latency_ms"] for r in group), 3)
+        }
+    return summary
+
+def run_benchmark(manifest, corpus_dir, repeats):
+    engines, skipped = available_engines()
+    results = {}
+    for name, (kind, engine) in engines.items():
+        wanted = "diff" if kind == "diff" else "match"
+        cases = [c for c in manifest["cases"] if c["kind"] == wanted]
+        print(f"[*] {name}: {len(cases)} cases")
+        records = [run_case(kind, engine, case, corpus_dir, repeats) for case in cases]
+        if records:
+            results[name] = {"summary": summarize(records), "cases": records}
+    return results, skipped
+
+def compare(current, previous):
+    """Prints accuracy and median-latency deltas against a previous results file."""
+    print("\n--- Compared to previous run ---")
+    for name, data in current["engines"].items():
+        old = previous.get("engines", {}).get(name)
+        if not old:
+            print(f"  {name:<28} (new engine)")
+            continue
+        acc = data["summary"]["accuracy"] - old["summary"]["accuracy"]
+        old_ms = old["summary"]["latency_ms"]["median"]
+        lat = (data["summary"]["latency_ms"]["median"] - old_ms) / old_ms * 100 if old_ms else 0.0
+        print(f"  {name:<28} accuracy {acc:+.2%}   median latency {lat:+.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Vision engine benchmark (matching, OCR, visual diff).")
+    parser.add_argument("--corpus-dir", default=CORPUS_DIR, help="Where generated corpus images are cached.")
+    parser.add_argument("--limit", type=int, default=None, help="Only generate/run the first N cases of each kind.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per case (median is reported).")
+    parser.add_argument("--output", default=None, help="Results JSON path (default: reports/benchmarks/vision_<timestamp>.json).")
+    parser.add_argument("--compare", default=None, help="A previous results JSON to diff against.")
+    args = parser.parse_args()
+
+    if Image is None:
+        print("Pillow is required for the vision benchmark (pip install -r requirements.txt).")
+        return 1
+
+    with open(CORPUS_SPEC_FILE, 'r') as f:
+        spec = json.load(f)
+    print(f"[*] Preparing corpus in {args.corpus_dir}...")
+    manifest = build_corpus(spec, args.corpus_dir, args.limit)
+
+    engines, skipped = run_benchmark(manifest, args.corpus_dir, args.repeats)
+    document = {
+        "schema_version": RESULTS_SCHEMA_VERSION,
+        "recorded_at": datetime.datetime.now().isoformat(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "corpus": {"hash": manifest["hash"], "cases": len(manifest["cases"]), "limit": manifest.get("limit")},
+        "action_paths": {
+            "find-image": "match.*", "assert-image": "match.*",
+            "find-text": "ocr.*", "assert-text": "ocr.*",
+            "assert-visuals": "diff.*"
+        },
+        "skipped_engines": skipped,
+        "engines": engines
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"vision_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=4)
+
+    print("\n--- Vision Benchmark Results ---")
+    for name, data in engines.items():
+        s = data["summary"]
+        print(f"  {name:<28} accuracy {s['accuracy']:.1%}   median {s['latency_ms']['median']:.1f} ms   "
+              f"p95 {s['latency_ms']['p95']:.1f} ms   {s['throughput_per_s']} cases/s")
+    for name, reason in skipped.items():
+        print(f"  {name:<28} skipped ({reason})")
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(document, json.load(f))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import os
+import hashlib
+from logger import log_action
+from json_store import load_json, write_json, update_json
+from scenario_repository import load_index, get_scenario, shard_path, KB_OBJECT_ACTIONS
+
+# --- Constants ---
+SELECTION_STATE_FILE = os.path.join("reports", "selection_state.json")  # Fingerprints of each scenario's last green run
+KB_FILE = os.path.join("knowledge_base", "kb.json")
+BASELINE_DIR = os.path.join("knowledge_base", "visual_baselines")
+VISUAL_ACTIONS = ("assert-visuals",)  # Actions whose target is a visual baseline name
+FRAMEWORK_FILES = ["smart_cursor.py", "uia_backend.py"]  # A change here affects every scenario
+
+# A scenario depends on its own file, the KB objects it looks for (kb.json entry
+# plus image), the visual baselines it compares against, any file a step
+# refers to (e.g. data files) and the framework files that execute the steps.
+# A dependency's fingerprint is the SHA-1 of its content; a scenario is
+# selected when any fingerprint differs from the one recorded at its last
+# green run. Hashes are cached by mtime/size so unchanged images aren't re-read.
+
+# --- Hashing ---
+
+def _file_hash(path, cache):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None  # Missing files count as a (changed) fingerprint too
+    cached = cache.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    cache[path] = [stat.st_mtime_ns, stat.st_size, digest.hexdigest()]
+    return cache[path][2]
+
+# --- Dependency Graph ---
+
+def scenario_dependencies(name, steps, kb):
+    """
+    Lists what a scenario depends on.
+    :return: {dependency_id: path} with ids like "kb:ok_button" or "baseline:home_page".
+    """
+    deps = {"scenario": shard_path(name)}
+    for path in FRAMEWORK_FILES:
+        deps[f"framework:{path}"] = path
+    for step in steps:
+        action, target = step.get("action"), step.get("target")
+        if not isinstance(target, str) or not target:
+            continue
+        if action in KB_OBJECT_ACTIONS:
+            deps[f"kb:{target}"] = kb.get(target)
+        elif action in VISUAL_ACTIONS:
+            deps[f"baseline:{target}"] = os.path.join(BASELINE_DIR, f"{target}.png")
+        for value in step.values():
+            if isinstance(value, str) and os.path.splitext(value)[1] and os.path.isfile(value):
+                deps[f"file:{value}"] = value
+    return deps
+
+def dependency_graph(names=None):
+    """{scenario: {dependency_id: path}} for the given scenarios (all by default)."""
+    kb = load_json(KB_FILE)
+    graph = {}
+    for name in (names if names is not None else load_index()):
+        steps = get_scenario(name)
+        if steps is not None:
+            graph[name] = scenario_dependencies(name, steps, kb)
+    return graph
+
+def fingerprints(graph, cache):
+    """Content hash of every dependency in the graph (a KB object hashes its kb.json entry plus its image)."""
+    result = {}
+    for name, deps in graph.items():
+        prints = {}
+        for dep_id, path in deps.items():
+            digest = _file_hash(path, cache) if path else None
+            prints[dep_id] = f"{path}:{digest}" if dep_id.startswith("kb:") else digest
+        result[name] = prints
+    return result
+
+# --- Selection ---
+
+def select_changed(names=None):
+    """
+    Picks the scenarios affected by changes since their last green run.
+    :return: A tuple (selected names, {name: [reasons]}, {name: fingerprint} to record once they pass).
+    """
+    state = load_json(SELECTION_STATE_FILE)
+    green = state.get("green", {})
+    cache = dict(state.get("hash_cache", {}))
+    current = fingerprints(dependency_graph(names), cache)
+
+    selected, reasons = [], {}
+    for name, prints in current.items():
+        previous = green.get(name)
+        if previous is None:
+            why = ["no green run recorded"]
+        else:
+            why = [f"{dep_id} changed" for dep_id, digest in prints.items() if previous.get(dep_id) != digest]
+            why += [f"{dep_id} no longer used" for dep_id in previous if dep_id not in prints]
+        if why:
+            selected.append(name)
+            reasons[name] = why
+
+    def save_hash_cache(state):
+        state["hash_cache"] = cache
+    try:
+        update_json(SELECTION_STATE_FILE, save_hash_cache, indent=None)
+    except Exception as e:
+        log_action(f"Could not save the file hash cache: {e}", is_error=True)
+    log_action(f"Change-based selection: {len(selected)} of {len(current)} scenarios affected.")
+    return selected, reasons, current
+
+def record_results(results, current):
+    """Stores the fingerprints of scenarios that passed as their new green baseline; failed ones are reselected next time."""
+    def apply(state):
+        green = state.setdefault("green", {})
+        for result in results:
+            name = result.get("name")
+            if result.get("status") == "PASSED" and name in current:
+                green[name] = current[name]
+            else:
+                green.pop(name, None)
+    try:
+        update_json(SELECTION_STATE_FILE, apply, indent=None)
+    except Exception as e:
+        log_action(f"Could not record green runs for change-based selection: {e}", is_error=True)
+
+def reset_selection_state():
+    """Forgets all green runs, so the next change-based run selects everything."""
+    write_json(SELECTION_STATE_FILE, {}, indent=None)
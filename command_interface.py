@@ -1,23 +1,50 @@
 import os
+import hmac
 import json
-import time
-import subprocess
+import secrets
 import datetime
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from logger import log_action
+from history_store import record_report, recent_runs
+from report_stream import write_report_stream, archive_report_stream, read_report_header
 
 # Import functions from our refactored modules
 from test_runner import run_scenario_based_suite, run_data_driven_suite
 from scenario_manager import create_or_update_scenario, delete_visual_baseline
 from performance_tracker import delete_baseline as delete_performance_baseline
-from analysis_packager import create_analysis_package
+from change_selector import select_changed, record_results
+from scenario_repository import load_index
+from job_queue import QUEUE_URL_ENV
+from command_jobs import CommandJobManager, report_progress, cancel_requested
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None  # Drop files are then picked up by a cheap stat check instead
 
 # --- Constants ---
 RECOMMENDATIONS_FILE = "recommendations.json"
 INSTRUCTIONS_FILE = "claude_instructions.json" # For manual override
 REPORT_FILE = "execution_report.json"
 HISTORY_DIR = os.path.join("reports", "history")
-PYTHON_CMD = "python"
+RECOMMENDATIONS_ARCHIVE_DIR = os.path.join("reports", "recommendations") # Kept apart from report history
 FRAMEWORK_VERSION = "5.0" # AI-Assisted Mode
+COMMAND_HOST = "127.0.0.1"  # The JSON-RPC endpoint only listens locally
+COMMAND_PORT_ENV = "TACHTACH_COMMAND_PORT"  # Set to "0" to disable the JSON-RPC endpoint
+DEFAULT_COMMAND_PORT = 8766
+COMMAND_TOKEN_ENV = "TACHTACH_COMMAND_TOKEN"  # Bearer token for the JSON-RPC endpoint
+COMMAND_TOKEN_FILE = os.path.join("reports", "command_token")  # Generated token when the env var is unset
+FILE_CHECK_SECONDS = 1  # Drop-file check interval without watchdog (one stat per file)
+WATCH_SAFETY_SECONDS = 300  # With watchdog, re-check anyway in case an event was missed
+COMMAND_WORKERS_ENV = "TACHTACH_COMMAND_WORKERS"  # Size of the command job pool
+DEFAULT_COMMAND_WORKERS = 2
+DESKTOP_COMMANDS = ("run_tests", "run_changed_tests", "run_tests_with_data")  # Drive the one desktop: one at a time
+
+_report_lock = threading.Lock()  # Jobs finishing together must not archive each other's reports
+_job_manager = None
+_job_manager_lock = threading.Lock()
 
 # --- File I/O ---
 
@@ -33,11 +60,11 @@ def read_json_file(filepath):
         log_action(f"Error reading {filepath}: {e}", is_error=True)
         return None
 
-def archive_file(filepath, subfolder=''):
-    """Archives a file by moving it to the history directory with a timestamp."""
+def archive_file(filepath, subfolder='', base_dir=HISTORY_DIR):
+    """Archives a file by moving it to the history directory (or base_dir) with a timestamp."""
     if os.path.exists(filepath):
         try:
-            target_dir = os.path.join(HISTORY_DIR, subfolder)
+            target_dir = os.path.join(base_dir, subfolder)
             os.makedirs(target_dir, exist_ok=True)
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             archive_path = os.path.join(target_dir, f"{os.path.basename(filepath)}_{timestamp}.json")
@@ -47,14 +74,17 @@ def archive_file(filepath, subfolder=''):
             log_action(f"Could not archive {filepath}: {e}", is_error=True)
 
 def write_report(data):
-    """Archives the old report and writes the new one."""
+    """Archives the old report and writes the new one (JSON document plus NDJSON stream)."""
     archive_file(REPORT_FILE, subfolder='reports')
+    archive_report_stream(os.path.join(HISTORY_DIR, 'reports'))
     log_action("Writing new execution report.")
     try:
         with open(REPORT_FILE, 'w') as f:
             json.dump(data, f, indent=4)
     except Exception as e:
         log_action(f"Failed to write report: {e}", is_error=True)
+    write_report_stream(data)
+    record_report(data, source="command_interface")
 
 # --- Command Handlers ---
 
@@ -71,13 +101,36 @@ def _format_test_report(test_results):
         "tests": test_results
     }
 
+def _run_tests(params, changed_only=False):
+    """
+    Runs a scenario suite and records which scenarios are green for change-based selection.
+    :param changed_only: Only run scenarios affected by changes since their last green run.
+    """
+    names = params.get("scenarios", ["all"])
+    selected, reasons, fingerprints = select_changed(None if "all" in names else names)
+    if changed_only:
+        if params.get("dry_run"):
+            return {"status": "completed", "selected": selected, "reasons": reasons}
+        names = selected
+    results = run_scenario_based_suite(names, order=params.get("order"), max_failures=params.get("max_failures"),
+                                       shard=params.get("shard"), shard_mode=params.get("shard_mode"),
+                                       queue=params.get("queue"), progress=report_progress) if names else []
+    if not cancel_requested():  # Tests skipped by a cancellation must not count as still green
+        record_results(results, fingerprints)
+    report = _format_test_report(results)
+    if changed_only:
+        report["selection"] = {"mode": "changed", "selected": len(selected), "total": len(fingerprints),
+                               "reasons": reasons}
+    return report
+
 command_handlers = {
-    "run_tests": lambda p: _format_test_report(run_scenario_based_suite(p.get("scenarios", ["all"]))),
-    "run_tests_with_data": lambda p: _format_test_report(run_data_driven_suite(p.get("scenario_name"), p.get("data_file"))),
-    "create_scenario": lambda p: {"status": "completed" if create_or_update_scenario(p.get('name'), p.get('steps')) else "error"},
+    "run_tests": lambda p: _run_tests(p),
+    "run_changed_tests": lambda p: _run_tests(p, changed_only=True),
+    "run_tests_with_data": lambda p: _format_test_report(run_data_driven_suite(p.get("scenario_name"), p.get("data_file"),
+                                                                                progress=report_progress)),
+    "create_scenario": lambda p: {"status": "completed" if create_or_update_scenario(p.get('name'), p.get('steps'), p.get('tags')) else "error"},
     "update_baseline": lambda p: {"status": "completed" if delete_visual_baseline(p.get('visual_test_name')) else "error"},
-    "create_performance_baseline": lambda p: {"status": "completed" if delete_performance_baseline(p.get('test_name')) else "error"},
-    "get_status": lambda p: {"data": subprocess.run([PYTHON_CMD, "smart_cursor.py", "--status"], capture_output=True, text=True).stdout}
+    "create_performance_baseline": lambda p: {"status": "completed" if delete_performance_baseline(p.get('test_name')) else "error"}
 }
 
 def execute_command(command_data):
@@ -92,50 +145,316 @@ def execute_command(command_data):
         log_action(f"Unknown command '{command_name}'", is_error=True)
         return {"status": "error", "message": f"Unknown command: {command_name}"}
 
+def publish_report(report):
+    """Writes a command's report (report file, history) and a new analysis package."""
+    with _report_lock:
+        if report:
+            write_report(report)
+        # Imported here: the analytics stack (numpy) would otherwise dominate startup.
+        from analysis_packager import create_analysis_package
+        create_analysis_package()
+
+def run_instruction(instruction):
+    """Executes a command and publishes its report (unless its job was cancelled midway)."""
+    report = execute_command(instruction)
+    if cancel_requested():
+        # A partial run would read as a complete one in the report, history and trends.
+        log_action(f"Command '{instruction.get('command')}' was cancelled; its partial report is not published.")
+        if isinstance(report, dict):
+            report["cancelled"] = True
+        return report
+    publish_report(report)
+    return report
+
+# --- Command Jobs ---
+# Commands run as jobs on a small worker pool, so a long suite doesn't block
+# the interface. Submitting returns a job id at once; get_job, list_jobs and
+# cancel_job (and get_status) are answered immediately instead of queued.
+
+def get_job_manager():
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            try:
+                workers = int(os.environ.get(COMMAND_WORKERS_ENV, DEFAULT_COMMAND_WORKERS))
+                if workers < 1:
+                    raise ValueError
+            except ValueError:
+                log_action(f"Ignoring invalid {COMMAND_WORKERS_ENV}={os.environ[COMMAND_WORKERS_ENV]!r}; "
+                           f"using {DEFAULT_COMMAND_WORKERS} workers.", is_error=True)
+                workers = DEFAULT_COMMAND_WORKERS
+            _job_manager = CommandJobManager(lambda command, params: run_instruction({"command": command, "params": params}),
+                                             workers)
+        return _job_manager
+
+def _is_exclusive(command, params):
+    # Suites sent to a job queue run on the workers' desktops, not this one.
+    return command in DESKTOP_COMMANDS and not (params.get("queue") or os.environ.get(QUEUE_URL_ENV))
+
+def _apply_recommendations(actions):
+    commands = [command for action in actions for command in action.get("commands", [])]
+    done = 0
+    for command in commands:
+        if not report_progress(done, len(commands), command.get("command")):
+            break
+        # We don't generate a full report for each sub-step, just log it.
+        execute_command(command)
+        done += 1
+    report_progress(done, len(commands))
+    # After executing all, we generate a new analysis package
+    publish_report(None)
+    return {"status": "completed", "commands": len(commands)}
+
+def _get_status():
+    """Framework, job and last-run status."""
+    report = read_report_header() or {}
+    try:
+        runs = [{"run_id": run_id, "timestamp": timestamp, "success_rate": rate}
+                for run_id, timestamp, rate in recent_runs(5)]
+    except Exception as e:
+        log_action(f"Could not read recent runs: {e}", is_error=True)
+        runs = []
+    manager = get_job_manager()
+    return {
+        "status": "completed",
+        "data": {
+            "framework_version": FRAMEWORK_VERSION,
+            "scenarios": len(load_index()),
+            "jobs": manager.counts(),
+            "running": manager.list("running"),
+            "last_report": {"timestamp": report.get("timestamp"), "summary": report.get("summary")},
+            "recent_runs": runs
+        }
+    }
+
+def _job_or_error(snapshot, job_id):
+    return snapshot or {"status": "error", "message": f"Unknown job: {job_id}"}
+
+query_handlers = {
+    "get_status": lambda p: _get_status(),
+    "get_job": lambda p: _job_or_error(get_job_manager().get(p.get("job_id"), p.get("wait_seconds", 0)), p.get("job_id")),
+    "list_jobs": lambda p: {"status": "completed", "jobs": get_job_manager().list(p.get("status"))},
+    "cancel_job": lambda p: _job_or_error(get_job_manager().cancel(p.get("job_id")), p.get("job_id"))
+}
+
+def submit_command(command_data):
+    """
+    Queues a command as a job, or answers a query command at once.
+    :return: The job's snapshot (job_id, status, ...), or the query's result.
+    """
+    command_name = command_data.get("command")
+    params = command_data.get("params") or {}
+    if command_name in query_handlers:
+        return query_handlers[command_name](params)
+    if command_name not in command_handlers:
+        log_action(f"Unknown command '{command_name}'", is_error=True)
+        return {"status": "error", "message": f"Unknown command: {command_name}"}
+    return get_job_manager().submit(command_name, params, _is_exclusive(command_name, params))
+
+# --- JSON-RPC Endpoint ---
+# POST a JSON-RPC 2.0 request to http://127.0.0.1:8766/, e.g.
+#   {"jsonrpc": "2.0", "id": 1, "method": "run_tests", "params": {"scenarios": ["all"]}}
+# with "Content-Type: application/json" and "Authorization: Bearer <token>". The
+# token is $TACHTACH_COMMAND_TOKEN, or else generated at startup and written to
+# reports/command_token (readable only by the user running the interface).
+# Commands can start arbitrary applications, so requests that a web page could
+# send (other content types, a foreign Origin or Host) are rejected as well.
+# The method is a command_handlers name, whose result is the queued job
+# ({"job_id": ..., "status": "queued", ...}); poll it with get_job
+# ({"job_id": ..., "wait_seconds": 30} waits for it to finish), or a query
+# (get_status, get_job, list_jobs, cancel_job), answered directly.
+
+def _rpc_error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+def handle_rpc(request):
+    """Handles one JSON-RPC request object. :return: The response object, or None for a notification."""
+    if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+        return _rpc_error(None, -32600, "Invalid request")
+    request_id, method = request.get("id"), request["method"]
+    params = request.get("params") or {}
+    if method not in command_handlers and method not in query_handlers:
+        return _rpc_error(request_id, -32601, f"Unknown command: {method}")
+    if not isinstance(params, dict):
+        return _rpc_error(request_id, -32602, "params must be an object")
+    try:
+        report = submit_command({"command": method, "params": params})
+    except Exception as e:
+        log_action(f"Command '{method}' failed: {e}", is_error=True)
+        return _rpc_error(request_id, -32603, str(e))
+    return None if "id" not in request else {"jsonrpc": "2.0", "id": request_id, "result": report}
+
+def _command_token():
+    """The endpoint's token: $TACHTACH_COMMAND_TOKEN, or a fresh one saved to COMMAND_TOKEN_FILE."""
+    token = os.environ.get(COMMAND_TOKEN_ENV)
+    if token:
+        return token
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(COMMAND_TOKEN_FILE), exist_ok=True)
+    fd = os.open(COMMAND_TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    return token
+
+class CommandRequestHandler(BaseHTTPRequestHandler):
+    token = None  # Set by start_command_server
+
+    def _rejected(self):
+        """Checks Host, Origin and the token. :return: True if the request was refused (and answered)."""
+        port = self.server.server_address[1]
+        local = {f"{COMMAND_HOST}:{port}", f"localhost:{port}"}
+        origin = self.headers.get("Origin")
+        if self.headers.get("Host") not in local or (origin and origin not in {f"http://{host}" for host in local}):
+            self._reply({"error": "Forbidden"}, 403)
+            return True
+        supplied = self.headers.get("Authorization", "").encode("utf-8")
+        if not hmac.compare_digest(supplied, f"Bearer {self.token}".encode("utf-8")):
+            log_action(f"Rejected unauthenticated command request from {self.client_address[0]}.", is_error=True)
+            self._reply({"error": "Unauthorized"}, 401)
+            return True
+        return False
+
+    def do_POST(self):
+        if self._rejected():
+            return
+        if self.headers.get("Content-Type", "").split(";")[0].strip() != "application/json":
+            return self._reply({"error": "Content-Type must be application/json"}, 415)
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except Exception:
+            return self._reply(_rpc_error(None, -32700, "Parse error"))
+        if isinstance(body, list):
+            responses = [response for response in map(handle_rpc, body) if response is not None]
+            return self._reply(responses or None)
+        self._reply(handle_rpc(body))
+
+    def do_GET(self):
+        if self._rejected():
+            return
+        self._reply({"status": "ok", "framework_version": FRAMEWORK_VERSION} if self.path == "/health" else None,
+                    200 if self.path == "/health" else 404)
+
+    def _reply(self, body, code=200):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(code if body is not None or code != 200 else 204)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Commands are logged by execute_command
+
+def start_command_server(port=None):
+    """Serves the JSON-RPC endpoint in a background thread. :return: The server, or None if disabled."""
+    if port is None:
+        try:
+            port = int(os.environ.get(COMMAND_PORT_ENV, DEFAULT_COMMAND_PORT))
+            if not 0 <= port <= 65535:
+                raise ValueError
+        except ValueError:
+            log_action(f"Ignoring invalid {COMMAND_PORT_ENV}={os.environ[COMMAND_PORT_ENV]!r}; "
+                       f"using port {DEFAULT_COMMAND_PORT}.", is_error=True)
+            port = DEFAULT_COMMAND_PORT
+    if not port:
+        return None
+    CommandRequestHandler.token = _command_token()
+    server = ThreadingHTTPServer((COMMAND_HOST, port), CommandRequestHandler)
+    threading.Thread(target=server.serve_forever, name="command-server", daemon=True).start()
+    source = f"${COMMAND_TOKEN_ENV}" if os.environ.get(COMMAND_TOKEN_ENV) else COMMAND_TOKEN_FILE
+    log_action(f"JSON-RPC command endpoint listening on http://{COMMAND_HOST}:{port}/ (token from {source}).")
+    return server
+
+# --- Drop Files ---
+
+def start_file_watcher(wake):
+    """
+    Sets `wake` whenever a recommendations or instruction file appears or changes.
+    :return: The watchdog observer, or None without watchdog (the caller then checks every FILE_CHECK_SECONDS).
+    """
+    if Observer is None:
+        return None
+    watched = {os.path.abspath(RECOMMENDATIONS_FILE), os.path.abspath(INSTRUCTIONS_FILE)}
+
+    class DropFileHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if {os.path.abspath(event.src_path), os.path.abspath(getattr(event, "dest_path", "") or "")} & watched:
+                wake.set()
+
+    observer = Observer()
+    for directory in {os.path.dirname(path) for path in watched}:
+        observer.schedule(DropFileHandler(), directory, recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+def _drop_file_signature():
+    signature = []
+    for path in (RECOMMENDATIONS_FILE, INSTRUCTIONS_FILE):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return signature
+
+def process_drop_files():
+    """Handles a recommendations file (after confirmation) or, failing that, a manual instruction file."""
+    recommendations = read_json_file(RECOMMENDATIONS_FILE)
+
+    if recommendations:
+        log_action("Found AI-generated recommendations.")
+        print("\n--- 🤖 AI Recommendations Loaded ---")
+        for i, action in enumerate(recommendations.get("priority_actions", [])):
+            print(f"  {i+1}. Action: {action.get('action')}")
+            print(f"     Reasoning: {action.get('reasoning')}")
+
+        confirm = input("Execute these recommendations? (yes/no): ").lower().strip()
+
+        if confirm == 'yes':
+            log_action("User approved execution of recommendations.")
+            actions = recommendations.get("priority_actions", [])
+            get_job_manager().submit("apply_recommendations", {"actions": len(actions)}, exclusive=True,
+                                     run=lambda command, params: _apply_recommendations(actions))
+        else:
+            log_action("User rejected execution of recommendations.")
+
+        archive_file(RECOMMENDATIONS_FILE, base_dir=RECOMMENDATIONS_ARCHIVE_DIR)
+
+    else:
+        # Fallback to manual instruction mode if no recommendations
+        instruction = read_json_file(INSTRUCTIONS_FILE)
+        if instruction:
+            log_action("Found manual instruction file.")
+            os.remove(INSTRUCTIONS_FILE)
+            # Jobs publish their report (and a new analysis package) when they finish; queries right away.
+            result = submit_command(instruction)
+            if instruction.get("command") in query_handlers:
+                publish_report(result)
+
 # --- Main Loop ---
 
 def main():
-    """Main loop to check for recommendations or manual instructions."""
+    """
+    Serves commands over JSON-RPC and reacts to dropped recommendation or
+    instruction files as soon as they are written.
+    """
     log_action(f"AI-Assisted Command Interface v{FRAMEWORK_VERSION} started.")
+    start_command_server()
+    wake = threading.Event()
+    observer = start_file_watcher(wake)
+    if observer is None:
+        log_action(f"watchdog not installed; checking for drop files every {FILE_CHECK_SECONDS}s.")
 
+    signature = None
     while True:
-        recommendations = read_json_file(RECOMMENDATIONS_FILE)
-
-        if recommendations:
-            log_action("Found AI-generated recommendations.")
-            print("\n--- 🤖 AI Recommendations Loaded ---")
-            for i, action in enumerate(recommendations.get("priority_actions", [])):
-                print(f"  {i+1}. Action: {action.get('action')}")
-                print(f"     Reasoning: {action.get('reasoning')}")
-
-            confirm = input("Execute these recommendations? (yes/no): ").lower().strip()
-
-            if confirm == 'yes':
-                log_action("User approved execution of recommendations.")
-                for action in recommendations.get("priority_actions", []):
-                    for command in action.get("commands", []):
-                        # We don't generate a full report for each sub-step, just log it.
-                        execute_command(command)
-                # After executing all, we generate a new analysis package
-                create_analysis_package()
-            else:
-                log_action("User rejected execution of recommendations.")
-
-            archive_file(RECOMMENDATIONS_FILE, subfolder='recommendations')
-
-        else:
-            # Fallback to manual instruction mode if no recommendations
-            instruction = read_json_file(INSTRUCTIONS_FILE)
-            if instruction:
-                log_action("Found manual instruction file.")
-                report = execute_command(instruction)
-                if report:
-                    write_report(report)
-                os.remove(INSTRUCTIONS_FILE)
-                # After manual action, also generate a new analysis package
-                create_analysis_package()
-
-        time.sleep(10)
+        current = _drop_file_signature()
+        if current != signature:
+            signature = current
+            process_drop_files()
+            continue  # Re-check at once: an instruction file may be waiting behind the recommendations
+        wake.wait(WATCH_SAFETY_SECONDS if observer else FILE_CHECK_SECONDS)
+        wake.clear()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
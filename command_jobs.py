@@ -0,0 +1,190 @@
+import time
+import uuid
+import threading
+import contextvars
+from logger import log_action
+
+# --- Constants ---
+MAX_FINISHED_JOBS = 200  # Finished jobs kept for status/result queries; the oldest are forgotten first
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+# Commands submitted to the command interface become jobs, run by a fixed pool
+# of worker threads. Exclusive jobs (those that drive the desktop) run one at a
+# time; while one runs, the workers pick up other queued jobs instead of waiting.
+# Cancelling a queued job drops it; a running job is asked to stop through
+# report_progress(), which long-running commands call between tests or steps.
+
+_current_job = contextvars.ContextVar("tachtach_command_job", default=None)
+
+class CommandJob:
+    def __init__(self, command, params, exclusive, run=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.command = command
+        self.params = params
+        self.exclusive = exclusive
+        self.run = run
+        self.status = "queued"  # queued, running, succeeded, failed, cancelled
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = None  # {"done": n, "total": n, "message": str}
+        self.cancel_requested = False
+        self.result = None
+        self.error = None
+
+    def snapshot(self, include_result=True):
+        data = {
+            "job_id": self.id,
+            "command": self.command,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": dict(self.progress) if self.progress else None,
+            "cancel_requested": self.cancel_requested
+        }
+        if self.error:
+            data["error"] = self.error
+        if include_result and self.status in FINISHED_STATES:
+            data["result"] = self.result
+        return data
+
+class CommandJobManager:
+    """
+    A bounded pool running command jobs.
+    :param run: run(command, params) -> result, called on a worker thread.
+    """
+
+    def __init__(self, run, max_workers=2):
+        self._run = run
+        self._jobs = {}  # job id -> CommandJob, in submission order
+        self._pending = []
+        self._exclusive_busy = False
+        self._cond = threading.Condition()
+        for i in range(max(1, int(max_workers))):
+            threading.Thread(target=self._work, name=f"command-worker-{i + 1}", daemon=True).start()
+
+    def submit(self, command, params, exclusive=False, run=None):
+        """
+        Queues a command.
+        :param exclusive: Never run alongside another exclusive job.
+        :param run: Runs this job instead of the manager's run function.
+        :return: The job's snapshot (with its job_id).
+        """
+        job = CommandJob(command, params, exclusive, run)
+        with self._cond:
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._trim()
+            self._cond.notify_all()
+        log_action(f"Queued command '{command}' as job {job.id}.")
+        return job.snapshot()
+
+    def get(self, job_id, wait_seconds=0, include_result=True):
+        """
+        A job's status, progress and (once finished) result.
+        :param wait_seconds: Long-poll: wait up to this long for the job to finish.
+        :return: The snapshot, or None for an unknown (or forgotten) job.
+        """
+        deadline = time.monotonic() + (wait_seconds or 0)
+        with self._cond:
+            job = self._jobs.get(job_id)
+            while job is not None and job.status not in FINISHED_STATES and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return job.snapshot(include_result) if job else None
+
+    def list(self, status=None):
+        """Snapshots (without results) of all known jobs, oldest first, optionally filtered by status."""
+        with self._cond:
+            return [job.snapshot(include_result=False) for job in self._jobs.values()
+                    if status is None or job.status == status]
+
+    def cancel(self, job_id):
+        """
+        Cancels a job: a queued one never starts, a running one stops at its next progress report.
+        :return: The snapshot, or None for an unknown job.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "queued":
+                self._pending.remove(job)
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                self._cond.notify_all()
+            elif job.status == "running":
+                job.cancel_requested = True
+            snapshot = job.snapshot()
+        log_action(f"Cancellation requested for job {job_id} ({snapshot['status']}).")
+        return snapshot
+
+    def counts(self):
+        with self._cond:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _next_job(self):
+        for job in self._pending:
+            if not (job.exclusive and self._exclusive_busy):
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._pending.remove(job)
+                self._exclusive_busy = self._exclusive_busy or job.exclusive
+                job.status = "running"
+                job.started_at = time.time()
+
+            token = _current_job.set(job)
+            try:
+                result, error = (job.run or self._run)(job.command, job.params), None
+            except Exception as e:
+                log_action(f"Job {job.id} ('{job.command}') failed: {e}", is_error=True)
+                result, error = None, str(e)
+            finally:
+                _current_job.reset(token)
+
+            with self._cond:
+                if job.exclusive:
+                    self._exclusive_busy = False
+                job.result, job.error = result, error
+                if job.cancel_requested:
+                    job.status = "cancelled"
+                elif error or (isinstance(result, dict) and result.get("status") == "error"):
+                    job.status = "failed"
+                else:
+                    job.status = "succeeded"
+                job.finished_at = time.time()
+                self._trim()
+                self._cond.notify_all()
+            log_action(f"Job {job.id} ('{job.command}') {job.status} in {job.finished_at - job.started_at:.1f}s.")
+
+def cancel_requested():
+    """Whether the current job has been asked to stop (False outside jobs)."""
+    job = _current_job.get()
+    return job is not None and job.cancel_requested
+
+def report_progress(done, total=None, message=None):
+    """
+    Records the current job's progress (a no-op outside jobs).
+    :return: False once the job has been cancelled, so the caller should stop.
+    """
+    job = _current_job.get()
+    if job is None:
+        return True
+    job.progress = {"done": done, "total": total, "message": message}
+    return not job.cancel_requested
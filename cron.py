@@ -0,0 +1,83 @@
+import datetime
+
+# --- Constants ---
+# Fields of a 5-field cron expression: minute hour day-of-month month day-of-week (0 or 7 = Sunday).
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@nightly": "0 2 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *"
+}
+MAX_SEARCH_YEARS = 5  # "30 2 31 2 *" never fires; give up instead of looping forever
+
+def _parse_field(text, low, high):
+    """Parses one field ("*", "*/5", "1-5", "0,30", "10-50/10") into a set of values."""
+    values = set()
+    for part in text.split(","):
+        spec, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"Invalid step in '{part}'")
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (int(v) for v in spec.split("-", 1))
+        else:
+            start = int(spec)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"'{part}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronExpression:
+    """A parsed cron expression; next_after() gives fire times in local (naive) time."""
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' must have 5 fields")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(text, low, high) for text, (low, high) in zip(fields, FIELD_RANGES))
+        self.weekdays = {day % 7 for day in weekdays}  # 0 = Sunday
+        # Standard cron: if both day fields are restricted, a day matching either one fires.
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, date):
+        in_days = date.day in self.days
+        in_weekdays = (date.isoweekday() % 7) in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment):
+        """
+        The first fire time strictly after `moment` (a naive datetime).
+        :return: A datetime, or None if the expression never fires.
+        """
+        current = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = moment + datetime.timedelta(days=366 * MAX_SEARCH_YEARS)
+        while current <= limit:
+            if current.month not in self.months:
+                year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+                current = current.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(current):
+                current = (current + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if current.hour not in self.hours:
+                current = (current + datetime.timedelta(hours=1)).replace(minute=0)
+                continue
+            if current.minute not in self.minutes:
+                current += datetime.timedelta(minutes=1)
+                continue
+            return current
+        return None
+
+    def __repr__(self):
+        return f"CronExpression('{self.expression}')"
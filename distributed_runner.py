@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+from logger import log_action
+from event_log import install_event_log, event_context, flush_events
+from performance_tracker import flush_baselines
+from test_runner import run_single_test
+from job_queue import connect_queue, serve, LEASE_SECONDS, DEFAULT_PORT, QUEUE_DB, QUEUE_TOKEN_ENV
+
+# --- Constants ---
+WORKER_POLL_SECONDS = 2  # Idle workers ask for work this often
+HEARTBEAT_SECONDS = 30  # Well inside LEASE_SECONDS, so one missed heartbeat doesn't cost the lease
+
+# The coordinator (test_runner.run_on_queue, used whenever a queue is configured)
+# submits a suite as one batch and collects the results as workers finish
+# them; throughput scales with the number of workers. Workers (run_worker) run
+# on any machine with the framework and the target application, one scenario
+# at a time. Start the queue service on the coordinator machine with
+#   TACHTACH_QUEUE_TOKEN=<secret> python distributed_runner.py serve --host 0.0.0.0 --port 8765
+# and a worker on each runner box with
+#   TACHTACH_QUEUE_TOKEN=<secret> python distributed_runner.py worker --queue http://<coordinator>:8765
+# Without a token the service only listens on 127.0.0.1 (workers on the same machine).
+
+# --- Worker ---
+
+def _worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _heartbeat(queue, job, worker, stop):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            if not queue.heartbeat(job["job_id"], worker, LEASE_SECONDS):
+                log_action(f"Lost the lease on job {job['job_id']} (cancelled or expired); "
+                           f"its result may be discarded.", is_error=True)
+                return
+        except Exception as e:
+            log_action(f"Heartbeat for job {job['job_id']} failed: {e}", is_error=True)
+
+def run_job(queue, job, worker):
+    """Runs one leased scenario while heartbeating, then reports its result."""
+    log_action(f"Worker {worker}: running '{job['scenario']}' (job {job['job_id']}, attempt {job['attempt']}).")
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(queue, job, worker, stop), daemon=True)
+    beat.start()
+    try:
+        with event_context(run_id=job["batch_id"], worker=worker):
+            result = run_single_test(job["scenario"], job["steps"])
+        flush_baselines()
+    except Exception as e:
+        log_action(f"Job {job['job_id']} crashed: {e}", is_error=True)
+        result = {"name": job["scenario"], "status": "ERROR", "error": f"Worker error: {e}"}
+    finally:
+        stop.set()
+        flush_events()
+    result["worker"] = worker
+    if not queue.complete(job["job_id"], worker, result):
+        log_action(f"Result of job {job['job_id']} was not accepted (the job was cancelled or re-leased).")
+    return result
+
+def run_worker(queue, worker=None, once=False, max_jobs=None):
+    """
+    Leases and runs jobs until interrupted.
+    :param once: Stop when the queue is empty instead of waiting for more work.
+    :param max_jobs: Stop after this many jobs.
+    :return: Number of jobs run.
+    """
+    install_event_log()
+    worker = worker or _worker_id()
+    log_action(f"Worker {worker} started.")
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        try:
+            job = queue.lease(worker, LEASE_SECONDS)
+        except Exception as e:
+            log_action(f"Worker {worker} could not reach the job queue: {e}", is_error=True)
+            job = None
+        if job is None:
+            if once:
+                break
+            time.sleep(WORKER_POLL_SECONDS)
+            continue
+        run_job(queue, job, worker)
+        done += 1
+    log_action(f"Worker {worker} stopped after {done} jobs.")
+    return done
+
+# --- Main function for standalone execution ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed test execution: job queue service and workers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Serve this machine's job queue over HTTP.")
+    serve_parser.add_argument("--host", default="127.0.0.1",
+                              help=f"Listen address; anything but loopback requires ${QUEUE_TOKEN_ENV}.")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--db", default=QUEUE_DB)
+    worker_parser = commands.add_parser("worker", help="Run jobs from a queue.")
+    worker_parser.add_argument("--queue", help="Queue url or 'local' (default: $TACHTACH_QUEUE_URL).")
+    worker_parser.add_argument("--id", help="Worker name (default: <host>-<pid>).")
+    worker_parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+    worker_parser.add_argument("--max-jobs", type=int)
+    status_parser = commands.add_parser("status", help="Print a batch's progress.")
+    status_parser.add_argument("batch_id")
+    status_parser.add_argument("--queue")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.db)
+        return
+    queue = connect_queue(args.queue)
+    if queue is None:
+        parser.error("No queue configured: pass --queue or set TACHTACH_QUEUE_URL.")
+    if args.command == "worker":
+        run_worker(queue, args.id, args.once, args.max_jobs)
+    else:
+        print(json.dumps(queue.batch(args.batch_id), indent=2))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        log_action(f"Distributed runner failed: {e}", is_error=True)
+        sys.exit(1)
@@ -0,0 +1,162 @@
+import sys
+import json
+import math
+import datetime
+import statistics
+from logger import log_action
+from history_store import load_step_durations
+
+# --- Constants ---
+DRIFT_LOOKBACK_DAYS = 90  # History scanned for change points
+CALIBRATION_SAMPLES = 20  # Samples needed to estimate a level (and its noise) before judging new ones
+CUSUM_DRIFT_K = 0.5  # Allowance, in noise std devs: shifts smaller than ~2*k are ignored
+TARGET_ARL = 20000  # In-control average run length: samples per step series between false alarms
+CONFIRMATION_SAMPLES = 10  # Samples after an alarm that must show the shift before it is reported
+Z_CLIP = 4.0  # Caps single-sample influence so one outlier can't trigger an alarm
+MIN_SIGMA = 0.01  # Noise floor in log space (~1%), for very stable steps
+MIN_DRIFT_PERCENT = 3.0  # Smallest relative shift tracked or reported, however quiet the step
+
+# --- CUSUM ---
+
+def cusum_threshold(arl, k):
+    """
+    Decision interval h giving a two-sided CUSUM the requested in-control
+    average run length, via Siegmund's approximation (each side alarms at
+    twice the two-sided ARL).
+    :param arl: Expected samples between false alarms.
+    :param k: Allowance, in std devs.
+    :return: h, in std devs.
+    """
+    def one_sided_arl(h):
+        b = 2 * k * (h + 1.166)
+        return (math.exp(b) - b - 1) / (2 * k * k)
+    low, high = 0.0, 50.0
+    for _ in range(60):
+        mid = (low + high) / 2
+        low, high = (mid, high) if one_sided_arl(mid) < 2 * arl else (low, mid)
+    return round(high, 2)
+
+CUSUM_THRESHOLD_H = cusum_threshold(TARGET_ARL, CUSUM_DRIFT_K)  # ~8.7 std devs
+
+def detect_change_points(samples):
+    """
+    Self-starting two-sided CUSUM over one step's duration series.
+
+    Works on log durations, so a few percent of creep per release is a level
+    shift of the same size whatever the step's absolute latency. Each sample is
+    standardized against the mean/std of all in-control samples since the last
+    change (not a fixed baseline), which keeps the false-alarm rate low without
+    a long calibration period. After each alarm the reference restarts at the
+    change point, so successive shifts are reported separately. The allowance
+    never drops below half of MIN_DRIFT_PERCENT, so on very quiet steps creep
+    too small to report doesn't accumulate into an alarm either.
+    :param samples: List of (timestamp, duration_ms), oldest first.
+    :return: List of change dicts (change_index, detected_index, direction, before_ms, after_ms, shift_percent).
+    """
+    values = [math.log(max(ms, 0.001)) for _, ms in samples]
+    min_shift = math.log(1 + MIN_DRIFT_PERCENT / 100)
+    changes = []
+    start = 0
+    while len(values) - start > CALIBRATION_SAMPLES:
+        # Welford running mean/variance of the current in-control segment.
+        count, mean, m2 = 0, 0.0, 0.0
+        upper = lower = 0.0
+        upper_start = lower_start = None
+        alarm = None
+        for i in range(start, len(values)):
+            if count >= CALIBRATION_SAMPLES:
+                sigma = max(math.sqrt(m2 / (count - 1)), MIN_SIGMA)
+                raw_z = (values[i] - mean) / sigma
+                z = max(-Z_CLIP, min(Z_CLIP, raw_z))
+                k = max(CUSUM_DRIFT_K, min_shift / (2 * sigma))
+                if upper == 0:
+                    upper_start = i
+                if lower == 0:
+                    lower_start = i
+                upper = max(0.0, upper + z - k)
+                lower = max(0.0, lower - z - k)
+                if upper > CUSUM_THRESHOLD_H:
+                    alarm = (upper_start, i, "slower", 2 * k * sigma)
+                    break
+                if lower > CUSUM_THRESHOLD_H:
+                    alarm = (lower_start, i, "faster", 2 * k * sigma)
+                    break
+                if abs(raw_z) > Z_CLIP:
+                    continue  # Outliers don't update the reference
+            count += 1
+            delta = values[i] - mean
+            mean += delta / count
+            m2 += delta * (values[i] - mean)
+        if alarm is None:
+            break
+
+        change_index, detected_index, direction, min_level_shift = alarm
+        # The samples that raised the alarm overstate the shift by construction
+        # (a chance run looks like one), so it is measured on the ones after it
+        # and must still be as large as the shift the CUSUM is tuned for.
+        confirmation = values[detected_index + 1:detected_index + 1 + CONFIRMATION_SAMPLES]
+        if len(confirmation) < CONFIRMATION_SAMPLES:
+            break  # Too recent to tell a shift from a run of bad luck; judged on a later scan
+        before_level = statistics.median(values[start:change_index])
+        after_level = statistics.median(confirmation)
+        shift = (math.exp(after_level - before_level) - 1) * 100
+        if abs(after_level - before_level) >= min_level_shift and (shift > 0) == (direction == "slower"):
+            changes.append({
+                "change_index": change_index,
+                "detected_index": detected_index,
+                "direction": direction,
+                "before_ms": round(math.exp(before_level), 2),
+                "after_ms": round(math.exp(after_level), 2),
+                "shift_percent": round(shift, 1)
+            })
+        start = change_index
+    return changes
+
+# --- Entry Point ---
+
+def detect_drift(test_name=None, lookback_days=DRIFT_LOOKBACK_DAYS):
+    """
+    Scans the per-step duration history for latency level shifts, separately
+    for raw samples and for each roll-up tier (hourly and daily bucket medians).
+    :param test_name: Optional test to restrict the scan to.
+    :return: A list of drift findings, largest overall slowdown first.
+    """
+    since = (datetime.datetime.now() - datetime.timedelta(days=lookback_days)).isoformat()
+    try:
+        rows = load_step_durations(test_name, since=since)
+    except Exception as e:
+        log_action(f"Error loading step durations for drift detection: {e}", is_error=True)
+        return []
+
+    # One series per tier: a bucket median is far less noisy than a single
+    # sample, so mixing them would distort the noise estimate (and so the alarms).
+    series = {}
+    for row in rows:
+        series.setdefault((row["test_name"], row["step"], row["tier"]), []).append((row["timestamp"], row["duration_ms"]))
+
+    findings = []
+    for (name, step, tier), samples in series.items():
+        changes = detect_change_points(samples)
+        if not changes:
+            continue
+        for change in changes:
+            change["changed_at"] = samples[change.pop("change_index")][0]
+            change["detected_at"] = samples[change.pop("detected_index")][0]
+        baseline = changes[0]["before_ms"]
+        findings.append({
+            "test_name": name,
+            "step": step,
+            "tier": tier,
+            "samples": len(samples),
+            "changes": changes,
+            # Net effect of all detected shifts, relative to the level before the first one.
+            "total_shift_percent": round((changes[-1]["after_ms"] / baseline - 1) * 100, 1) if baseline else None
+        })
+
+    findings.sort(key=lambda f: f["total_shift_percent"] or 0, reverse=True)
+    slower = sum(1 for f in findings if (f["total_shift_percent"] or 0) > 0)
+    log_action(f"Drift detection: {slower} step(s) got slower, {len(findings) - slower} changed otherwise.")
+    return findings
+
+if __name__ == '__main__':
+    print(json.dumps(detect_drift(sys.argv[1] if len(sys.argv) > 1 else None), indent=2))
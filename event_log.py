@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import argparse
+import datetime
+import itertools
+import threading
+import contextlib
+import contextvars
+from logger import log_action, add_log_listener
+
+# --- Constants ---
+EVENTS_DIR = os.path.join("reports", "events")
+EVENT_INDEX_DB = os.path.join(EVENTS_DIR, "index.db")
+EVENT_CONTEXT_ENV = "TACHTACH_EVENT_CONTEXT"  # JSON context handed to step subprocesses
+EVENT_BATCH_SIZE = 200  # Buffered events per flush at most
+EVENT_FLUSH_INTERVAL = 1.0  # Seconds; the next event after this flushes the buffer
+SQLITE_TIMEOUT = 30
+
+# Events are JSON lines in daily segments (events-YYYYMMDD.jsonl). Every flush
+# appends one block per (run_id, scenario) with a single O_APPEND write and
+# records the block's byte range in the SQLite sidecar index, so a query reads
+# only the blocks of the runs/scenarios it asks for.
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    run_id TEXT,
+    scenario TEXT,
+    first_time REAL NOT NULL,
+    last_time REAL NOT NULL,
+    events INTEGER NOT NULL,
+    errors INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blocks_run ON blocks (run_id, first_time);
+CREATE INDEX IF NOT EXISTS idx_blocks_scenario ON blocks (scenario, first_time);
+CREATE INDEX IF NOT EXISTS idx_blocks_time ON blocks (first_time);
+"""
+
+_context = contextvars.ContextVar("tachtach_event_context", default={})
+_buffer = []
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+_installed = False
+_run_numbers = itertools.count(1)  # Runs started in the same second by one process still get distinct ids
+
+# --- Context ---
+
+@contextlib.contextmanager
+def event_context(**fields):
+    """Adds fields (run_id, scenario, step, action, ...) to every event logged inside the block."""
+    token = _context.set(dict(_context.get(), **fields))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+def current_context():
+    return dict(_context.get())
+
+def context_env():
+    """Environment for a subprocess whose events should carry the current context."""
+    return {EVENT_CONTEXT_ENV: json.dumps(_context.get())}
+
+def current_run_id():
+    """The run_id of the current context, or None outside runs."""
+    return _context.get().get("run_id")
+
+def new_run_id():
+    return f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_run_numbers)}"
+
+# --- Writing ---
+
+def log_event(event, level="INFO", message=None, **fields):
+    """
+    Records one structured event with the current context.
+    :param event: Event name, e.g. "step.finished".
+    :param fields: Extra fields (duration_ms, status, ...).
+    """
+    record = {"time": round(time.time(), 6), "level": level, "event": event, "pid": os.getpid()}
+    record.update(_context.get())
+    if message is not None:
+        record["message"] = message
+    record.update(fields)
+    _append(record)
+
+def _on_log(record):
+    """log_action listener: every log line becomes a "log" event."""
+    entry = {"time": round(record["time"], 6), "level": record["level"], "event": "log", "pid": os.getpid()}
+    entry.update(_context.get())
+    entry["message"] = record["message"]
+    _append(entry)
+
+def _append(record):
+    global _last_flush
+    with _buffer_lock:
+        _buffer.append(record)
+        due = len(_buffer) >= EVENT_BATCH_SIZE or time.monotonic() - _last_flush >= EVENT_FLUSH_INTERVAL
+    if due:
+        flush_events()
+
+def _connect_index():
+    os.makedirs(EVENTS_DIR, exist_ok=True)
+    conn = sqlite3.connect(EVENT_INDEX_DB, timeout=SQLITE_TIMEOUT, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(INDEX_SCHEMA)
+    return conn
+
+def flush_events():
+    """Writes buffered events to the current segment and indexes the new blocks."""
+    global _last_flush
+    with _buffer_lock:
+        records = list(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not records:
+        return True
+
+    groups = {}
+    for record in records:
+        groups.setdefault((record.get("run_id"), record.get("scenario")), []).append(record)
+
+    segment = f"events-{datetime.datetime.now().strftime('%Y%m%d')}.jsonl"
+    blocks = []
+    try:
+        os.makedirs(EVENTS_DIR, exist_ok=True)
+        fd = os.open(os.path.join(EVENTS_DIR, segment),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            for (run_id, scenario), group in groups.items():
+                data = "".join(json.dumps(r, separators=(",", ":"), default=str) + "\n" for r in group).encode("utf-8")
+                written = 0
+                while written < len(data):
+                    written += os.write(fd, data[written:])
+                end = os.lseek(fd, 0, os.SEEK_CUR)  # O_APPEND: our block ends exactly here
+                blocks.append((segment, end - len(data), len(data), run_id, scenario, group[0]["time"],
+                               group[-1]["time"], len(group), sum(1 for r in group if r.get("level") == "ERROR")))
+        finally:
+            os.close(fd)
+
+        conn = _connect_index()
+        try:
+            conn.executemany("INSERT INTO blocks (segment, offset, length, run_id, scenario, first_time, last_time, "
+                             "events, errors) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", blocks)
+        finally:
+            conn.close()
+        return True
+    except Exception as e:
+        print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} [CRITICAL]: Failed to write events: {e}",
+              file=sys.__stderr__)
+        return False
+
+def install_event_log():
+    """
+    Starts recording log_action lines as structured events (once per process),
+    inheriting the context a parent process passed in TACHTACH_EVENT_CONTEXT.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    inherited = os.environ.get(EVENT_CONTEXT_ENV)
+    if inherited:
+        try:
+            _context.set(dict(json.loads(inherited)))
+        except ValueError:
+            pass
+    add_log_listener(_on_log)
+    atexit.register(flush_events)
+
+# --- Querying ---
+
+def query_events(run_id=None, scenario=None, step=None, level=None, event=None, since=None, limit=None):
+    """
+    Yields matching events, oldest block first. run_id/scenario/since narrow the
+    blocks read through the index; step/level/event filter individual lines.
+    :param since: Optional datetime or epoch seconds.
+    """
+    flush_events()
+    if not os.path.exists(EVENT_INDEX_DB):
+        return
+    query = "SELECT segment, offset, length FROM blocks WHERE 1 = 1"
+    params = []
+    if run_id:
+        query += " AND run_id = ?"
+        params.append(run_id)
+    if scenario:
+        query += " AND scenario = ?"
+        params.append(scenario)
+    if since is not None:
+        query += " AND last_time >= ?"
+        params.append(since.timestamp() if isinstance(since, datetime.datetime) else since)
+    if level == "ERROR":
+        query += " AND errors > 0"
+    query += " ORDER BY first_time"
+
+    conn = _connect_index()
+    try:
+        blocks = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+    returned = 0
+    handles = {}
+    try:
+        for segment, offset, length in blocks:
+            if segment not in handles:
+                handles[segment] = open(os.path.join(EVENTS_DIR, segment), 'rb')
+            f = handles[segment]
+            f.seek(offset)
+            for line in f.read(length).splitlines():
+                record = json.loads(line)
+                if step is not None and record.get("step") != step:
+                    continue
+                if level and record.get("level") != level:
+                    continue
+                if event and record.get("event") != event:
+                    continue
+                yield record
+                returned += 1
+                if limit and returned >= limit:
+                    return
+    finally:
+        for f in handles.values():
+            f.close()
+
+def list_runs(limit=20):
+    """Returns the most recent run IDs with their time span, event and error counts."""
+    flush_events()
+    if not os.path.exists(EVENT_INDEX_DB):
+        return []
+    conn = _connect_index()
+    try:
+        rows = conn.execute(
+            "SELECT run_id, MIN(first_time), MAX(last_time), SUM(events), SUM(errors) FROM blocks "
+            "WHERE run_id IS NOT NULL GROUP BY run_id ORDER BY MAX(last_time) DESC LIMIT ?", (limit,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{"run_id": r[0], "started": datetime.datetime.fromtimestamp(r[1]).isoformat(timespec="seconds"),
+             "ended": datetime.datetime.fromtimestamp(r[2]).isoformat(timespec="seconds"),
+             "events": r[3], "errors": r[4]} for r in rows]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the structured event log.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    runs_parser = sub.add_parser("runs", help="List recent runs.")
+    runs_parser.add_argument("--limit", type=int, default=20)
+    query_parser = sub.add_parser("query", help="Print matching events as JSON lines.")
+    query_parser.add_argument("--run", dest="run_id")
+    query_parser.add_argument("--scenario")
+    query_parser.add_argument("--step", type=int)
+    query_parser.add_argument("--level", choices=["INFO", "ERROR"])
+    query_parser.add_argument("--event")
+    query_parser.add_argument("--since-hours", type=float, help="Only events from the last N hours.")
+    query_parser.add_argument("--limit", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "runs":
+        for run in list_runs(args.limit):
+            print(json.dumps(run))
+        return
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    for record in query_events(args.run_id, args.scenario, args.step, args.level, args.event, since, args.limit):
+        print(json.dumps(record))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except BrokenPipeError:
+        pass
+    except Exception as e:
+        log_action(f"Event log query failed: {e}", is_error=True)
+        sys.exit(1)
@@ -0,0 +1,148 @@
+import json
+from logger import log_action
+
+# --- Constants ---
+RESTORE_KEY = "restore"  # Step field: steps that bring the app back to the state right after this step
+
+# Scenarios are merged into a prefix tree of steps, so a setup shared by several
+# scenarios (start-app, connect-app, login, ...) runs once before the suite
+# branches. Before each further branch the app has to be returned to the branch
+# point: the nearest step on the path that declares a checkpoint, e.g.
+#   {"action": "click-uia", "target": "Login", "restore": [{"action": "click-uia", "target": "Home"}]}
+# has its restore steps run, followed by the steps between it and the branch
+# point. Without a checkpoint, or if restoring fails, the path is replayed from
+# the first step, which is what running every scenario on its own would do.
+#
+# Siblings run in the order of their best-ranked scenario (ranks follow the
+# suite order, e.g. failure history), but each branch is finished before the
+# next one starts: a highly ranked scenario waits behind lower-ranked ones that
+# share a branch with an even higher ranked one. Set TACHTACH_SHARE_PREFIXES=0
+# to run the suite strictly in order instead.
+
+class PlanNode:
+    """One step of the prefix tree, shared by every scenario in `scenarios`."""
+    __slots__ = ("step", "index", "rank", "restore", "children", "scenarios", "ends")
+
+    def __init__(self, step, index, rank=0):
+        self.step = step
+        self.index = index  # Position of the step within each scenario (0-based; -1 for the root)
+        self.rank = rank  # Suite position of the best-ranked scenario passing through this step
+        self.restore = step.get(RESTORE_KEY) if step else None
+        self.children = {}
+        self.scenarios = []  # Scenarios passing through this step
+        self.ends = []  # Scenarios whose last step this is
+
+def step_key(step):
+    return json.dumps({key: value for key, value in step.items() if key != RESTORE_KEY}, sort_keys=True)
+
+def build_plan(scenarios):
+    """
+    Builds the prefix tree for {name: steps}, in suite order (best-ranked first).
+    :return: The root PlanNode.
+    """
+    root = PlanNode(None, -1)
+    for rank, (name, steps) in enumerate(scenarios.items()):
+        node = root
+        node.scenarios.append(name)
+        for step in steps:
+            key = step_key(step)
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = PlanNode(step, node.index + 1, rank)
+            elif child.restore is None and step.get(RESTORE_KEY):
+                child.restore = step[RESTORE_KEY]
+            node = child
+            node.scenarios.append(name)
+        node.ends.append(name)
+    return root
+
+def count_steps(node):
+    """Steps the plan executes at minimum (one per tree node, before any restores)."""
+    total, stack = 0, [node]
+    while stack:
+        current = stack.pop()
+        total += len(current.children)
+        stack.extend(current.children.values())
+    return total
+
+# --- Execution ---
+
+def execute_plan(root, run_step, max_failures=None, should_stop=None):
+    """
+    Runs a plan depth-first.
+    :param run_step: run_step(step, index, names) -> dict with at least "ok". `names` are
+                     the scenarios whose result depends on the step (empty for restore/replay steps).
+    :param max_failures: Stop once this many scenarios have failed (fail-fast); the rest get no outcome.
+    :param should_stop: Optional should_stop(outcomes) -> bool, checked before each step (e.g. cancellation).
+    :return: ({name: {"steps": [step info...], "failed": bool}}, stats dict)
+    """
+    outcomes = {}
+    stats = {"executed": 0, "restores": 0, "replays": 0, "failed": 0}
+
+    def stopped():
+        if should_stop is not None and should_stop(outcomes):
+            return True
+        return max_failures is not None and stats["failed"] >= max_failures
+
+    def run(step, index, names):
+        stats["executed"] += 1
+        return run_step(step, index, names)
+
+    def fail(node, infos, info):
+        for name in node.scenarios:
+            outcomes[name] = {"steps": infos + [info], "failed": True}
+        stats["failed"] += len(node.scenarios)
+
+    def return_to(path):
+        """Brings the app back to the end of path. :return: None, or (index, info) of a failed replay step."""
+        for depth in range(len(path) - 1, -1, -1):
+            if not path[depth].restore:
+                continue
+            stats["restores"] += 1
+            if (all(run(step, None, ()).get("ok") for step in path[depth].restore) and
+                    all(run(node.step, None, ()).get("ok") for node in path[depth + 1:])):
+                return None
+            log_action("  Restoring the checkpoint failed; replaying the shared steps from the start.", is_error=True)
+            break
+        stats["replays"] += 1
+        for node in path:
+            info = run(node.step, node.index, ())
+            if not info.get("ok"):
+                return node.index, info
+        return None
+
+    def visit(node, path, infos):
+        # Walk straight down single-child chains; recurse only where the tree branches.
+        while True:
+            for name in node.ends:
+                outcomes[name] = {"steps": list(infos), "failed": False}
+            if len(node.children) != 1 or stopped():
+                break
+            child = next(iter(node.children.values()))
+            info = run(child.step, child.index, child.scenarios)
+            if not info.get("ok"):
+                fail(child, infos, info)
+                return
+            node = child
+            path.append(child)
+            infos.append(info)
+
+        dirty = False
+        for child in sorted(node.children.values(), key=lambda c: c.rank):
+            if stopped():
+                return
+            if dirty:
+                failure = return_to(path)
+                if failure:
+                    index, info = failure
+                    fail(child, infos[:index], info)
+                    continue
+            dirty = True
+            info = run(child.step, child.index, child.scenarios)
+            if not info.get("ok"):
+                fail(child, infos, info)
+                continue
+            visit(child, path + [child], infos + [info])
+
+    visit(root, [], [])
+    return outcomes, stats
@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import datetime
+from logger import log_action
+from history_store import connect, HISTORY_DB
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    log_action("NumPy not found. Flakiness analytics disabled.", is_error=True)
+
+# --- Constants ---
+MATRIX_CACHE_FILE = os.path.join("reports", "status_matrix.npz")
+ANALYTICS_WINDOW = 5000  # Runs (columns) analyzed, and kept in the cache
+TOP_N = 20  # Entries reported per signal
+MIN_RESULTS_FOR_FLIP_RATE = 5
+CLUSTER_MAX_TESTS = 2000  # Most-failing tests considered for co-failure clustering
+CLUSTER_MIN_CO_FAILURES = 3
+CLUSTER_MIN_JACCARD = 0.6
+HOUR_SKEW_FACTOR = 2.0  # A test's peak-hour failure rate must be this many times its overall rate
+HOUR_SKEW_MIN_Z = 5.0  # ...and its peak-hour failure count this many std devs above expectation
+HOUR_SKEW_MIN_FAILURES = 3
+
+NOT_RUN, PASSED, FAILED = -1, 0, 1
+
+# --- Status Matrix ---
+
+def _encode_status(status):
+    return PASSED if status == "PASSED" else FAILED
+
+def _load_cache():
+    if not os.path.exists(MATRIX_CACHE_FILE):
+        return None
+    try:
+        with np.load(MATRIX_CACHE_FILE, allow_pickle=False) as data:
+            return {key: data[key] for key in ("tests", "run_ids", "timestamps", "matrix")}
+    except Exception as e:
+        log_action(f"Ignoring unreadable status matrix cache: {e}", is_error=True)
+        return None
+
+def _save_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(MATRIX_CACHE_FILE), exist_ok=True)
+        tmp_path = MATRIX_CACHE_FILE + ".tmp.npz"
+        np.savez(tmp_path, **cache)
+        os.replace(tmp_path, MATRIX_CACHE_FILE)
+    except Exception as e:
+        log_action(f"Could not save status matrix cache: {e}", is_error=True)
+
+def load_status_matrix(limit_runs=ANALYTICS_WINDOW, db_path=HISTORY_DB):
+    """
+    Builds the tests-by-runs status matrix (int8: -1 not run, 0 passed, 1 failed),
+    oldest run first. The matrix is cached on disk and only runs newer than the
+    cache are read from the history store on each call.
+
+    Flip rates and streaks need individual results, which roll-ups don't keep,
+    so the matrix covers the raw tier only: runs older than the oldest raw
+    result are dropped from the cache as history is rolled up.
+    :return: A dict with tests, run_ids, timestamps (numpy arrays) and matrix.
+    """
+    cache = _load_cache()
+    conn = connect(db_path)
+    try:
+        raw_start = conn.execute("SELECT MIN(timestamp) FROM test_results").fetchone()[0] or ""
+        if cache is not None and len(cache["run_ids"]):
+            cache = _drop_before(cache, raw_start)
+        if cache is not None and len(cache["run_ids"]):
+            last_ts = str(cache["timestamps"][-1])
+            known = conn.execute("SELECT COUNT(*) FROM runs WHERE timestamp >= ? AND timestamp <= ?",
+                                 (str(cache["timestamps"][0]), last_ts)).fetchone()[0]
+            if known != len(cache["run_ids"]):
+                cache = None  # Runs arrived out of order; rebuild.
+        if cache is None or not len(cache["run_ids"]):
+            cache = {"tests": np.array([], dtype=str), "run_ids": np.array([], dtype=str),
+                     "timestamps": np.array([], dtype=str), "matrix": np.zeros((0, 0), dtype=np.int8)}
+            last_ts = ""
+
+        new_runs = conn.execute("SELECT run_id, timestamp FROM runs WHERE timestamp > ? AND timestamp >= ? "
+                                "ORDER BY timestamp", (last_ts, raw_start)).fetchall()
+        if new_runs:
+            rows = conn.execute(
+                "SELECT r.test_name, r.run_id, r.status FROM test_results r JOIN runs u ON u.run_id = r.run_id "
+                "WHERE u.timestamp > ?", (last_ts,)
+            ).fetchall()
+            cache = _trim(_extend(cache, new_runs, rows), max(limit_runs, ANALYTICS_WINDOW))
+            _save_cache(cache)
+    finally:
+        conn.close()
+
+    if len(cache["run_ids"]) > limit_runs:
+        return {"tests": cache["tests"], "run_ids": cache["run_ids"][-limit_runs:],
+                "timestamps": cache["timestamps"][-limit_runs:], "matrix": cache["matrix"][:, -limit_runs:]}
+    return cache
+
+def _drop_before(cache, timestamp):
+    """Drops run columns older than timestamp (rolled up out of the raw tier)."""
+    keep = int(np.searchsorted(cache["timestamps"], timestamp))
+    if not keep:
+        return cache
+    return {"tests": cache["tests"], "run_ids": cache["run_ids"][keep:],
+            "timestamps": cache["timestamps"][keep:], "matrix": cache["matrix"][:, keep:]}
+
+def _trim(cache, max_runs):
+    """Keeps the newest max_runs columns, and only tests that ran in them."""
+    matrix = cache["matrix"][:, -max_runs:]
+    active = (matrix != NOT_RUN).any(axis=1)
+    return {"tests": cache["tests"][active], "run_ids": cache["run_ids"][-max_runs:],
+            "timestamps": cache["timestamps"][-max_runs:], "matrix": matrix[active]}
+
+def _extend(cache, new_runs, rows):
+    """Appends new run columns (and any new test rows) to a cached matrix."""
+    tests = list(cache["tests"])
+    test_index = {name: i for i, name in enumerate(tests)}
+    for name, _, _ in rows:
+        if name not in test_index:
+            test_index[name] = len(tests)
+            tests.append(name)
+    run_index = {run_id: i for i, (run_id, _) in enumerate(new_runs)}
+
+    old = cache["matrix"]
+    matrix = np.full((len(tests), old.shape[1] + len(new_runs)), NOT_RUN, dtype=np.int8)
+    matrix[:old.shape[0], :old.shape[1]] = old
+    if rows:
+        r = np.fromiter((test_index[name] for name, _, _ in rows), dtype=np.int64, count=len(rows))
+        c = np.fromiter((run_index[run_id] for _, run_id, _ in rows), dtype=np.int64, count=len(rows)) + old.shape[1]
+        v = np.fromiter((_encode_status(status) for _, _, status in rows), dtype=np.int8, count=len(rows))
+        matrix[r, c] = v
+
+    return {
+        "tests": np.array(tests, dtype=str),
+        "run_ids": np.concatenate([cache["run_ids"], np.array([run_id for run_id, _ in new_runs], dtype=str)]),
+        "timestamps": np.concatenate([cache["timestamps"], np.array([ts for _, ts in new_runs], dtype=str)]),
+        "matrix": matrix
+    }
+
+# --- Signals ---
+
+def flip_rates(matrix):
+    """
+    Per test: status changes between consecutive executed results, divided by
+    the number of consecutive pairs. Runs where the test didn't execute are skipped.
+    :return: (flip_rate float array, flips int array, results int array)
+    """
+    ran = matrix != NOT_RUN
+    cols = np.arange(matrix.shape[1])
+    # Forward-fill the last executed status into not-run columns.
+    last_seen = np.maximum.accumulate(np.where(ran, cols, -1), axis=1)
+    filled = np.take_along_axis(matrix, np.maximum(last_seen, 0), axis=1)
+    previous = np.concatenate([np.full((matrix.shape[0], 1), NOT_RUN, dtype=np.int8), filled[:, :-1]], axis=1)
+    has_previous = np.concatenate([np.zeros((matrix.shape[0], 1), dtype=bool), last_seen[:, :-1] >= 0], axis=1)
+
+    pairs = ran & has_previous
+    flips = (pairs & (matrix != previous)).sum(axis=1)
+    results = ran.sum(axis=1)
+    pair_counts = pairs.sum(axis=1)
+    rates = np.divide(flips, pair_counts, out=np.zeros(len(flips), dtype=float), where=pair_counts > 0)
+    return rates, flips, results
+
+def failure_streaks(matrix):
+    """
+    Longest and current run of consecutive failed executions per test (not-run
+    columns neither extend nor break a streak).
+    :return: (max_streak int array, current_streak int array)
+    """
+    failed = (matrix == FAILED).astype(np.int32)
+    passed = matrix == PASSED
+    fail_count = np.cumsum(failed, axis=1)
+    reset_at = np.maximum.accumulate(np.where(passed, fail_count, 0), axis=1)
+    streak = fail_count - reset_at
+    return streak.max(axis=1) if streak.size else np.zeros(matrix.shape[0], dtype=np.int32), \
+        streak[:, -1] if streak.size else np.zeros(matrix.shape[0], dtype=np.int32)
+
+def co_failure_clusters(matrix, tests):
+    """
+    Groups tests that fail in the same runs. Tests are linked when they
+    co-failed at least CLUSTER_MIN_CO_FAILURES times with a Jaccard similarity
+    of their failing-run sets >= CLUSTER_MIN_JACCARD; clusters are the
+    connected components of those links.
+    """
+    failed = matrix == FAILED
+    fail_counts = failed.sum(axis=1)
+    candidates = np.flatnonzero(fail_counts >= CLUSTER_MIN_CO_FAILURES)
+    if len(candidates) < 2:
+        return []
+    candidates = candidates[np.argsort(-fail_counts[candidates], kind="stable")[:CLUSTER_MAX_TESTS]]
+
+    f = failed[candidates].astype(np.float32)
+    co = f @ f.T
+    counts = fail_counts[candidates].astype(np.float32)
+    jaccard = co / (counts[:, None] + counts[None, :] - co)
+    np.fill_diagonal(jaccard, 0)
+    links = (jaccard >= CLUSTER_MIN_JACCARD) & (co >= CLUSTER_MIN_CO_FAILURES)
+
+    # Union-find over the (sparse) links.
+    parent = list(range(len(candidates)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in zip(*np.nonzero(np.triu(links))):
+        parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(candidates)):
+        groups.setdefault(find(i), []).append(i)
+
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        idx = np.array(members)
+        sub = jaccard[np.ix_(idx, idx)]
+        clusters.append({
+            "tests": [str(tests[candidates[i]]) for i in members],
+            "mean_jaccard": round(float(sub[np.triu_indices(len(idx), 1)].mean()), 3),
+            "runs_all_failed": int(failed[candidates[idx]].all(axis=0).sum())
+        })
+    clusters.sort(key=lambda c: (len(c["tests"]), c["runs_all_failed"]), reverse=True)
+    return clusters[:TOP_N]
+
+def time_of_day_correlation(matrix, tests, timestamps):
+    """
+    Failure rate per hour of day (run start time), overall and for tests whose
+    failures concentrate in one hour.
+    """
+    hours = np.array([datetime.datetime.fromisoformat(str(ts)).hour for ts in timestamps], dtype=np.int64)
+    order = np.argsort(hours, kind="stable")
+    sorted_hours = hours[order]
+    present = np.unique(sorted_hours)
+    starts = np.searchsorted(sorted_hours, present)
+
+    failed = (matrix == FAILED)[:, order]
+    ran = (matrix != NOT_RUN)[:, order]
+    fails_by_hour = np.add.reduceat(failed, starts, axis=1, dtype=np.int64)
+    runs_by_hour = np.add.reduceat(ran, starts, axis=1, dtype=np.int64)
+
+    total_fails = fails_by_hour.sum(axis=0)
+    total_runs = runs_by_hour.sum(axis=0)
+    hourly = {int(h): round(float(f / r), 4) for h, f, r in zip(present, total_fails, total_runs) if r}
+
+    test_rate = fails_by_hour.sum(axis=1) / np.maximum(runs_by_hour.sum(axis=1), 1)
+    hour_rate = fails_by_hour / np.maximum(runs_by_hour, 1)
+    peak = hour_rate.argmax(axis=1)
+    rows = np.arange(len(tests))
+    peak_rate = hour_rate[rows, peak]
+    peak_fails = fails_by_hour[rows, peak]
+    # Binomial z-score of the peak-hour failure count, so noise in sparse hours isn't reported.
+    expected = runs_by_hour[rows, peak] * test_rate
+    z = (peak_fails - expected) / np.sqrt(np.maximum(expected * (1 - test_rate), 1e-9))
+    skewed = np.flatnonzero((peak_fails >= HOUR_SKEW_MIN_FAILURES) & (test_rate > 0) &
+                            (peak_rate >= HOUR_SKEW_FACTOR * test_rate) & (z >= HOUR_SKEW_MIN_Z))
+    skewed = skewed[np.argsort(-z[skewed], kind="stable")][:TOP_N]
+
+    return {
+        "hourly_failure_rate": hourly,
+        "hour_skewed_tests": [{
+            "name": str(tests[i]),
+            "peak_hour": int(present[peak[i]]),
+            "peak_hour_failure_rate": round(float(peak_rate[i]), 4),
+            "overall_failure_rate": round(float(test_rate[i]), 4),
+            "z_score": round(float(z[i]), 2)
+        } for i in skewed]
+    }
+
+# --- Entry Point ---
+
+def analyze_flakiness(limit_runs=ANALYTICS_WINDOW):
+    """
+    Computes flip rates, failure streaks, co-failure clusters and time-of-day
+    correlations over the last `limit_runs` runs.
+    :return: A dictionary of the top signals, or None if NumPy is unavailable.
+    """
+    if np is None:
+        return None
+    log_action("Starting flakiness analytics...")
+    data = load_status_matrix(limit_runs)
+    matrix, tests = data["matrix"], data["tests"]
+    if matrix.size == 0:
+        return {"summary": "No historical data to analyze."}
+
+    rates, flips, results = flip_rates(matrix)
+    max_streak, current_streak = failure_streaks(matrix)
+
+    eligible = np.flatnonzero((results >= MIN_RESULTS_FOR_FLIP_RATE) & (flips > 0))
+    flaky = eligible[np.argsort(-rates[eligible], kind="stable")][:TOP_N]
+    streaking = np.flatnonzero(current_streak > 0)
+    streaking = streaking[np.argsort(-current_streak[streaking], kind="stable")][:TOP_N]
+
+    log_action("Flakiness analytics complete.")
+    return {
+        "analysis_window": int(matrix.shape[1]),
+        "tests_analyzed": int(matrix.shape[0]),
+        "flaky_by_flip_rate": [{
+            "name": str(tests[i]), "flip_rate": round(float(rates[i]), 4),
+            "flips": int(flips[i]), "results": int(results[i])
+        } for i in flaky],
+        "failure_streaks": [{
+            "name": str(tests[i]), "current_streak": int(current_streak[i]), "longest_streak": int(max_streak[i])
+        } for i in streaking],
+        "co_failure_clusters": co_failure_clusters(matrix, tests),
+        "time_of_day": time_of_day_correlation(matrix, tests, data["timestamps"])
+    }
+
+if __name__ == '__main__':
+    window = int(sys.argv[1]) if len(sys.argv) > 1 else ANALYTICS_WINDOW
+    print(json.dumps(analyze_flakiness(window), indent=2))
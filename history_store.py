@@ -0,0 +1,725 @@
+import os
+import json
+import math
+import sqlite3
+import datetime
+import threading
+from logger import log_action
+from report_stream import is_stream, load_report
+
+# --- Constants ---
+HISTORY_DB = os.path.join("reports", "history.db")
+HISTORY_DIR = os.path.join("reports", "history")  # Archived report files, imported once
+EXECUTION_REPORT_FILE = "execution_report.json"
+SQLITE_TIMEOUT = 30  # Seconds to wait for another writer
+AGGREGATE_WINDOW = 4096  # Most recent results kept in each test's status bitmaps
+SKETCH_RELATIVE_ACCURACY = 0.02  # Duration sketch quantiles are within +/-2%
+# Roll-up tiers: full detail, then hourly, then daily per-test summaries.
+RAW_RETENTION_DAYS = 14
+HOURLY_RETENTION_DAYS = 90
+DAILY_RETENTION_DAYS = 730
+ROLLUP_INTERVAL_HOURS = 24  # rollup_history() is a no-op if it ran more recently (unless forced)
+ARTIFACT_DIRS = [HISTORY_DIR, os.path.join("reports", "artifacts")]  # Raw files released after RAW_RETENTION_DAYS
+ANALYSIS_STATE_FILE = os.path.join("reports", "ai_analysis_state.json")  # Artifacts it lists are never released
+_AGGREGATE_MASK = (1 << AGGREGATE_WINDOW) - 1
+_SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    framework_version TEXT,
+    total INTEGER,
+    passed INTEGER,
+    failed INTEGER,
+    success_rate REAL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (timestamp);
+
+CREATE TABLE IF NOT EXISTS test_results (
+    run_id TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration_ms REAL,
+    has_regression INTEGER NOT NULL DEFAULT 0,
+    failed_step INTEGER,
+    PRIMARY KEY (run_id, test_name)
+);
+CREATE INDEX IF NOT EXISTS idx_results_test_time ON test_results (test_name, timestamp);
+CREATE INDEX IF NOT EXISTS idx_results_time ON test_results (timestamp);
+
+CREATE TABLE IF NOT EXISTS step_durations (
+    run_id TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    duration_ms REAL NOT NULL,
+    regression INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, test_name, step)
+);
+CREATE INDEX IF NOT EXISTS idx_steps_test_step_time ON step_durations (test_name, step, timestamp);
+CREATE INDEX IF NOT EXISTS idx_steps_time ON step_durations (timestamp);
+
+-- Compacted history: per-test (and per-step) summaries of older runs, one row
+-- per tier ('hour' or 'day') and bucket start time.
+CREATE TABLE IF NOT EXISTS test_rollups (
+    tier TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    results INTEGER NOT NULL DEFAULT 0,
+    passes INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    regressions INTEGER NOT NULL DEFAULT 0,
+    duration_sketch TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (tier, bucket, test_name)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_test ON test_rollups (test_name, bucket);
+
+CREATE TABLE IF NOT EXISTS step_rollups (
+    tier TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    regressions INTEGER NOT NULL DEFAULT 0,
+    duration_sketch TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (tier, bucket, test_name, step)
+);
+CREATE INDEX IF NOT EXISTS idx_step_rollups_test ON step_rollups (test_name, step, bucket);
+
+-- Running per-test aggregates, updated as each report arrives. Bitmaps are
+-- hex-encoded integers; bit 0 is the newest result.
+CREATE TABLE IF NOT EXISTS test_aggregates (
+    test_name TEXT PRIMARY KEY,
+    results INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    regressions INTEGER NOT NULL DEFAULT 0,
+    pass_bits TEXT NOT NULL DEFAULT '0',
+    fail_bits TEXT NOT NULL DEFAULT '0',
+    regression_bits TEXT NOT NULL DEFAULT '0',
+    failure_streak INTEGER NOT NULL DEFAULT 0,
+    last_status TEXT,
+    last_timestamp TEXT,
+    duration_sketch TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_aggregates_last_time ON test_aggregates (last_timestamp);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_init_lock = threading.Lock()
+_initialized = set()
+
+# --- Connection ---
+
+def connect(db_path=HISTORY_DB):
+    """
+    Opens the history database, creating it (and back-filling it from the
+    archived report files) on first use.
+    """
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    with _init_lock:
+        if db_path not in _initialized:
+            conn.executescript(SCHEMA)
+            _build_missing_aggregates(conn)
+            _import_history_files(conn)
+            _initialized.add(db_path)
+    return conn
+
+# --- Duration Sketch ---
+# A log-bucketed histogram (DDSketch-style): constant size for any number of
+# samples, with quantiles accurate to SKETCH_RELATIVE_ACCURACY.
+
+def sketch_add(sketch, value_ms):
+    """Adds one duration to a sketch dict {bucket_index: count} in place."""
+    key = str(math.ceil(math.log(max(value_ms, 0.001), _SKETCH_GAMMA)))
+    sketch[key] = sketch.get(key, 0) + 1
+
+def sketch_quantile(sketch, q):
+    """Estimates the q-quantile (0..1) of a sketch; None if empty."""
+    total = sum(sketch.values())
+    if not total:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for key in sorted(sketch, key=int):
+        seen += sketch[key]
+        if seen > rank:
+            return round(2 * _SKETCH_GAMMA ** int(key) / (_SKETCH_GAMMA + 1), 2)
+    return None
+
+def sketch_merge(target, other):
+    """Adds all counts of `other` into the sketch `target` in place."""
+    for key, count in other.items():
+        target[key] = target.get(key, 0) + count
+
+# --- Aggregates ---
+
+def _bits(value):
+    return int(value, 16)
+
+def _popcount(value):
+    return bin(value).count("1")
+
+def _fold_result(agg, status, has_regression, duration_ms, timestamp):
+    """Applies one test result (newer than everything folded so far) to an aggregate dict."""
+    failed = status == "FAILED"
+    agg["results"] += 1
+    agg["failures"] += int(failed)
+    agg["regressions"] += int(bool(has_regression))
+    agg["pass_bits"] = ((agg["pass_bits"] << 1) | int(status == "PASSED")) & _AGGREGATE_MASK
+    agg["fail_bits"] = ((agg["fail_bits"] << 1) | int(failed)) & _AGGREGATE_MASK
+    agg["regression_bits"] = ((agg["regression_bits"] << 1) | int(bool(has_regression))) & _AGGREGATE_MASK
+    agg["failure_streak"] = agg["failure_streak"] + 1 if failed else 0
+    agg["last_status"] = status
+    agg["last_timestamp"] = timestamp
+    if duration_ms is not None:
+        sketch_add(agg["duration_sketch"], duration_ms)
+
+def _empty_aggregate(test_name):
+    return {"test_name": test_name, "results": 0, "failures": 0, "regressions": 0, "pass_bits": 0, "fail_bits": 0,
+            "regression_bits": 0, "failure_streak": 0, "last_status": None, "last_timestamp": None,
+            "duration_sketch": {}}
+
+def _decode_aggregate(row):
+    agg = dict(row)
+    for key in ("pass_bits", "fail_bits", "regression_bits"):
+        agg[key] = _bits(agg[key])
+    agg["duration_sketch"] = json.loads(agg["duration_sketch"])
+    return agg
+
+def _save_aggregate(conn, agg):
+    conn.execute(
+        "INSERT OR REPLACE INTO test_aggregates (test_name, results, failures, regressions, pass_bits, fail_bits, "
+        "regression_bits, failure_streak, last_status, last_timestamp, duration_sketch) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (agg["test_name"], agg["results"], agg["failures"], agg["regressions"], format(agg["pass_bits"], "x"),
+         format(agg["fail_bits"], "x"), format(agg["regression_bits"], "x"), agg["failure_streak"],
+         agg["last_status"], agg["last_timestamp"], json.dumps(agg["duration_sketch"]))
+    )
+
+def _fold_rollup(agg, results, passes, failures, regressions, duration_sketch, bucket):
+    """
+    Applies a rolled-up bucket of results to an aggregate dict. Roll-ups don't
+    keep the order within a bucket, so its failures count as its newest results.
+    """
+    agg["results"] += results
+    agg["failures"] += failures
+    agg["regressions"] += regressions
+    agg["pass_bits"] = ((agg["pass_bits"] << results) | (((1 << passes) - 1) << failures)) & _AGGREGATE_MASK
+    agg["fail_bits"] = ((agg["fail_bits"] << results) | ((1 << failures) - 1)) & _AGGREGATE_MASK
+    agg["regression_bits"] = ((agg["regression_bits"] << results) | ((1 << regressions) - 1)) & _AGGREGATE_MASK
+    agg["failure_streak"] = agg["failure_streak"] + results if failures == results else failures
+    agg["last_status"] = "FAILED" if failures else "PASSED" if passes else "ERROR"
+    agg["last_timestamp"] = bucket
+    sketch_merge(agg["duration_sketch"], duration_sketch)
+
+def _insert_bit(bits, position, value):
+    """Inserts one bit at `position` (0 = newest), shifting the older bits up by one."""
+    low = bits & ((1 << position) - 1)
+    return (((bits >> position) << (position + 1)) | (int(value) << position) | low) & _AGGREGATE_MASK
+
+def _rebuild_aggregate(conn, test_name):
+    """Recomputes one test's aggregate from its roll-ups (oldest first) and raw results."""
+    agg = _empty_aggregate(test_name)
+    rows = conn.execute(
+        "SELECT results, passes, failures, regressions, duration_sketch, bucket FROM test_rollups "
+        "WHERE test_name = ? ORDER BY bucket", (test_name,)
+    )
+    for results, passes, failures, regressions, sketch, bucket in rows:
+        _fold_rollup(agg, results, passes, failures, regressions, json.loads(sketch), bucket)
+    rows = conn.execute(
+        "SELECT status, has_regression, duration_ms, timestamp FROM test_results WHERE test_name = ? ORDER BY timestamp",
+        (test_name,)
+    )
+    for status, has_regression, duration_ms, timestamp in rows:
+        _fold_result(agg, status, has_regression, duration_ms, timestamp)
+    _save_aggregate(conn, agg)
+
+def _update_aggregate(conn, test_name, status, has_regression, duration_ms, timestamp):
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute("SELECT * FROM test_aggregates WHERE test_name = ?", (test_name,)).fetchone()
+    finally:
+        conn.row_factory = None
+    agg = _decode_aggregate(row) if row is not None else _empty_aggregate(test_name)
+    if not (agg["last_timestamp"] and timestamp < agg["last_timestamp"]):
+        _fold_result(agg, status, has_regression, duration_ms, timestamp)
+        _save_aggregate(conn, agg)
+        return
+
+    # Out of order: counts and sketch don't care, and the status bits are
+    # inserted behind the results that are newer (all still raw, being newer).
+    position = conn.execute("SELECT COUNT(*) FROM test_results WHERE test_name = ? AND timestamp > ?",
+                            (test_name, timestamp)).fetchone()[0]
+    failed = status == "FAILED"
+    agg["results"] += 1
+    agg["failures"] += int(failed)
+    agg["regressions"] += int(bool(has_regression))
+    if position < AGGREGATE_WINDOW:
+        agg["pass_bits"] = _insert_bit(agg["pass_bits"], position, status == "PASSED")
+        agg["fail_bits"] = _insert_bit(agg["fail_bits"], position, failed)
+        agg["regression_bits"] = _insert_bit(agg["regression_bits"], position, has_regression)
+        if agg["failure_streak"] >= position:  # Lands inside the current failure streak (or right behind it)
+            agg["failure_streak"] = agg["failure_streak"] + 1 if failed else position
+    if duration_ms is not None:
+        sketch_add(agg["duration_sketch"], duration_ms)
+    _save_aggregate(conn, agg)
+
+def _build_missing_aggregates(conn):
+    """One-time build of aggregates for databases created before they existed."""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'aggregates_built'").fetchone():
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        names = [row[0] for row in conn.execute("SELECT DISTINCT test_name FROM test_results")]
+        for name in names:
+            _rebuild_aggregate(conn, name)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('aggregates_built', '1')")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def window_stats(agg, window):
+    """
+    Summarizes an aggregate over its `window` most recent results in O(1) bitmap ops.
+    :return: A dict with results, passes, failures, regressions and the status history (newest first).
+    """
+    window = min(window, agg["results"], AGGREGATE_WINDOW)
+    mask = (1 << window) - 1
+    pass_bits, fail_bits = agg["pass_bits"] & mask, agg["fail_bits"] & mask
+    return {
+        "results": window,
+        "passes": _popcount(pass_bits),
+        "failures": _popcount(fail_bits),
+        "regressions": _popcount(agg["regression_bits"] & mask),
+        "pass_bits": pass_bits,
+        "fail_bits": fail_bits
+    }
+
+def status_history(agg, length):
+    """Rebuilds the newest `length` statuses of a test from its bitmaps (ERROR for neither pass nor fail)."""
+    length = min(length, agg["results"], AGGREGATE_WINDOW)
+    return ["PASSED" if agg["pass_bits"] >> i & 1 else "FAILED" if agg["fail_bits"] >> i & 1 else "ERROR"
+            for i in range(length)]
+
+# --- Writing ---
+
+def _insert_report(conn, report, source):
+    """Inserts one report's rows. Returns False if the run was already recorded."""
+    run_id = report.get("timestamp")
+    if not run_id:
+        return False
+    summary = report.get("summary", {})
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO runs (run_id, timestamp, framework_version, total, passed, failed, success_rate, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (run_id, run_id, report.get("framework_version"), summary.get("total"), summary.get("passed"),
+         summary.get("failed"), summary.get("success_rate"), source)
+    )
+    if cursor.rowcount == 0:
+        return False
+
+    for test in report.get("tests", []):
+        name, status = test.get("name"), test.get("status")
+        if not name or not status:
+            continue
+        performance = test.get("performance", {})
+        conn.execute(
+            "INSERT OR REPLACE INTO test_results (run_id, test_name, timestamp, status, duration_ms, has_regression, failed_step) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_id, name, run_id, status, performance.get("total_duration_ms"),
+             int(bool(performance.get("has_regression"))), test.get("failed_step"))
+        )
+        _update_aggregate(conn, name, status, performance.get("has_regression"),
+                          performance.get("total_duration_ms"), run_id)
+        conn.executemany(
+            "INSERT OR REPLACE INTO step_durations (run_id, test_name, step, timestamp, duration_ms, regression) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(run_id, name, step["step"], run_id, step["duration_ms"], int(bool(step.get("regression"))))
+             for step in performance.get("steps", []) if step.get("duration_ms") is not None]
+        )
+    return True
+
+def record_report(report, source="runner", db_path=HISTORY_DB):
+    """
+    Indexes an execution report: one row per test result (and per step duration),
+    keyed by run (the report timestamp), test name and time.
+    :return: True if the report was recorded.
+    """
+    try:
+        conn = connect(db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            recorded = _insert_report(conn, report, source)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+    except Exception as e:
+        log_action(f"Error recording report in history store {db_path}: {e}", is_error=True)
+        return False
+    if recorded:
+        log_action(f"Recorded run {report.get('timestamp')} ({len(report.get('tests', []))} tests) in history store.")
+    return recorded
+
+def _import_history_files(conn):
+    """One-time back-fill from reports/history/** (JSON and NDJSON reports) and the current execution report."""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'history_imported'").fetchone():
+        return
+
+    paths = []
+    if os.path.isdir(HISTORY_DIR):
+        for root, dirs, files in os.walk(HISTORY_DIR):
+            dirs[:] = [d for d in dirs if d != "recommendations"]
+            paths.extend(os.path.join(root, f) for f in files if f.endswith(".json") or is_stream(f))
+    if os.path.exists(EXECUTION_REPORT_FILE):
+        paths.append(EXECUTION_REPORT_FILE)
+
+    reports = []
+    for path in paths:
+        try:
+            if is_stream(path):
+                report = load_report(path)
+            else:
+                with open(path, 'r') as f:
+                    report = json.load(f)
+        except Exception as e:
+            log_action(f"Skipping unreadable history file {path}: {e}", is_error=True)
+            continue
+        if not isinstance(report, dict) or "tests" not in report:
+            continue
+        if not report.get("timestamp"):
+            report["timestamp"] = datetime.datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+        reports.append(report)
+
+    imported = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Oldest first, so the running aggregates see results in order.
+        for report in sorted(reports, key=lambda r: r["timestamp"]):
+            imported += _insert_report(conn, report, "import")
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('history_imported', ?)",
+                     (datetime.datetime.now().isoformat(),))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if imported:
+        log_action(f"Imported {imported} archived reports into the history store.")
+
+# --- Roll-up ---
+# Runs older than RAW_RETENTION_DAYS are compacted into hourly per-test and
+# per-step summaries, hourly rows older than HOURLY_RETENTION_DAYS into daily
+# ones, and daily rows older than DAILY_RETENTION_DAYS are dropped. Run rows
+# (one per run) are kept until the daily tier expires.
+
+_ROLLUP_COLUMNS = {
+    "test_rollups": (("tier", "bucket", "test_name"), ("results", "passes", "failures", "regressions")),
+    "step_rollups": (("tier", "bucket", "test_name", "step"), ("samples", "regressions"))
+}
+
+def _bucket(timestamp, tier):
+    """Start of the hour or day a timestamp falls in."""
+    return timestamp[:13] + ":00:00" if tier == "hour" else timestamp[:10] + "T00:00:00"
+
+def _next_day(timestamp):
+    return (datetime.date.fromisoformat(timestamp[:10]) + datetime.timedelta(days=1)).isoformat() + "T00:00:00"
+
+def _empty_rollup(table):
+    return dict.fromkeys(_ROLLUP_COLUMNS[table][1], 0) | {"duration_sketch": {}}
+
+def _merge_rollups(conn, table, entries):
+    """Adds {key tuple: counts} entries into a roll-up table, merging with existing rows."""
+    keys, counts = _ROLLUP_COLUMNS[table]
+    where = " AND ".join(f"{key} = ?" for key in keys)
+    columns = keys + counts + ("duration_sketch",)
+    insert = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for key, entry in entries.items():
+        row = conn.execute(f"SELECT {', '.join(counts)}, duration_sketch FROM {table} WHERE {where}", key).fetchone()
+        if row:
+            for i, column in enumerate(counts):
+                entry[column] += row[i]
+            sketch_merge(entry["duration_sketch"], json.loads(row[-1]))
+        conn.execute(insert, key + tuple(entry[c] for c in counts) + (json.dumps(entry["duration_sketch"]),))
+
+def _compact_raw(conn, start, end):
+    """Folds raw results and step durations in [start, end) into hourly roll-ups, then deletes them."""
+    tests, steps = {}, {}
+    rows = conn.execute("SELECT test_name, timestamp, status, has_regression, duration_ms FROM test_results "
+                        "WHERE timestamp >= ? AND timestamp < ?", (start, end))
+    for name, timestamp, status, has_regression, duration_ms in rows:
+        entry = tests.setdefault(("hour", _bucket(timestamp, "hour"), name), _empty_rollup("test_rollups"))
+        entry["results"] += 1
+        entry["passes"] += int(status == "PASSED")
+        entry["failures"] += int(status == "FAILED")
+        entry["regressions"] += int(bool(has_regression))
+        if duration_ms is not None:
+            sketch_add(entry["duration_sketch"], duration_ms)
+    rows = conn.execute("SELECT test_name, step, timestamp, duration_ms, regression FROM step_durations "
+                        "WHERE timestamp >= ? AND timestamp < ?", (start, end))
+    for name, step, timestamp, duration_ms, regression in rows:
+        entry = steps.setdefault(("hour", _bucket(timestamp, "hour"), name, step), _empty_rollup("step_rollups"))
+        entry["samples"] += 1
+        entry["regressions"] += int(bool(regression))
+        sketch_add(entry["duration_sketch"], duration_ms)
+
+    _merge_rollups(conn, "test_rollups", tests)
+    _merge_rollups(conn, "step_rollups", steps)
+    conn.execute("DELETE FROM test_results WHERE timestamp >= ? AND timestamp < ?", (start, end))
+    conn.execute("DELETE FROM step_durations WHERE timestamp >= ? AND timestamp < ?", (start, end))
+    return len(tests)
+
+def _compact_hourly(conn, start, end):
+    """Folds hourly roll-ups with buckets in [start, end) into daily ones, then deletes them."""
+    for table, (keys, counts) in _ROLLUP_COLUMNS.items():
+        entries = {}
+        rows = conn.execute(f"SELECT {', '.join(keys[2:] + counts)}, bucket, duration_sketch FROM {table} "
+                            "WHERE tier = 'hour' AND bucket >= ? AND bucket < ?", (start, end))
+        for row in rows:
+            ident, values = tuple(row[:len(keys) - 2]), row[len(keys) - 2:-2]
+            entry = entries.setdefault(("day", _bucket(row[-2], "day")) + ident, _empty_rollup(table))
+            for column, value in zip(counts, values):
+                entry[column] += value
+            sketch_merge(entry["duration_sketch"], json.loads(row[-1]))
+        _merge_rollups(conn, table, entries)
+        conn.execute(f"DELETE FROM {table} WHERE tier = 'hour' AND bucket >= ? AND bucket < ?", (start, end))
+
+def _compact_by_day(conn, query, cutoff, compact):
+    """Runs `compact` one day at a time (one transaction each) from the oldest matching row up to cutoff."""
+    done = 0
+    while True:
+        oldest = conn.execute(query, (cutoff,)).fetchone()[0]
+        if oldest is None:
+            return done
+        end = min(_next_day(oldest), cutoff)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            compact(conn, oldest[:10] + "T00:00:00", end)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        done += 1
+
+def _referenced_artifacts():
+    """IDs of the artifacts the latest analysis package (or a failure it still tracks) points to."""
+    if not os.path.exists(ANALYSIS_STATE_FILE):
+        return set()
+    try:
+        with open(ANALYSIS_STATE_FILE, 'r') as f:
+            return set(json.load(f).get("artifacts", []))
+    except Exception as e:
+        log_action(f"Error reading artifact references from {ANALYSIS_STATE_FILE}: {e}", is_error=True)
+        return None
+
+def _release_artifacts(cutoff_time):
+    """
+    Deletes archived report files and package artifacts last modified before
+    cutoff_time, except artifacts still referenced from the package state.
+    """
+    referenced = _referenced_artifacts()
+    if referenced is None:
+        return 0  # Unknown references: releasing anything could break the current package
+    released = 0
+    for base_dir in ARTIFACT_DIRS:
+        if not os.path.isdir(base_dir):
+            continue
+        for root, dirs, files in os.walk(base_dir):
+            dirs[:] = [d for d in dirs if d != "recommendations"]
+            for name in files:
+                path = os.path.join(root, name)
+                if name.split(".", 1)[0] in referenced:
+                    continue
+                try:
+                    if os.path.getmtime(path) < cutoff_time:
+                        os.remove(path)
+                        released += 1
+                except OSError as e:
+                    log_action(f"Could not release {path}: {e}", is_error=True)
+    return released
+
+def rollup_history(force=False, now=None, db_path=HISTORY_DB):
+    """
+    Compacts old history into the hourly/daily tiers and releases raw report
+    files. Cheap to call every scheduler cycle: it runs at most once per
+    ROLLUP_INTERVAL_HOURS unless forced.
+    :return: A dict of what was compacted, or None if skipped or failed.
+    """
+    now = now or datetime.datetime.now()
+    try:
+        conn = connect(db_path)
+        try:
+            last = conn.execute("SELECT value FROM meta WHERE key = 'last_rollup'").fetchone()
+            if not force and last and now - datetime.datetime.fromisoformat(last[0]) < datetime.timedelta(hours=ROLLUP_INTERVAL_HOURS):
+                return None
+
+            raw_cutoff = (now - datetime.timedelta(days=RAW_RETENTION_DAYS)).isoformat()
+            hourly_cutoff = _bucket((now - datetime.timedelta(days=HOURLY_RETENTION_DAYS)).isoformat(), "day")
+            daily_cutoff = _bucket((now - datetime.timedelta(days=DAILY_RETENTION_DAYS)).isoformat(), "day")
+
+            stats = {
+                "raw_days_compacted": _compact_by_day(
+                    conn, "SELECT MIN(timestamp) FROM (SELECT MIN(timestamp) AS timestamp FROM test_results WHERE timestamp < ?1 "
+                          "UNION ALL SELECT MIN(timestamp) FROM step_durations WHERE timestamp < ?1)",
+                    raw_cutoff, _compact_raw),
+                "hourly_days_compacted": _compact_by_day(
+                    conn, "SELECT MIN(bucket) FROM (SELECT MIN(bucket) AS bucket FROM test_rollups WHERE tier = 'hour' AND bucket < ?1 "
+                          "UNION ALL SELECT MIN(bucket) FROM step_rollups WHERE tier = 'hour' AND bucket < ?1)",
+                    hourly_cutoff, _compact_hourly)
+            }
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stats["daily_rows_expired"] = sum(
+                    conn.execute(f"DELETE FROM {table} WHERE tier = 'day' AND bucket < ?", (daily_cutoff,)).rowcount
+                    for table in _ROLLUP_COLUMNS)
+                stats["runs_expired"] = conn.execute("DELETE FROM runs WHERE timestamp < ?", (daily_cutoff,)).rowcount
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_rollup', ?)", (now.isoformat(),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+    except Exception as e:
+        log_action(f"Error rolling up history in {db_path}: {e}", is_error=True)
+        return None
+
+    stats["files_released"] = _release_artifacts((now - datetime.timedelta(days=RAW_RETENTION_DAYS)).timestamp())
+    log_action(f"History roll-up complete: {stats}")
+    return stats
+
+# --- Queries ---
+
+def recent_runs(limit, db_path=HISTORY_DB):
+    """Returns the run rows (run_id, timestamp, success_rate) of the last `limit` runs, newest first."""
+    conn = connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT run_id, timestamp, success_rate FROM runs ORDER BY timestamp DESC LIMIT ?", (limit,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+def load_test_results(limit_runs, test_names=None, db_path=HISTORY_DB):
+    """
+    Returns test result rows from the last `limit_runs` runs, newest first.
+    Each row is a dict with run_id, test_name, timestamp, status, duration_ms,
+    has_regression and failed_step.
+    """
+    query = (
+        "SELECT run_id, test_name, timestamp, status, duration_ms, has_regression, failed_step FROM test_results "
+        "WHERE run_id IN (SELECT run_id FROM runs ORDER BY timestamp DESC LIMIT ?)"
+    )
+    params = [limit_runs]
+    if test_names:
+        query += f" AND test_name IN ({','.join('?' * len(test_names))})"
+        params.extend(test_names)
+    query += " ORDER BY timestamp DESC"
+
+    conn = connect(db_path)
+    try:
+        conn.row_factory = sqlite3.Row
+        return [dict(row) for row in conn.execute(query, params)]
+    finally:
+        conn.close()
+
+def load_aggregates(active_since=None, db_path=HISTORY_DB):
+    """
+    Returns the running per-test aggregates (bitmaps decoded to ints, sketch to a dict).
+    :param active_since: Optional ISO timestamp; only tests with a result at or after it.
+    """
+    query = "SELECT * FROM test_aggregates"
+    params = []
+    if active_since:
+        query += " WHERE last_timestamp >= ?"
+        params.append(active_since)
+
+    conn = connect(db_path)
+    try:
+        conn.row_factory = sqlite3.Row
+        return [_decode_aggregate(row) for row in conn.execute(query, params)]
+    finally:
+        conn.close()
+
+def load_step_durations(test_name=None, since=None, db_path=HISTORY_DB):
+    """
+    Returns per-step duration rows (test_name, step, timestamp, duration_ms, tier, samples), oldest first.
+    Rolled-up periods appear as one row per hourly/daily bucket, holding the bucket's median.
+    :param since: Optional ISO timestamp lower bound.
+    """
+    filters, params = "", []
+    if test_name:
+        filters += " AND test_name = ?"
+        params.append(test_name)
+
+    conn = connect(db_path)
+    try:
+        rows = []
+        query = "SELECT test_name, step, bucket, tier, samples, duration_sketch FROM step_rollups WHERE 1 = 1" + filters
+        if since:
+            query += " AND bucket >= ?"
+        for name, step, bucket, tier, samples, sketch in conn.execute(query, params + ([_bucket(since, "day")] if since else [])):
+            if since and bucket < _bucket(since, tier):
+                continue
+            rows.append({"test_name": name, "step": step, "timestamp": bucket,
+                         "duration_ms": sketch_quantile(json.loads(sketch), 0.5), "tier": tier, "samples": samples})
+
+        query = "SELECT test_name, step, timestamp, duration_ms FROM step_durations WHERE 1 = 1" + filters
+        if since:
+            query += " AND timestamp >= ?"
+        conn.row_factory = sqlite3.Row
+        rows.extend(dict(row, tier="raw", samples=1) for row in conn.execute(query, params + ([since] if since else [])))
+    finally:
+        conn.close()
+    rows.sort(key=lambda r: (r["test_name"], r["step"], r["timestamp"]))
+    return rows
+
+def load_test_history(test_name=None, since=None, db_path=HISTORY_DB):
+    """
+    Returns a test's history across tiers, oldest first: one row per raw result
+    and one per hourly/daily roll-up bucket. Each row has test_name, timestamp,
+    tier, results, passes, failures, regressions, p50_ms and p90_ms.
+    :param since: Optional ISO timestamp lower bound.
+    """
+    filters, params = "", []
+    if test_name:
+        filters += " AND test_name = ?"
+        params.append(test_name)
+
+    conn = connect(db_path)
+    try:
+        rows = []
+        query = ("SELECT test_name, bucket, tier, results, passes, failures, regressions, duration_sketch "
+                 "FROM test_rollups WHERE 1 = 1" + filters)
+        if since:
+            query += " AND bucket >= ?"
+        for name, bucket, tier, results, passes, failures, regressions, sketch in conn.execute(
+                query, params + ([_bucket(since, "day")] if since else [])):
+            if since and bucket < _bucket(since, tier):
+                continue
+            sketch = json.loads(sketch)
+            rows.append({"test_name": name, "timestamp": bucket, "tier": tier, "results": results, "passes": passes,
+                         "failures": failures, "regressions": regressions,
+                         "p50_ms": sketch_quantile(sketch, 0.5), "p90_ms": sketch_quantile(sketch, 0.9)})
+
+        query = "SELECT test_name, timestamp, status, has_regression, duration_ms FROM test_results WHERE 1 = 1" + filters
+        if since:
+            query += " AND timestamp >= ?"
+        for name, timestamp, status, has_regression, duration_ms in conn.execute(query, params + ([since] if since else [])):
+            rows.append({"test_name": name, "timestamp": timestamp, "tier": "raw", "results": 1,
+                         "passes": int(status == "PASSED"), "failures": int(status == "FAILED"),
+                         "regressions": int(bool(has_regression)), "p50_ms": duration_ms, "p90_ms": duration_ms})
+    finally:
+        conn.close()
+    rows.sort(key=lambda r: (r["test_name"], r["timestamp"]))
+    return rows
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import hmac
+import uuid
+import sqlite3
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from logger import log_action
+
+# --- Constants ---
+QUEUE_DB = os.path.join("reports", "job_queue.db")
+QUEUE_URL_ENV = "TACHTACH_QUEUE_URL"  # "local" (this machine's SQLite queue) or "http://host:port"; unset runs in-process
+SQLITE_TIMEOUT = 30
+LEASE_SECONDS = 120  # A job whose worker stops heartbeating is retried after this long
+MAX_ATTEMPTS = 3  # Leases per job before it is given up as lost
+HTTP_TIMEOUT = 30
+DEFAULT_PORT = 8765
+QUEUE_METHODS = ("submit", "lease", "heartbeat", "complete", "cancel", "batch")
+QUEUE_TOKEN_ENV = "TACHTACH_QUEUE_TOKEN"  # Shared secret; required by serve() on any non-loopback address
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+# Jobs are scenarios to run, grouped in batches (one per suite run). A worker
+# leases the oldest queued job for LEASE_SECONDS and keeps extending the lease
+# with heartbeats while the scenario runs. If it dies, the lease expires and the
+# job goes back to the queue, up to MAX_ATTEMPTS leases; after that it is
+# finished with an ERROR result. Lease times come from the clock of the process
+# that owns the database, so workers on other hosts need no clock sync: they
+# talk to it through the HTTP service (serve()), never to the file directly.
+#
+# Anyone who can submit jobs can make every worker run arbitrary steps
+# (start-app <any executable>), so the service listens on 127.0.0.1 by default.
+# To accept workers from other hosts, set the same $TACHTACH_QUEUE_TOKEN on the
+# service, the coordinator and every worker and pass --host 0.0.0.0: each
+# request must then carry "Authorization: Bearer <token>", and the service
+# refuses to start on a public address without a token.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    source TEXT,
+    total INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    scenario TEXT NOT NULL,
+    steps TEXT NOT NULL,
+    status TEXT NOT NULL,  -- queued, leased, done, cancelled
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id, position);
+"""
+
+# --- SQLite Queue ---
+
+class SqliteQueue:
+    """The queue itself: a SQLite file shared by the coordinator and the workers on this machine."""
+
+    def __init__(self, db_path=QUEUE_DB):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _transaction(self, work):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = work(conn)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return value
+        finally:
+            conn.close()
+
+    def _expire(self, conn, now):
+        """Requeues jobs whose lease ran out; gives up on those out of attempts."""
+        lost = conn.execute("SELECT job_id, scenario, attempts FROM jobs WHERE status = 'leased' AND lease_expires < ?",
+                            (now,)).fetchall()
+        for job_id, scenario, attempts in lost:
+            if attempts < MAX_ATTEMPTS:
+                conn.execute("UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL, updated = ? "
+                             "WHERE job_id = ?", (now, job_id))
+                log_action(f"Lease on job {job_id} ({scenario}) expired; requeued (attempt {attempts} of {MAX_ATTEMPTS}).")
+            else:
+                result = {"name": scenario, "status": "ERROR",
+                          "error": f"No worker finished the job in {attempts} attempts (lease expired)."}
+                conn.execute("UPDATE jobs SET status = 'done', result = ?, updated = ? WHERE job_id = ?",
+                             (json.dumps(result), now, job_id))
+                log_action(f"Job {job_id} ({scenario}) lost {attempts} leases; giving up.", is_error=True)
+
+    def submit(self, jobs, source=None):
+        """
+        Queues one batch of scenarios.
+        :param jobs: [{"scenario": name, "steps": [...]}, ...] in run order.
+        :return: The batch id.
+        """
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+
+        def work(conn):
+            conn.execute("INSERT INTO batches (batch_id, created, source, total) VALUES (?, ?, ?, ?)",
+                         (batch_id, now, source, len(jobs)))
+            conn.executemany(
+                "INSERT INTO jobs (batch_id, position, scenario, steps, status, updated) VALUES (?, ?, ?, ?, 'queued', ?)",
+                [(batch_id, position, job["scenario"], json.dumps(job["steps"]), now) for position, job in enumerate(jobs)]
+            )
+        self._transaction(work)
+        return batch_id
+
+    def lease(self, worker, lease_seconds=LEASE_SECONDS):
+        """
+        Claims the oldest queued job.
+        :return: {job_id, batch_id, scenario, steps, attempt, lease_seconds}, or None if the queue is empty.
+        """
+        def work(conn):
+            now = time.time()
+            self._expire(conn, now)
+            row = conn.execute("SELECT job_id, batch_id, scenario, steps, attempts FROM jobs WHERE status = 'queued' "
+                               "ORDER BY job_id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'leased', worker = ?, attempts = attempts + 1, lease_expires = ?, "
+                         "updated = ? WHERE job_id = ?", (worker, now + lease_seconds, now, row[0]))
+            return {"job_id": row[0], "batch_id": row[1], "scenario": row[2], "steps": json.loads(row[3]),
+                    "attempt": row[4] + 1, "lease_seconds": lease_seconds}
+        return self._transaction(work)
+
+    def heartbeat(self, job_id, worker, lease_seconds=LEASE_SECONDS):
+        """Extends a lease. :return: False if the worker no longer holds it (expired, cancelled)."""
+        def work(conn):
+            now = time.time()
+            return conn.execute("UPDATE jobs SET lease_expires = ?, updated = ? WHERE job_id = ? AND status = 'leased' "
+                                "AND worker = ?", (now + lease_seconds, now, job_id, worker)).rowcount == 1
+        return self._transaction(work)
+
+    def complete(self, job_id, worker, result):
+        """
+        Stores a job's result. A late result from a worker whose lease expired is
+        still taken if nobody else has picked the job up again.
+        :return: True if the result was stored.
+        """
+        def work(conn):
+            return conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, worker = ?, lease_expires = NULL, updated = ? "
+                "WHERE job_id = ? AND (status = 'queued' OR (status = 'leased' AND worker = ?))",
+                (json.dumps(result), worker, time.time(), job_id, worker)
+            ).rowcount == 1
+        return self._transaction(work)
+
+    def cancel(self, batch_id):
+        """Cancels a batch's queued and running jobs (running ones lose their lease). :return: Jobs cancelled."""
+        def work(conn):
+            return conn.execute("UPDATE jobs SET status = 'cancelled', lease_expires = NULL, updated = ? "
+                                "WHERE batch_id = ? AND status IN ('queued', 'leased')",
+                                (time.time(), batch_id)).rowcount
+        return self._transaction(work)
+
+    def batch(self, batch_id):
+        """
+        A batch's progress.
+        :return: {batch_id, total, counts: {status: n}, jobs: [{job_id, scenario, status, attempts, worker, result}]}
+                 in run order, or None for an unknown batch.
+        """
+        def work(conn):
+            self._expire(conn, time.time())
+            if conn.execute("SELECT 1 FROM batches WHERE batch_id = ?", (batch_id,)).fetchone() is None:
+                return None
+            rows = conn.execute("SELECT job_id, scenario, status, attempts, worker, result FROM jobs "
+                                "WHERE batch_id = ? ORDER BY position", (batch_id,)).fetchall()
+            jobs = [{"job_id": job_id, "scenario": scenario, "status": status, "attempts": attempts, "worker": worker,
+                     "result": json.loads(result) if result else None}
+                    for job_id, scenario, status, attempts, worker, result in rows]
+            counts = {}
+            for job in jobs:
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {"batch_id": batch_id, "total": len(jobs), "counts": counts, "jobs": jobs}
+        return self._transaction(work)
+
+# --- HTTP Service ---
+
+class QueueClient:
+    """The same interface as SqliteQueue, over the HTTP service of another machine."""
+
+    def __init__(self, url, token=None):
+        self.url = url.rstrip("/")
+        self.token = token or os.environ.get(QUEUE_TOKEN_ENV)
+
+    def _call(self, method, **params):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(f"{self.url}/{method}", data=json.dumps(params).encode("utf-8"),
+                                         headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT) as response:
+            return json.loads(response.read().decode("utf-8"))["result"]
+
+    def submit(self, jobs, source=None):
+        return self._call("submit", jobs=jobs, source=source)
+
+    def lease(self, worker, lease_seconds=LEASE_SECONDS):
+        return self._call("lease", worker=worker, lease_seconds=lease_seconds)
+
+    def heartbeat(self, job_id, worker, lease_seconds=LEASE_SECONDS):
+        return self._call("heartbeat", job_id=job_id, worker=worker, lease_seconds=lease_seconds)
+
+    def complete(self, job_id, worker, result):
+        return self._call("complete", job_id=job_id, worker=worker, result=result)
+
+    def cancel(self, batch_id):
+        return self._call("cancel", batch_id=batch_id)
+
+    def batch(self, batch_id):
+        return self._call("batch", batch_id=batch_id)
+
+def _handler_for(queue, token):
+    class QueueRequestHandler(BaseHTTPRequestHandler):
+        def _authorized(self):
+            if not token:
+                return True
+            supplied = self.headers.get("Authorization", "")
+            if hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+                return True
+            log_action(f"Rejected unauthenticated queue request from {self.client_address[0]}.", is_error=True)
+            self._reply(401, {"error": "Unauthorized"})
+            return False
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if self.headers.get("Content-Type", "").split(";")[0].strip() != "application/json":
+                return self._reply(415, {"error": "Content-Type must be application/json"})
+            method = self.path.strip("/")
+            if method not in QUEUE_METHODS:
+                return self._reply(404, {"error": f"Unknown method '{method}'"})
+            try:
+                params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                self._reply(200, {"result": getattr(queue, method)(**params)})
+            except Exception as e:
+                log_action(f"Queue request {method} failed: {e}", is_error=True)
+                self._reply(500, {"error": str(e)})
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            self._reply(200, {"result": "ok"}) if self.path == "/health" else self._reply(404, {"error": "Not found"})
+
+        def _reply(self, code, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # Leases and heartbeats would flood the log
+    return QueueRequestHandler
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, db_path=QUEUE_DB, token=None):
+    """
+    Serves the SQLite queue over HTTP (POST /<method> with JSON parameters) until interrupted.
+    :param token: Shared secret every request must present (defaults to $TACHTACH_QUEUE_TOKEN);
+                  required unless host is a loopback address.
+    """
+    token = token or os.environ.get(QUEUE_TOKEN_ENV)
+    if not token and host not in LOOPBACK_HOSTS:
+        raise ValueError(f"Refusing to serve the job queue on {host} without a token: set {QUEUE_TOKEN_ENV} "
+                         f"(on the service and every worker) or listen on 127.0.0.1.")
+    server = ThreadingHTTPServer((host, port), _handler_for(SqliteQueue(db_path), token))
+    log_action(f"Job queue service listening on http://{host}:{port} ({db_path}).")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def connect_queue(url=None):
+    """
+    The queue to submit to or work from: an HTTP url, "local" (or a .db path) for
+    a SQLite queue on this machine; defaults to $TACHTACH_QUEUE_URL.
+    :return: A SqliteQueue, a QueueClient, or None when no queue is configured.
+    """
+    url = url or os.environ.get(QUEUE_URL_ENV)
+    if not url:
+        return None
+    if url.startswith(("http://", "https://")):
+        return QueueClient(url)
+    return SqliteQueue(QUEUE_DB if url == "local" else url)
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Constants ---
+LOCK_TIMEOUT = 10  # Seconds to wait for another writer
+
+# Parsed data per path: {path: (mtime_ns, size, data)}. Callers share the cached
+# object, so it is built from the read-only types below; change files via
+# update_json(), or copy the data first (dict(data), json.loads(json.dumps(data))).
+_cache = {}
+_cache_lock = threading.Lock()
+
+# --- Read-only Data ---
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Data loaded through json_store is shared and read-only; copy it or use update_json().")
+
+class ReadOnlyDict(dict):
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)  # Copies and pickles are plain, writable dicts
+
+class ReadOnlyList(list):
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = extend = insert = pop = remove = clear = sort = \
+        reverse = _read_only
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return ReadOnlyDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return ReadOnlyList(_freeze(item) for item in value)
+    return value
+
+# --- Locking ---
+
+@contextlib.contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT):
+    """Exclusive inter-process lock on <path>.lock (released on exit, even if the holder crashes)."""
+    lock_path = path + ".lock"
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for lock on {path}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+# --- Reading ---
+
+def load_json(path, default=None):
+    """
+    Loads a JSON file through the shared cache. The file is re-parsed only when
+    its mtime or size changes. Missing or empty files return `default` ({} if None).
+    :return: The data, as read-only dicts and lists (shared with other callers).
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return {} if default is None else default
+    with _cache_lock:
+        cached = _cache.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    if stat.st_size == 0:
+        return {} if default is None else default
+
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if not content.strip():
+        return {} if default is None else default
+    data = _freeze(json.loads(content))
+    with _cache_lock:
+        _cache[path] = (stat.st_mtime_ns, stat.st_size, data)
+    return data
+
+def invalidate(path=None):
+    """Drops the cached copy of one file (or all files)."""
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(path, None)
+
+# --- Writing ---
+
+def _write_atomic(path, data, indent):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    invalidate(path)
+
+def write_json(path, data, indent=4):
+    """Replaces a JSON file atomically (temp file + rename) under its file lock."""
+    with file_lock(path):
+        _write_atomic(path, data, indent)
+
+def update_json(path, mutate, indent=4):
+    """
+    Read-modify-write under the file lock: loads the current contents fresh,
+    calls mutate(data) to change them in place, then writes atomically. Use this
+    instead of load + write so concurrent writers don't lose each other's changes.
+    :return: Whatever mutate returns.
+    """
+    with file_lock(path):
+        invalidate(path)
+        data = load_json(path)
+        # Work on a private copy so readers sharing the cached object never see a half-applied change.
+        data = json.loads(json.dumps(data))
+        result = mutate(data)
+        _write_atomic(path, data, indent)
+    return result
@@ -1,23 +1,19 @@
 import pyautogui
 import time
-import json
 import os
 from logger import log_action
+from json_store import load_json, write_json, update_json
 
 KB_FILE = os.path.join("knowledge_base", "kb.json")
 IMAGES_DIR = os.path.join("knowledge_base", "images")
 
 def get_knowledge_base():
-    """Loads the knowledge base from the JSON file."""
-    if not os.path.exists(KB_FILE) or os.path.getsize(KB_FILE) == 0:
-        return {}
-    with open(KB_FILE, 'r') as f:
-        return json.load(f)
+    """Loads the knowledge base from the JSON file (a shared cached copy; don't modify it in place)."""
+    return load_json(KB_FILE)
 
 def save_knowledge_base(data):
-    """Saves the knowledge base to the JSON file."""
-    with open(KB_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+    """Replaces the knowledge base file atomically."""
+    write_json(KB_FILE, data)
 
 def learn_object():
     """Guides the user to teach the system a new object."""
@@ -70,8 +66,9 @@ def learn_object():
         log_action(f"Screenshot saved to: {image_path}")
 
         # 5. Update the knowledge base
-        kb[object_name] = image_path
-        save_knowledge_base(kb)
+        def add_object(kb):
+            kb[object_name] = image_path
+        update_json(KB_FILE, add_object)
         log_action(f"SUCCESS: Knowledge base updated for '{object_name}'.")
         print(f"\nI have learned what '{object_name}' looks like.")
 
@@ -1,26 +1,211 @@
+import os
+import sys
+import time
+import queue
+import atexit
 import datetime
+import itertools
+import threading
+import traceback
 
 LOG_FILE = "history.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate history.log past this size...
+LOG_MAX_AGE_HOURS = 24  # ...or once its first line is this old
+LOG_BACKUP_COUNT = 5  # history.log.1 (newest) .. history.log.5
+LOG_FLUSH_INTERVAL = 0.2  # Seconds the writer waits to fill a batch
+LOG_BATCH_SIZE = 1000  # Lines per write at most
+LOG_FLUSH_TIMEOUT = 5  # Seconds flush_logs() waits for the writer
+ROTATE_LOCK_STALE_SECONDS = 30  # A rotation lock older than this is assumed abandoned
+CONSOLE_ENV = "TACHTACH_LOG_CONSOLE"  # Set to "0" to skip the console echo (e.g. in parallel workers)
+
+# Callables that receive every log record (e.g. telemetry export).
+_listeners = []
+
+_queue = queue.SimpleQueue()
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+_start_time_cache = (None, None)  # (inode, time of the log's first line)
+_console = os.environ.get(CONSOLE_ENV, "1").lower() not in ("0", "false", "off")
+
+def add_log_listener(listener):
+    """Registers listener(record) to be called with a dict (time, level, message) for each log line."""
+    _listeners.append(listener)
+
+def remove_log_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+def _format(created, is_error, message):
+    timestamp = datetime.datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+    # Add a prefix for errors to make them easy to spot
+    prefix = "[ERROR]" if is_error else "[INFO]"
+    return f"{timestamp} {prefix}: {message}"
+
+def _critical(text):
+    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} [CRITICAL]: {text}", file=sys.__stderr__)
 
 def log_action(message, is_error=False):
     """
     Logs a message to both the console and the history.log file.
-    It prepends a timestamp to each message.
+    It prepends a timestamp to each message. The caller only queues the record:
+    a background thread formats it, echoes it to the console (the sys.stdout
+    current at the call, so redirections still apply) and writes it to the file
+    in batches. flush_logs() waits for both.
     """
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    created = time.time()
+    # Queue for the console and history.log (for the agent's "memory")
+    _queue.put((created, is_error, message, sys.stdout if _console else None))
+    _ensure_writer()
 
-    # Add a prefix for errors to make them easy to spot
-    prefix = "[ERROR]" if is_error else "[INFO]"
+    for listener in list(_listeners):
+        try:
+            listener({"time": created, "level": "ERROR" if is_error else "INFO", "message": message})
+        except Exception as e:
+            _critical(f"Log listener failed: {e}")
 
-    log_message = f"{timestamp} {prefix}: {message}"
+# --- Background Writer ---
 
-    # Print to console (for immediate user feedback)
-    print(log_message)
+def _ensure_writer():
+    global _writer, _writer_pid
+    if _writer is not None and _writer_pid == os.getpid() and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid() or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_loop, name="log-writer", daemon=True)
+            _writer_pid = os.getpid()
+            _writer.start()
 
-    # Append to the log file (for the agent's "memory")
+def _write_loop():
+    while True:
+        batch, waiters = [], []
+        item = _queue.get()
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while True:
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+                break  # A flush was requested: write what we have now
+            batch.append(item)
+            if len(batch) >= LOG_BATCH_SIZE:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if batch:
+            _write_batch(batch)
+        for waiter in waiters:
+            waiter.set()
+
+def _echo(batch, lines):
+    """Prints the batch's lines to the console streams they were logged for, one write per run of lines."""
+    for stream, group in itertools.groupby(zip(batch, lines), key=lambda pair: pair[0][3]):
+        if stream is None:
+            continue
+        try:
+            stream.write("".join(line for _, line in group))
+            stream.flush()
+        except (OSError, ValueError):
+            pass  # The stream was closed (e.g. a redirection ended) before the line got out
+
+def _write_batch(batch):
+    lines = [_format(created, is_error, message) + "\n" for created, is_error, message, _ in batch]
+    _echo(batch, lines)
+    data = "".join(lines).encode("utf-8")
     try:
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(log_message + "\n")
+        if _needs_rotation(len(data)):
+            _rotate(len(data))
+        # One O_APPEND write per batch: lines from concurrent processes never split each other.
+        fd = os.open(LOG_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
     except Exception as e:
         # If logging fails, print an error to the console so the user knows.
-        print(f"{timestamp} [CRITICAL]: Failed to write to log file: {e}")
\ No newline at end of file
+        _critical(f"Failed to write to log file: {e}")
+
+def flush_logs(timeout=LOG_FLUSH_TIMEOUT):
+    """Blocks until every line logged so far is echoed and written to history.log (or timeout)."""
+    if _writer is None or _writer_pid != os.getpid() or not _writer.is_alive():
+        if _queue.empty():
+            return True
+        _ensure_writer()
+    done = threading.Event()
+    _queue.put(done)
+    return done.wait(timeout)
+
+# --- Rotation ---
+
+def _log_start_time(stat):
+    """Time of the first line of history.log, cached per file (inode)."""
+    global _start_time_cache
+    if _start_time_cache[0] == stat.st_ino and _start_time_cache[1] is not None:
+        return _start_time_cache[1]
+    try:
+        with open(LOG_FILE, 'r', encoding='utf-8', errors='replace') as f:
+            started = datetime.datetime.strptime(f.read(19), "%Y-%m-%d %H:%M:%S").timestamp()
+    except (OSError, ValueError):
+        started = None
+    _start_time_cache = (stat.st_ino, started)
+    return started
+
+def _needs_rotation(incoming):
+    try:
+        stat = os.stat(LOG_FILE)
+    except FileNotFoundError:
+        return False
+    if stat.st_size and stat.st_size + incoming > LOG_MAX_BYTES:
+        return True
+    started = _log_start_time(stat)
+    return started is not None and time.time() - started > LOG_MAX_AGE_HOURS * 3600
+
+def _rotate(incoming):
+    """Shifts history.log -> .1 -> .2 ...; a lock file keeps concurrent processes from rotating twice."""
+    lock_path = LOG_FILE + ".lock"
+    try:
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock_path) > ROTATE_LOCK_STALE_SECONDS:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        return  # Another process is rotating; keep appending to the current file
+    try:
+        if not _needs_rotation(incoming):
+            return  # Someone else rotated between our check and taking the lock
+        for i in range(LOG_BACKUP_COUNT - 1, 0, -1):
+            if os.path.exists(f"{LOG_FILE}.{i}"):
+                os.replace(f"{LOG_FILE}.{i}", f"{LOG_FILE}.{i + 1}")
+        os.replace(LOG_FILE, f"{LOG_FILE}.1")
+    finally:
+        os.close(lock_fd)
+        os.remove(lock_path)
+
+# --- Exit & Crash Handling ---
+
+def _excepthook(exc_type, exc, tb):
+    if not issubclass(exc_type, KeyboardInterrupt):
+        log_action("Unhandled exception:\n" + "".join(traceback.format_exception(exc_type, exc, tb)).rstrip(), is_error=True)
+    flush_logs()
+    _previous_excepthook(exc_type, exc, tb)
+
+def _thread_excepthook(args):
+    if not issubclass(args.exc_type, SystemExit):
+        log_action(f"Unhandled exception in thread {args.thread.name if args.thread else '?'}:\n" +
+                   "".join(traceback.format_exception(args.exc_type, args.exc_value, args.exc_traceback)).rstrip(),
+                   is_error=True)
+    flush_logs()
+    _previous_thread_excepthook(args)
+
+_previous_excepthook = sys.excepthook
+_previous_thread_excepthook = threading.excepthook
+sys.excepthook = _excepthook
+threading.excepthook = _thread_excepthook
+atexit.register(flush_logs)
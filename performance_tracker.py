@@ -1,53 +1,71 @@
 import os
-import json
 import time
+import atexit
+import statistics
 from logger import log_action
+from baseline_store import BaselineStore
 
 # --- Constants ---
-BASELINE_DIR = os.path.join("knowledge_base", "performance_baselines")
-REGRESSION_THRESHOLD = 20.0  # Percentage
-
-# --- File Operations ---
+BASELINE_DB = os.path.join("knowledge_base", "performance_baselines.db")
+BASELINE_DIR = os.path.join("knowledge_base", "performance_baselines")  # Legacy per-test files, imported once
+BASELINE_WINDOW_SIZE = 30  # Samples kept per step (rolling window)
+MIN_BASELINE_SAMPLES = 5  # Below this, a step is not judged for regressions
+MAD_THRESHOLD = 3.5  # Modified z-score cutoff (Iglewicz & Hoaglin)
+MIN_SLOWDOWN_PERCENT = 5.0  # Ignore statistically "unusual" but negligible slowdowns
+
+# --- Baseline Store Access ---
+
+_store = None
+
+def get_baseline_store():
+    """Returns the shared baseline store (loaded on first use, reloaded when another process changes it)."""
+    global _store
+    if _store is None:
+        _store = BaselineStore(BASELINE_DB, window_size=BASELINE_WINDOW_SIZE, legacy_dir=BASELINE_DIR)
+        atexit.register(_store.flush)
+    return _store
+
+def flush_baselines():
+    """Writes any queued baseline samples to disk in one transaction."""
+    if _store is not None:
+        return _store.flush()
+    return True
 
 def load_baseline(test_name):
-    """Loads the performance baseline for a given test."""
-    baseline_path = os.path.join(BASELINE_DIR, f"{test_name}.json")
-    if not os.path.exists(baseline_path):
-        return None
-    try:
-        with open(baseline_path, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        log_action(f"Error loading baseline file {baseline_path}: {e}", is_error=True)
-        return None
-
-def save_baseline(test_name, data):
-    """Saves performance data as the new baseline for a test."""
-    if not os.path.exists(BASELINE_DIR):
-        os.makedirs(BASELINE_DIR)
-
-    baseline_path = os.path.join(BASELINE_DIR, f"{test_name}.json")
-    try:
-        with open(baseline_path, 'w') as f:
-            json.dump(data, f, indent=4)
-        log_action(f"Performance baseline saved for '{test_name}' at {baseline_path}")
-    except Exception as e:
-        log_action(f"Error saving baseline file {baseline_path}: {e}", is_error=True)
+    """Loads the performance baseline (per-step sample windows) for a given test."""
+    return get_baseline_store().get(test_name)
 
 def delete_baseline(test_name):
-    """Deletes a performance baseline file, forcing it to be recreated."""
-    baseline_path = os.path.join(BASELINE_DIR, f"{test_name}.json")
-    if os.path.exists(baseline_path):
-        try:
-            os.remove(baseline_path)
-            log_action(f"Successfully deleted performance baseline for '{test_name}'.")
-            return True
-        except Exception as e:
-            log_action(f"Error deleting baseline for '{test_name}': {e}", is_error=True)
-            return False
-    else:
+    """Deletes a performance baseline, forcing it to be recreated."""
+    store = get_baseline_store()
+    if not store.delete(test_name):
         log_action(f"Baseline for '{test_name}' not found. Nothing to delete.")
         return True # It's not an error if it's already gone
+    if store.flush():
+        log_action(f"Successfully deleted performance baseline for '{test_name}'.")
+        return True
+    log_action(f"Error deleting baseline for '{test_name}'.", is_error=True)
+    return False
+
+# --- Baseline Statistics ---
+
+def compute_step_stats(samples):
+    """
+    Summarizes a step's sample window with robust statistics.
+    :return: A dict with median, MAD, p90 and sample count, or None if there are no samples.
+    """
+    if not samples:
+        return None
+
+    median = statistics.median(samples)
+    mad = statistics.median(abs(ms - median) for ms in samples)
+    p90 = statistics.quantiles(samples, n=10, method="inclusive")[-1] if len(samples) > 1 else samples[0]
+    return {
+        "median_ms": round(median, 2),
+        "mad_ms": round(mad, 2),
+        "p90_ms": round(p90, 2),
+        "samples": len(samples)
+    }
 
 # --- Core Logic Class ---
 
@@ -67,60 +85,94 @@ class PerformanceTracker:
 
     def start_step(self, step_index):
         """Starts the timer for a specific step."""
-        self._timers[step_index] = time.perf_counter()
+        self._timers[step_index] = (time.perf_counter(), time.time())
 
-    def stop_step(self, step_index):
-        """Stops the timer for a step, calculates duration, and analyzes performance."""
+    def stop_step(self, step_index, spans=None):
+        """
+        Stops the timer for a step, calculates duration, and analyzes performance.
+        :param spans: Optional nested span tree (see spans.py) recorded while the step ran.
+        """
         if step_index not in self._timers:
             return
 
         end_time = time.perf_counter()
-        start_time = self._timers.pop(step_index)
-        duration_ms = (end_time - start_time) * 1000
+        start_time, started_at = self._timers.pop(step_index)
+        self.record_step(step_index, (end_time - start_time) * 1000, started_at, spans)
 
-        # Get baseline for this specific step
-        baseline_ms = None
-        if self.baseline and "steps" in self.baseline and step_index < len(self.baseline["steps"]):
-            baseline_ms = self.baseline["steps"][step_index].get("duration_ms")
+    def record_step(self, step_index, duration_ms, started_at, spans=None):
+        """
+        Records a step timed elsewhere (e.g. a step shared by several scenarios) and analyzes it.
+        :param started_at: Epoch seconds when the step started.
+        """
+        # Get the sample window for this specific step
+        samples = self._baseline_samples(step_index)
+        stats = compute_step_stats(samples)
 
         # Detect regression
-        regression, slowdown_percent = self._detect_regression(duration_ms, baseline_ms)
+        regression, slowdown_percent = self._detect_regression(duration_ms, samples)
         if regression:
             self.results["has_regression"] = True
 
         step_result = {
             "step": step_index + 1,
+            "start_time": round(started_at, 6),
             "duration_ms": round(duration_ms, 2),
-            "baseline_ms": baseline_ms,
+            "baseline_ms": stats["median_ms"] if stats else None,
+            "baseline_p90_ms": stats["p90_ms"] if stats else None,
+            "baseline_samples": len(samples),
             "regression": regression
         }
         if slowdown_percent is not None:
             step_result["slowdown_percent"] = slowdown_percent
+        if spans:
+            step_result["spans"] = spans
 
         self.results["steps"].append(step_result)
 
-    def finalize(self):
-        """Calculates total duration and returns the final performance report."""
+    def finalize(self, record_baseline=True):
+        """
+        Calculates total duration and returns the final performance report.
+        :param record_baseline: Whether this run's step timings join the baseline windows.
+                                Failed runs should pass False so timeouts don't skew the history.
+        """
         self.results["total_duration_ms"] = sum(step["duration_ms"] for step in self.results["steps"])
 
-        # If no baseline existed, the current run becomes the new baseline.
-        if self.baseline is None:
-            log_action(f"Creating initial performance baseline for '{self.test_name}'.")
-            save_baseline(self.test_name, self.results)
+        if record_baseline and self.results["steps"]:
+            if self.baseline is None:
+                log_action(f"Creating initial performance baseline for '{self.test_name}'.")
+            durations = {step["step"] - 1: step["duration_ms"] for step in self.results["steps"]}
+            get_baseline_store().record(self.test_name, durations)
 
         return self.results
 
-    def _detect_regression(self, current_ms, baseline_ms):
+    def _baseline_samples(self, step_index):
+        """Returns the baseline sample window for a step (empty if none recorded)."""
+        if self.baseline and step_index < len(self.baseline["steps"]):
+            return self.baseline["steps"][step_index]["samples"]
+        return []
+
+    def _detect_regression(self, current_ms, samples):
         """
-        Compares current duration with baseline and checks for regression.
+        Compares current duration with the step's sample window using median/MAD.
+        A step regresses when its modified z-score exceeds MAD_THRESHOLD and it is
+        also at least MIN_SLOWDOWN_PERCENT slower than the median.
         :return: A tuple (bool: is_regression, float: slowdown_percentage|None)
         """
-        if baseline_ms is None or current_ms <= 0 or baseline_ms <= 0:
+        if not samples or current_ms <= 0:
+            return False, None
+
+        median = statistics.median(samples)
+        if median <= 0:
             return False, None
 
-        percentage_diff = ((current_ms - baseline_ms) / baseline_ms) * 100
+        percentage_diff = round(((current_ms - median) / median) * 100, 2)
+        if len(samples) < MIN_BASELINE_SAMPLES or percentage_diff <= MIN_SLOWDOWN_PERCENT:
+            return False, percentage_diff
 
-        if percentage_diff > REGRESSION_THRESHOLD:
-            return True, round(percentage_diff, 2)
+        mad = statistics.median(abs(ms - median) for ms in samples)
+        if mad == 0:
+            # Perfectly stable history: any slowdown above the floor is significant.
+            return True, percentage_diff
 
-        return False, round(percentage_diff, 2)
\ No newline at end of file
+        modified_z = 0.6745 * (current_ms - median) / mad
+        return modified_z > MAD_THRESHOLD, percentage_diff
@@ -0,0 +1,144 @@
+import os
+import gzip
+import json
+import hashlib
+import datetime
+from logger import log_action
+
+# --- Constants ---
+REPORT_STREAM_FILE = "execution_report.ndjson.gz"  # Written next to execution_report.json
+LEGACY_REPORT_FILE = "execution_report.json"
+STREAM_FORMAT_VERSION = 1
+COMPRESS_LEVEL = 6  # gzip level for .gz streams (9 is noticeably slower for little gain)
+STREAM_SUFFIXES = (".ndjson", ".ndjson.gz", ".jsonl", ".jsonl.gz")
+
+# Record layout, one JSON object per line:
+#   {"type": "header", "format": 1, "timestamp": ..., "framework_version": ..., "summary": {...}}
+#   {"type": "test", ...one test result...}            (repeated)
+
+# --- Helpers ---
+
+def is_stream(path):
+    return path.endswith(STREAM_SUFFIXES)
+
+def _open(path, mode, compressed=None):
+    if compressed is None:
+        compressed = path.endswith(".gz")
+    if not compressed:
+        return open(path, mode, encoding="utf-8")
+    if "w" in mode:
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=COMPRESS_LEVEL)
+    return gzip.open(path, mode + "t", encoding="utf-8")
+
+# --- Writing ---
+
+def write_report_stream(report, path=REPORT_STREAM_FILE):
+    """
+    Writes a report as newline-delimited records (gzip-compressed for .gz paths).
+    The file is replaced atomically, so readers never see a half-written report.
+    :return: True on success.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with _open(tmp_path, "w", compressed=path.endswith(".gz")) as f:
+            header = {key: value for key, value in report.items() if key != "tests"}
+            header.update({"type": "header", "format": STREAM_FORMAT_VERSION})
+            f.write(json.dumps(header, separators=(",", ":")) + "\n")
+            for test in report.get("tests", []):
+                f.write(json.dumps(dict(test, type="test"), separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        log_action(f"Failed to write report stream {path}: {e}", is_error=True)
+        return False
+
+def archive_report_stream(target_dir, path=REPORT_STREAM_FILE):
+    """Moves the current report stream to target_dir as report_<timestamp>.ndjson(.gz)."""
+    if not os.path.exists(path):
+        return
+    try:
+        os.makedirs(target_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = ".ndjson.gz" if path.endswith(".gz") else ".ndjson"
+        archive_path = os.path.join(target_dir, f"report_{timestamp}{suffix}")
+        os.rename(path, archive_path)
+        log_action(f"Archived {path} to {archive_path}")
+    except Exception as e:
+        log_action(f"Could not archive {path}: {e}", is_error=True)
+
+# --- Reading ---
+
+def latest_report_path():
+    """The newest report on disk: the stream if present, else the legacy JSON document."""
+    if os.path.exists(REPORT_STREAM_FILE):
+        return REPORT_STREAM_FILE
+    if os.path.exists(LEGACY_REPORT_FILE):
+        return LEGACY_REPORT_FILE
+    return None
+
+def iter_records(path):
+    """
+    Yields the records of a report stream one at a time. Legacy JSON documents
+    are accepted too (loaded whole, then yielded as the same records).
+    """
+    if not is_stream(path):
+        with open(path, 'r') as f:
+            report = json.load(f)
+        header = {key: value for key, value in report.items() if key != "tests"}
+        header.update({"type": "header", "format": 0})
+        yield header
+        for test in report.get("tests", []):
+            yield dict(test, type="test")
+        return
+
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_report_header(path=None):
+    """
+    Reads only the header (timestamp, framework_version, summary) of a report.
+    :return: The header dict without the record type fields, or None.
+    """
+    path = path or latest_report_path()
+    if not path:
+        return None
+    try:
+        for record in iter_records(path):
+            if record.get("type") == "header":
+                return {key: value for key, value in record.items() if key not in ("type", "format")}
+            break
+    except Exception as e:
+        log_action(f"Error reading report header from {path}: {e}", is_error=True)
+    return None
+
+def iter_tests(path=None):
+    """Yields the test results of a report one at a time (without the record type field)."""
+    path = path or latest_report_path()
+    if not path:
+        return
+    for record in iter_records(path):
+        if record.pop("type", None) == "test":
+            yield record
+
+def load_report(path=None):
+    """Loads a whole report (stream or legacy JSON) into the execution_report.json shape."""
+    path = path or latest_report_path()
+    if not path:
+        return None
+    try:
+        report = read_report_header(path) or {}
+        report["tests"] = list(iter_tests(path))
+        return report
+    except Exception as e:
+        log_action(f"Error loading report {path}: {e}", is_error=True)
+        return None
+
+def file_digest(path):
+    """SHA-1 of a file's bytes, read in chunks."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -1,19 +1,19 @@
-import json
 import os
 import sys
 from logger import log_action
+from scenario_repository import LazyScenarios, save_scenario, replace_all, SCENARIOS_DIR
 
 # --- Constants ---
-SCENARIO_FILE = os.path.join("knowledge_base", "scenarios.json")
 BASELINE_DIR = os.path.join("knowledge_base", "visual_baselines")
 
 # --- Programmatic API for Command Interface ---
 
-def create_or_update_scenario(name, steps):
+def create_or_update_scenario(name, steps, tags=None):
     """
     Creates a new scenario or updates an existing one programmatically.
     :param name: The name of the scenario.
     :param steps: A list of step dictionaries.
+    :param tags: Optional list of tags (existing tags are kept if omitted).
     :return: True on success, False on failure.
     """
     if not name or not steps:
@@ -21,9 +21,10 @@ def create_or_update_scenario(name, steps):
         return False
 
     log_action(f"Programmatically creating/updating scenario: '{name}'")
-    scenarios = get_scenarios()
-    scenarios[name] = steps
-    save_scenarios(scenarios)
+    # Only this scenario's own file is rewritten.
+    if not save_scenario(name, steps, tags):
+        return False
+    log_action(f"Scenario '{name}' saved to {SCENARIOS_DIR}")
     return True
 
 def delete_visual_baseline(baseline_name):
@@ -50,17 +51,13 @@ def delete_visual_baseline(baseline_name):
 # --- Core Helper Functions ---
 
 def get_scenarios():
-    """Loads scenarios from the JSON file."""
-    if not os.path.exists(SCENARIO_FILE) or os.path.getsize(SCENARIO_FILE) == 0:
-        return {}
-    with open(SCENARIO_FILE, 'r') as f:
-        return json.load(f)
+    """Read-only {name: steps} view of the scenario repository; steps load on first access."""
+    return LazyScenarios()
 
 def save_scenarios(data):
-    """Saves scenarios to the JSON file."""
-    with open(SCENARIO_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
-    log_action(f"Scenarios saved to {SCENARIO_FILE}")
+    """Replaces the whole scenario repository (use create_or_update_scenario for single changes)."""
+    replace_all(data)
+    log_action(f"Scenarios saved to {SCENARIOS_DIR}")
 
 
 # --- Interactive Mode Functions (for standalone use) ---
@@ -0,0 +1,162 @@
+import os
+import re
+import hashlib
+from collections.abc import Mapping
+from logger import log_action
+from json_store import load_json, write_json, file_lock
+
+# --- Constants ---
+SCENARIOS_DIR = os.path.join("knowledge_base", "scenarios")  # One <name>.json per scenario
+INDEX_FILE = os.path.join(SCENARIOS_DIR, ".index.json")  # Derived from the shards, never edited by hand
+LEGACY_SCENARIO_FILE = os.path.join("knowledge_base", "scenarios.json")  # Single-blob layout, migrated on first use
+KB_OBJECT_ACTIONS = ("find-image", "assert-image", "wait-for-image")  # Actions whose target is a kb.json object
+INDEX_FORMAT_VERSION = 1
+
+# Shard layout: {"name": ..., "tags": [...], "steps": [...]}, pretty-printed so
+# one-line edits stay one-line diffs. The index holds, per scenario, the shard
+# file, its mtime/size, step count, tags and referenced KB objects. It is
+# refreshed incrementally: only shards whose mtime/size changed are re-read.
+
+# --- Layout ---
+
+def shard_path(name):
+    """File for a scenario: its name made filesystem-safe, plus a hash when that changed it."""
+    stem = re.sub(r"[^a-z0-9_.-]+", "_", name.lower()).strip("._") or "scenario"
+    if stem != name:
+        stem = f"{stem[:80]}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+    return os.path.join(SCENARIOS_DIR, f"{stem}.json")
+
+def _summarize(shard, stat):
+    steps = shard.get("steps", [])
+    return {
+        "name": shard.get("name"),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "steps": len(steps),
+        "tags": shard.get("tags", []),
+        "kb_objects": sorted({step.get("target") for step in steps
+                              if step.get("action") in KB_OBJECT_ACTIONS and step.get("target")})
+    }
+
+# --- Index ---
+
+def load_index():
+    """
+    Returns {name: summary} for every scenario, re-reading only the shards that
+    changed since the index was last written (e.g. after a git pull).
+    """
+    migrate_legacy_file()
+    if not os.path.isdir(SCENARIOS_DIR):
+        return {}
+    index = load_json(INDEX_FILE)
+    known = index.get("files", {}) if index.get("format") == INDEX_FORMAT_VERSION else {}
+    files, changed = {}, False
+    for entry in os.scandir(SCENARIOS_DIR):
+        if not entry.name.endswith(".json") or entry.name.startswith(".") or not entry.is_file():
+            continue
+        stat = entry.stat()
+        summary = known.get(entry.name)
+        if not summary or summary["mtime_ns"] != stat.st_mtime_ns or summary["size"] != stat.st_size:
+            try:
+                summary = _summarize(load_json(entry.path), stat)
+            except ValueError as e:
+                log_action(f"Skipping unreadable scenario file {entry.path}: {e}", is_error=True)
+                continue
+            changed = True
+        files[entry.name] = summary
+    if changed or len(files) != len(known):
+        try:
+            write_json(INDEX_FILE, {"format": INDEX_FORMAT_VERSION, "files": files}, indent=None)
+        except Exception as e:
+            log_action(f"Could not update scenario index: {e}", is_error=True)
+    return {summary["name"]: dict(summary, file=file_name) for file_name, summary in sorted(files.items())
+            if summary.get("name")}
+
+def list_scenarios(tag=None, kb_object=None):
+    """Names of all scenarios, optionally only those with a tag or using a KB object."""
+    return [name for name, summary in load_index().items()
+            if (tag is None or tag in summary["tags"]) and (kb_object is None or kb_object in summary["kb_objects"])]
+
+# --- Scenarios ---
+
+def get_scenario(name):
+    """Loads one scenario's steps (cached until its file changes), or None if it doesn't exist."""
+    migrate_legacy_file()
+    shard = load_json(shard_path(name))
+    if shard.get("name") != name:
+        return None
+    return shard.get("steps", [])
+
+def save_scenario(name, steps, tags=None):
+    """
+    Writes one scenario to its own file (atomically). Existing tags are kept unless given.
+    :return: True on success, False on failure.
+    """
+    path = shard_path(name)
+    try:
+        migrate_legacy_file()
+        if tags is None:
+            tags = load_json(path).get("tags", [])
+        write_json(path, {"name": name, "tags": list(tags), "steps": steps})
+        return True
+    except Exception as e:
+        log_action(f"Error saving scenario '{name}' to {path}: {e}", is_error=True)
+        return False
+
+def delete_scenario(name):
+    path = shard_path(name)
+    if get_scenario(name) is None:
+        return False
+    with file_lock(path):
+        os.remove(path)
+    return True
+
+def replace_all(scenarios):
+    """Makes the repository hold exactly the given {name: steps} scenarios."""
+    for name, steps in scenarios.items():
+        save_scenario(name, steps)
+    for name in set(load_index()) - set(scenarios):
+        delete_scenario(name)
+
+class LazyScenarios(Mapping):
+    """Read-only {name: steps} view of the repository; steps are loaded on first access."""
+
+    def __init__(self):
+        self._names = None
+
+    def _index_names(self):
+        if self._names is None:
+            self._names = list(load_index())
+        return self._names
+
+    def __getitem__(self, name):
+        steps = get_scenario(name)
+        if steps is None:
+            raise KeyError(name)
+        return steps
+
+    def __contains__(self, name):
+        return isinstance(name, str) and get_scenario(name) is not None
+
+    def __iter__(self):
+        return iter(self._index_names())
+
+    def __len__(self):
+        return len(self._index_names())
+
+# --- Migration ---
+
+def migrate_legacy_file():
+    """Splits a legacy knowledge_base/scenarios.json into per-scenario files (once), then renames it."""
+    if not os.path.exists(LEGACY_SCENARIO_FILE):
+        return
+    with file_lock(LEGACY_SCENARIO_FILE):
+        if not os.path.exists(LEGACY_SCENARIO_FILE):
+            return  # Another process migrated it while we waited
+        scenarios = load_json(LEGACY_SCENARIO_FILE)
+        for name, steps in scenarios.items():
+            path = shard_path(name)
+            if not os.path.exists(path):
+                write_json(path, {"name": name, "tags": [], "steps": steps})
+        os.replace(LEGACY_SCENARIO_FILE, LEGACY_SCENARIO_FILE + ".migrated")
+    log_action(f"Migrated {len(scenarios)} scenarios from {LEGACY_SCENARIO_FILE} to {SCENARIOS_DIR}/")
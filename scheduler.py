@@ -1,9 +1,16 @@
 import os
-import time
-import argparse
+import math
 import json
+import random
+import argparse
 import datetime
+import threading
+import collections
 from logger import log_action
+from cron import CronExpression
+from scenario_repository import list_scenarios
+from history_store import record_report, rollup_history
+from report_stream import write_report_stream, archive_report_stream
 from test_runner import run_scenario_based_suite
 from analysis_packager import create_analysis_package
 
@@ -11,6 +18,13 @@ from analysis_packager import create_analysis_package
 REPORT_FILE = "execution_report.json"
 HISTORY_DIR = os.path.join("reports", "history")
 FRAMEWORK_VERSION = "5.0"
+SCHEDULES_FILE = "schedules.json"  # Not shipped: copy schedules.example.json to start from it
+DEFAULT_INTERVAL_SECONDS = 3600  # Without a schedules file: the full suite every hour
+DEFAULT_MAX_CONCURRENT = 1  # GUI scenarios share one screen; raise only for groups that can run side by side
+OVERLAP_POLICIES = ("skip", "queue")
+MAX_SLEEP_SECONDS = 60
+
+_report_lock = threading.Lock()
 
 # --- Core Functions ---
 
@@ -27,14 +41,17 @@ def archive_report():
             log_action(f"Could not archive previous report: {e}", is_error=True)
 
 def write_report(data):
-    """Archives the old report and writes the new one."""
+    """Archives the old report and writes the new one (JSON document plus NDJSON stream)."""
     archive_report()
+    archive_report_stream(HISTORY_DIR)
     log_action("Writing new execution report.")
     try:
         with open(REPORT_FILE, 'w') as f:
             json.dump(data, f, indent=4)
     except Exception as e:
         log_action(f"Failed to write report: {e}", is_error=True)
+    write_report_stream(data)
+    record_report(data, source="scheduler")
 
 def _format_test_report(test_results):
     """Helper function to format the final JSON report from test results."""
@@ -48,41 +65,227 @@ def _format_test_report(test_results):
         "tests": test_results
     }
 
-# --- Main Scheduler Loop ---
+# --- Test Cycle ---
 
-def main(interval_seconds):
+def run_test_cycle(test_names=None, order="history", max_failures=None, label="default", queue=None):
     """
-    Main scheduler loop to run tests and generate analysis packages periodically.
+    Runs one suite (all scenarios, or test_names), then writes the report and analysis package.
+    :param queue: Job queue url (or "local") to run the suite on distributed workers.
     """
-    log_action(f"Scheduler started. Will run tests every {interval_seconds} seconds.")
-
-    while True:
-        log_action("--- Scheduler: Starting new test cycle. ---")
+    if test_names is not None and not test_names:
+        log_action(f"Scheduler [{label}]: no scenarios match this schedule; nothing to run.")
+        return
+    log_action(f"--- Scheduler [{label}]: Starting new test cycle. ---")
 
-        # 1. Run all scenario-based tests
-        test_results = run_scenario_based_suite()
+    # 1. Run the scenario-based tests
+    test_results = run_scenario_based_suite(test_names, order=order, max_failures=max_failures, queue=queue)
 
-        if test_results:
-            # 2. Write the execution report
+    if test_results:
+        # 2. Write the execution report and 3. create the analysis package for the AI Lead
+        # (one cycle at a time, so concurrent schedules don't archive each other's reports)
+        with _report_lock:
             report_data = _format_test_report(test_results)
             write_report(report_data)
-
-            # 3. Create the analysis package for the AI Lead
             create_analysis_package()
+    else:
+        log_action(f"No tests were run in this cycle [{label}].")
+
+    # 4. Compact old history into hourly/daily tiers (at most once a day)
+    rollup_history()
+    log_action(f"--- Scheduler [{label}]: Cycle complete. ---")
+
+# --- Schedules ---
+
+class Schedule:
+    """
+    One named schedule from schedules.json: when it fires (a cron expression or a
+    fixed period) and which scenarios it runs (names and/or repository tags).
+    """
+
+    def __init__(self, config, anchor):
+        self.name = config["name"]
+        self.cron = CronExpression(config["cron"]) if config.get("cron") else None
+        self.every = float(config["every_seconds"]) if config.get("every_seconds") else None
+        if not self.cron and not self.every:
+            raise ValueError(f"Schedule '{self.name}' needs 'cron' or 'every_seconds'")
+        self.overlap = config.get("overlap", "skip")
+        if self.overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Schedule '{self.name}': overlap must be one of {OVERLAP_POLICIES}")
+        self.scenarios = config.get("scenarios")
+        self.tags = config.get("tags")
+        self.jitter = float(config.get("jitter_seconds", 0))
+        self.order = config.get("order", "history")
+        self.max_failures = config.get("max_failures")
+        self.queue = config.get("queue")
+        self.run_on_start = config.get("run_on_start", False)
+        self.anchor = anchor  # Fixed-period schedules fire at anchor + k * every, whatever the runs take
+        self.due = None  # Next nominal fire time
+        self.fire_at = None  # due plus this fire's jitter
+        self.running = False
+        self.queued = False
+
+    def plan_next(self, now):
+        """Plans the first fire strictly after `now`; fires missed while busy or asleep are not made up."""
+        if self.cron:
+            self.due = self.cron.next_after(now)
         else:
-            log_action("No tests were run in this cycle.")
+            periods = math.floor((now - self.anchor).total_seconds() / self.every) + 1
+            self.due = self.anchor + datetime.timedelta(seconds=periods * self.every)
+        self.fire_at = self.due + datetime.timedelta(seconds=random.uniform(0, self.jitter)) if self.due else None
+
+    def test_names(self):
+        """The scenarios this schedule runs (None for all)."""
+        if not self.scenarios and not self.tags:
+            return None
+        names = list(self.scenarios or [])
+        for tag in self.tags or []:
+            names.extend(name for name in list_scenarios(tag=tag) if name not in names)
+        return names
+
+def load_schedules(path=SCHEDULES_FILE, queue=None):
+    """
+    Reads schedules.json: {"max_concurrent": n, "queue": url, "schedules": [{...}, ...]}.
+    :param queue: Job queue for schedules that name none (overrides the file's default).
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+    now = datetime.datetime.now()
+    default_queue = queue or config.get("queue")
+    return [Schedule(dict({"queue": default_queue}, **entry), now) for entry in config.get("schedules", [])], \
+        config.get("max_concurrent", DEFAULT_MAX_CONCURRENT)
+
+class MultiScheduler:
+    """
+    Fires schedules at absolute times, so a cycle's duration never shifts the next
+    one. A schedule whose previous run is still going, or that finds all
+    `max_concurrent` slots busy, is skipped or queued (once) per its overlap policy.
+    """
+
+    def __init__(self, schedules, max_concurrent=DEFAULT_MAX_CONCURRENT):
+        self.schedules = schedules
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.active = 0
+        self.waiting = collections.deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def run_forever(self):
+        now = datetime.datetime.now()
+        for schedule in self.schedules:
+            schedule.plan_next(now)
+            if schedule.run_on_start:
+                schedule.due = schedule.fire_at = now
+            log_action(f"Schedule '{schedule.name}' ({schedule.cron.expression if schedule.cron else f'every {schedule.every:g}s'}, "
+                       f"overlap: {schedule.overlap}) next runs at {schedule.fire_at}.")
 
-        log_action(f"--- Scheduler: Cycle complete. Waiting for {interval_seconds} seconds. ---")
-        time.sleep(interval_seconds)
+        while True:
+            now = datetime.datetime.now()
+            for schedule in self.schedules:
+                if schedule.fire_at and now >= schedule.fire_at:
+                    self._trigger(schedule)
+                    schedule.plan_next(max(now, schedule.due))
+            upcoming = [schedule.fire_at for schedule in self.schedules if schedule.fire_at]
+            if not upcoming:
+                log_action("No schedule will fire again; scheduler stopping.", is_error=True)
+                return
+            # Re-check the clock at least every MAX_SLEEP_SECONDS (system sleep, clock changes).
+            timeout = min((min(upcoming) - now).total_seconds(), MAX_SLEEP_SECONDS)
+            self._wake.wait(max(timeout, 0))
+            self._wake.clear()
+
+    def _trigger(self, schedule):
+        with self._lock:
+            if not schedule.running and self.active < self.max_concurrent:
+                self._start(schedule)
+                return
+            reason = "its previous run is still active" if schedule.running else \
+                f"all {self.max_concurrent} run slot(s) are busy"
+            if schedule.overlap == "queue" and not schedule.queued:
+                schedule.queued = True
+                self.waiting.append(schedule)
+                log_action(f"Schedule '{schedule.name}' queued: {reason}.")
+            else:
+                log_action(f"Schedule '{schedule.name}' skipped: {reason}.")
+
+    def _start(self, schedule):
+        """Starts a run in its own thread (call with the lock held)."""
+        schedule.running = True
+        self.active += 1
+        threading.Thread(target=self._run, args=(schedule,), name=f"schedule-{schedule.name}", daemon=True).start()
+
+    def _run(self, schedule):
+        try:
+            run_test_cycle(schedule.test_names(), schedule.order, schedule.max_failures, schedule.name, schedule.queue)
+        except Exception as e:
+            log_action(f"Schedule '{schedule.name}' failed: {e}", is_error=True)
+        finally:
+            with self._lock:
+                schedule.running = False
+                self.active -= 1
+                for waiting in list(self.waiting):
+                    if self.active >= self.max_concurrent:
+                        break
+                    if not waiting.running:
+                        self.waiting.remove(waiting)
+                        waiting.queued = False
+                        self._start(waiting)
+            self._wake.set()
+
+# --- Main Scheduler Loop ---
+
+def main(interval_seconds=None, order="history", max_failures=None, config_path=SCHEDULES_FILE, max_concurrent=None,
+         queue=None):
+    """
+    Runs the schedules from schedules.json, or, with interval_seconds (or without a
+    config file), the full suite every interval_seconds starting now.
+    :param order: Test order for the interval schedule ("history" runs likely failures first).
+    :param max_failures: Optional fail-fast cutoff for the interval schedule.
+    :param queue: Submit the runs to this job queue (url or "local") instead of running them here.
+    """
+    if interval_seconds is None and os.path.exists(config_path):
+        schedules, config_concurrent = load_schedules(config_path, queue)
+        log_action(f"Scheduler started with {len(schedules)} schedule(s) from {config_path}.")
+    else:
+        interval_seconds = interval_seconds or DEFAULT_INTERVAL_SECONDS
+        schedules = [Schedule({"name": "default", "every_seconds": interval_seconds, "order": order,
+                               "max_failures": max_failures, "queue": queue, "run_on_start": True}, datetime.datetime.now())]
+        config_concurrent = DEFAULT_MAX_CONCURRENT
+        log_action(f"Scheduler started. Will run tests every {interval_seconds} seconds.")
+    MultiScheduler(schedules, max_concurrent or config_concurrent).run_forever()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Automated QA Test Scheduler.")
+    parser.add_argument(
+        "--config",
+        default=SCHEDULES_FILE,
+        help=f"Schedules file (cron or fixed-period schedules per scenario group). Default is {SCHEDULES_FILE}."
+    )
     parser.add_argument(
         "--interval",
         type=int,
-        default=3600,
-        help="The interval in seconds between test runs. Default is 3600 (1 hour)."
+        help="Ignore the schedules file and run the full suite every N seconds "
+             f"(the default when there is no schedules file is {DEFAULT_INTERVAL_SECONDS})."
+    )
+    parser.add_argument(
+        "--order",
+        choices=["defined", "history"],
+        default="history",
+        help="Test order for --interval runs: 'history' runs recently failing, flaky and likely-to-fail tests first."
+    )
+    parser.add_argument(
+        "--max-failures",
+        type=int,
+        help="Fail fast: end an --interval cycle after this many failed tests."
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        help="Run at most this many schedules at once (overrides the schedules file)."
+    )
+    parser.add_argument(
+        "--queue",
+        help="Submit runs to a job queue ('local' or http://host:port) for distributed workers (see distributed_runner.py)."
     )
     args = parser.parse_args()
 
-    main(args.interval)
\ No newline at end of file
+    main(args.interval, args.order, args.max_failures, args.config, args.max_concurrent, args.queue)
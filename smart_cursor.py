@@ -1,10 +1,15 @@
 import os
 import sys
-import json
 import time
+import atexit
 import datetime
+import functools
 import pyautogui
 from logger import log_action
+from spans import span, write_span_file
+from event_log import install_event_log
+from json_store import load_json
+from scenario_repository import LazyScenarios, get_scenario
 
 # --- Backend Imports ---
 # Image/OCR based actions
@@ -25,16 +30,14 @@ except ImportError:
 
 # --- Constants ---
 KB_FILE = os.path.join("knowledge_base", "kb.json")
-SCENARIO_FILE = os.path.join("knowledge_base", "scenarios.json")
 
 # --- Data Loading ---
+# Shared, read-only copies: re-parsed only when the file changes on disk.
 def get_knowledge_base():
-    if not os.path.exists(KB_FILE) or os.path.getsize(KB_FILE) == 0: return {}
-    with open(KB_FILE, 'r') as f: return json.load(f)
+    return load_json(KB_FILE)
 
 def get_scenarios():
-    if not os.path.exists(SCENARIO_FILE) or os.path.getsize(SCENARIO_FILE) == 0: return {}
-    with open(SCENARIO_FILE, 'r') as f: return json.load(f)
+    return LazyScenarios()
 
 # --- Action Implementations ---
 
@@ -44,7 +47,11 @@ ACTION_HANDLERS = {}
 
 def action_handler(name):
     def decorator(func):
-        ACTION_HANDLERS[f"--{name}"] = func
+        @functools.wraps(func)
+        def traced_handler(*args, **kwargs):
+            with span(f"handler.{name}", target=kwargs.get("target")):
+                return func(*args, **kwargs)
+        ACTION_HANDLERS[f"--{name}"] = traced_handler
         return func
     return decorator
 
@@ -133,12 +140,11 @@ def wait_action(target, **kwargs):
 
 # --- Scenario Execution ---
 def execute_scenario(scenario_name):
-    scenarios = get_scenarios()
-    if scenario_name not in scenarios:
+    steps = get_scenario(scenario_name)  # Loads just this scenario's file
+    if steps is None:
         log_action(f"Scenario '{scenario_name}' not found.", is_error=True)
         return False
 
-    steps = scenarios[scenario_name]
     for i, step in enumerate(steps, 1):
         action_name = step.get('action')
         command_name = f"--{action_name}"
@@ -153,7 +159,8 @@ def execute_scenario(scenario_name):
 
         handler_kwargs = {k: v for k, v in step.items() if k not in {"action", "target"}}
         try:
-            success = handler(target=target, **handler_kwargs)
+            with span("step", index=i, action=action_name):
+                success = handler(target=target, **handler_kwargs)
         except TypeError as exc:
             log_action(
                 f"Handler '{action_name}' rejected provided parameters {handler_kwargs}: {exc}",
@@ -190,6 +197,11 @@ if __name__ == "__main__":
     command = sys.argv[1]
     argument = " ".join(sys.argv[2:]) if len(sys.argv) > 2 else ""
 
+    # Hand the span tree back to test_runner (if it asked for one) however we exit.
+    atexit.register(write_span_file)
+    # Record this step's log lines as events under the run/scenario/step test_runner passed in.
+    install_event_log()
+
     handler = ACTION_HANDLERS.get(command)
 
     if handler:
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextlib
+from logger import log_action
+
+# --- Constants ---
+# When set, the process dumps its recorded span tree to this file on exit.
+# test_runner uses it to collect handler timings from smart_cursor subprocesses.
+SPAN_FILE_ENV = "TACHTACH_SPAN_FILE"
+
+# --- Span Recording ---
+
+_local = threading.local()
+_roots = []
+_roots_lock = threading.Lock()
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Records a (possibly nested) timed span around a block of code.
+
+    Usage:
+        with span("capture", region=region):
+            ...
+
+    :param name: Short span name, e.g. "uia.lookup" or "match.template".
+    :param attributes: Extra JSON-serializable values stored with the span.
+    """
+    record = {
+        "name": name,
+        "start_time": round(time.time(), 6),
+        "duration_ms": None,
+        "attributes": {k: v for k, v in attributes.items() if v is not None},
+        "children": []
+    }
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        stack.pop()
+        if parent is not None:
+            parent["children"].append(record)
+        else:
+            with _roots_lock:
+                _roots.append(record)
+
+def traced(name):
+    """Decorator form of span() for functions."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def collect_spans():
+    """Returns all finished top-level spans and clears them."""
+    with _roots_lock:
+        roots = list(_roots)
+        _roots.clear()
+    return roots
+
+# --- Cross-Process Transport ---
+
+def write_span_file(path=None):
+    """Dumps the collected spans to `path` (or $TACHTACH_SPAN_FILE). No-op if neither is set."""
+    path = path or os.environ.get(SPAN_FILE_ENV)
+    if not path:
+        return
+    try:
+        with open(path, 'w') as f:
+            json.dump(collect_spans(), f)
+    except Exception as e:
+        log_action(f"Could not write span file {path}: {e}", is_error=True)
+
+def read_span_file(path):
+    """Loads spans written by a child process and removes the file."""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r') as f:
+            content = f.read()
+        return json.loads(content) if content else []
+    except Exception as e:
+        log_action(f"Could not read span file {path}: {e}", is_error=True)
+        return []
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import heapq
+import platform
+import threading
+import urllib.request
+from logger import log_action, add_log_listener, remove_log_listener
+from event_log import current_run_id
+
+# --- Constants ---
+TELEMETRY_DIR = os.path.join("reports", "telemetry")
+OTLP_ENDPOINT_ENV = "OTEL_EXPORTER_OTLP_ENDPOINT"  # e.g. http://localhost:4318
+TELEMETRY_TOGGLE_ENV = "TACHTACH_TELEMETRY"  # Set to "0" to disable export
+SERVICE_NAME = "tachtach-qa"
+SCOPE_NAME = "tachtach.test_runner"
+EXPORT_TIMEOUT = 5  # Seconds per OTLP/HTTP request
+# Step latency histogram bucket bounds, in milliseconds.
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+SPAN_KIND_INTERNAL = 1
+STATUS_OK = 1
+STATUS_ERROR = 2
+SEVERITY = {"INFO": 9, "ERROR": 17}
+AGGREGATION_DELTA = 1
+
+# --- OTLP/JSON Encoding Helpers ---
+
+def _new_trace_id():
+    return os.urandom(16).hex()
+
+def _new_span_id():
+    return os.urandom(8).hex()
+
+def _nanos(seconds):
+    return str(int(seconds * 1e9))
+
+def _attributes(values):
+    """Encodes a flat dict as OTLP KeyValue attributes (None values are dropped)."""
+    encoded = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            encoded.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            encoded.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            encoded.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            encoded.append({"key": key, "value": {"stringValue": str(value)}})
+    return encoded
+
+def _resource():
+    return {"attributes": _attributes({"service.name": SERVICE_NAME, "host.name": platform.node() or None})}
+
+def _scope():
+    return {"name": SCOPE_NAME}
+
+def _span(trace_id, span_id, parent_id, name, start, end, attributes, error=None):
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": SPAN_KIND_INTERNAL,
+        "startTimeUnixNano": _nanos(start),
+        "endTimeUnixNano": _nanos(max(start, end)),
+        "attributes": _attributes(attributes),
+        "status": {"code": STATUS_ERROR, "message": error} if error else {"code": STATUS_OK}
+    }
+    if parent_id:
+        span["parentSpanId"] = parent_id
+    return span
+
+# --- Export ---
+
+def telemetry_enabled():
+    return os.environ.get(TELEMETRY_TOGGLE_ENV, "1").lower() not in ("0", "false", "off")
+
+def export(signal, payload):
+    """
+    Sends one OTLP/JSON export request. With OTEL_EXPORTER_OTLP_ENDPOINT set,
+    it is POSTed to <endpoint>/v1/<signal>; otherwise (or if the collector is
+    unreachable) it is appended as one line to reports/telemetry/<signal>.jsonl,
+    which the collector's otlpjsonfile receiver can ingest later.
+    :param signal: "traces", "metrics" or "logs".
+    """
+    endpoint = os.environ.get(OTLP_ENDPOINT_ENV)
+    body = json.dumps(payload, separators=(",", ":"))
+    if endpoint:
+        request = urllib.request.Request(
+            f"{endpoint.rstrip('/')}/v1/{signal}",
+            data=body.encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=EXPORT_TIMEOUT):
+                return True
+        except Exception as e:
+            log_action(f"OTLP export of {signal} to {endpoint} failed ({e}); writing to file sink instead.", is_error=True)
+
+    try:
+        os.makedirs(TELEMETRY_DIR, exist_ok=True)
+        with open(os.path.join(TELEMETRY_DIR, f"{signal}.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(body + "\n")
+        return True
+    except Exception as e:
+        log_action(f"Could not write {signal} telemetry: {e}", is_error=True)
+        return False
+
+# --- Run Recording ---
+
+class RunTelemetry:
+    """
+    Collects one suite run and exports it as OTLP traces, metrics and logs.
+
+    Trace shape: suite -> scenario -> step -> handler spans (from the span tree
+    PerformanceTracker stores per step). Log lines written with log_action inside
+    the run become OTLP log records linked to the span they fell in. Several runs
+    can be active at once (command jobs), so a line belongs to the run whose
+    run_id is in the logging thread's event context, or without one, to the run
+    started on that thread.
+    """
+
+    def __init__(self, suite_name, attributes=None):
+        self.suite_name = suite_name
+        self.attributes = attributes or {}
+        self.trace_id = _new_trace_id()
+        self.suite_span_id = _new_span_id()
+        self.start = time.time()
+        self._logs = []
+        self._lock = threading.Lock()
+        self._run_id = current_run_id()
+        self._thread = threading.get_ident()
+        add_log_listener(self._on_log)
+
+    def _on_log(self, record):
+        run_id = current_run_id()
+        if run_id != self._run_id or (run_id is None and threading.get_ident() != self._thread):
+            return
+        with self._lock:
+            self._logs.append(record)
+
+    def finish(self, results):
+        """Stops collecting logs, builds the OTLP payloads and exports them."""
+        remove_log_listener(self._on_log)
+        end = time.time()
+        spans, windows = self._build_spans(results or [], end)
+        metrics = self._build_metrics(results or [], end)
+        logs = self._build_logs(windows)
+
+        export("traces", {"resourceSpans": [{"resource": _resource(), "scopeSpans": [{"scope": _scope(), "spans": spans}]}]})
+        export("metrics", {"resourceMetrics": [{"resource": _resource(), "scopeMetrics": [{"scope": _scope(), "metrics": metrics}]}]})
+        if logs:
+            export("logs", {"resourceLogs": [{"resource": _resource(), "scopeLogs": [{"scope": _scope(), "logRecords": logs}]}]})
+
+    def _build_spans(self, results, end):
+        """
+        :return: (list of OTLP spans, list of (start, end, span_id) windows used to link log records, by start)
+        """
+        failed = sum(1 for r in results if r.get("status") != "PASSED")
+        spans = [_span(self.trace_id, self.suite_span_id, None, "suite", self.start, end,
+                       dict(self.attributes, **{"tachtach.suite": self.suite_name, "tachtach.tests": len(results),
+                                                "tachtach.failed": failed}),
+                       error=f"{failed} test(s) failed" if failed else None)]
+        windows = []
+
+        for result in results:
+            steps = result.get("performance", {}).get("steps", [])
+            scenario_start = steps[0].get("start_time", self.start) if steps else self.start
+            scenario_end = max((s.get("start_time", scenario_start) + s["duration_ms"] / 1000 for s in steps), default=scenario_start)
+            scenario_id = _new_span_id()
+            status = result.get("status")
+            spans.append(_span(self.trace_id, scenario_id, self.suite_span_id, "scenario", scenario_start, scenario_end, {
+                "tachtach.scenario": result.get("name"),
+                "tachtach.status": status,
+                "tachtach.has_regression": result.get("performance", {}).get("has_regression", False)
+            }, error=result.get("error") if status != "PASSED" else None))
+            windows.append((scenario_start, scenario_end, scenario_id))
+
+            for step in steps:
+                step_start = step.get("start_time", scenario_start)
+                step_end = step_start + step["duration_ms"] / 1000
+                step_id = _new_span_id()
+                step_failed = result.get("failed_step") == step["step"]
+                spans.append(_span(self.trace_id, step_id, scenario_id, "step", step_start, step_end, {
+                    "tachtach.scenario": result.get("name"),
+                    "tachtach.step": step["step"],
+                    "tachtach.action": _step_action(step),
+                    "tachtach.baseline_ms": step.get("baseline_ms"),
+                    "tachtach.regression": step.get("regression", False)
+                }, error=result.get("step_description") if step_failed else None))
+                windows.append((step_start, step_end, step_id))
+                for child in step.get("spans", []):
+                    self._handler_spans(child, step_id, spans)
+
+        windows.sort(key=lambda w: w[0])
+        return spans, windows
+
+    def _handler_spans(self, record, parent_id, spans):
+        span_id = _new_span_id()
+        start = record.get("start_time", self.start)
+        spans.append(_span(self.trace_id, span_id, parent_id, record["name"], start,
+                           start + (record.get("duration_ms") or 0) / 1000,
+                           record.get("attributes", {}), error=record.get("error")))
+        for child in record.get("children", []):
+            self._handler_spans(child, span_id, spans)
+
+    def _build_metrics(self, results, end):
+        start_nanos, end_nanos = _nanos(self.start), _nanos(end)
+        by_action = {}
+        status_counts = {}
+        regressions = 0
+        for result in results:
+            status_counts[result.get("status")] = status_counts.get(result.get("status"), 0) + 1
+            performance = result.get("performance", {})
+            if performance.get("has_regression"):
+                regressions += 1
+            for step in performance.get("steps", []):
+                by_action.setdefault(_step_action(step), []).append(step["duration_ms"])
+
+        histogram_points = []
+        for action, durations in sorted(by_action.items()):
+            counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            for ms in durations:
+                counts[next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound), len(LATENCY_BUCKETS_MS))] += 1
+            histogram_points.append({
+                "attributes": _attributes({"tachtach.action": action}),
+                "startTimeUnixNano": start_nanos, "timeUnixNano": end_nanos,
+                "count": str(len(durations)), "sum": sum(durations),
+                "min": min(durations), "max": max(durations),
+                "bucketCounts": [str(c) for c in counts], "explicitBounds": LATENCY_BUCKETS_MS
+            })
+
+        def counter(name, description, points):
+            return {"name": name, "description": description, "unit": "1",
+                    "sum": {"aggregationTemporality": AGGREGATION_DELTA, "isMonotonic": True, "dataPoints": points}}
+
+        def point(value, attributes=None):
+            return {"attributes": _attributes(attributes or {}), "startTimeUnixNano": start_nanos,
+                    "timeUnixNano": end_nanos, "asInt": str(value)}
+
+        suite_attrs = {"tachtach.suite": self.suite_name}
+        return [
+            {"name": "tachtach.step.duration", "description": "Step wall time", "unit": "ms",
+             "histogram": {"aggregationTemporality": AGGREGATION_DELTA, "dataPoints": histogram_points}},
+            counter("tachtach.tests", "Test results by status",
+                    [point(count, dict(suite_attrs, **{"tachtach.status": status})) for status, count in sorted(status_counts.items())]),
+            counter("tachtach.performance.regressions", "Tests with a performance regression",
+                    [point(regressions, suite_attrs)])
+        ]
+
+    def _build_logs(self, windows):
+        """Links each log record to the innermost (shortest) window containing it, in one sweep over time."""
+        with self._lock:
+            records = sorted(self._logs, key=lambda r: r["time"])
+        logs = []
+        open_windows = []  # Heap of (length, position, end, span_id) of windows started so far
+        next_window = 0
+        for record in records:
+            while next_window < len(windows) and windows[next_window][0] <= record["time"]:
+                start, end, span_id = windows[next_window]
+                heapq.heappush(open_windows, (end - start, next_window, end, span_id))
+                next_window += 1
+            # Records come in time order, so a window that ended before this one stays closed.
+            while open_windows and open_windows[0][2] < record["time"]:
+                heapq.heappop(open_windows)
+            span_id = open_windows[0][3] if open_windows else self.suite_span_id
+            logs.append({
+                "timeUnixNano": _nanos(record["time"]),
+                "severityNumber": SEVERITY.get(record["level"], 9),
+                "severityText": record["level"],
+                "body": {"stringValue": record["message"]},
+                "traceId": self.trace_id,
+                "spanId": span_id
+            })
+        return logs
+
+def _step_action(step):
+    """Best-effort action name for a step, taken from its handler span."""
+    for record in step.get("spans", []):
+        if record["name"].startswith("handler."):
+            return record["name"][len("handler."):]
+    return "unknown"
+
+def start_run(suite_name, **attributes):
+    """Starts recording a suite run; returns None when telemetry is disabled."""
+    if not telemetry_enabled():
+        return None
+    return RunTelemetry(suite_name, {f"tachtach.{k}": v for k, v in attributes.items()})
+
+def finish_run(run, results):
+    """Exports a run started with start_run (no-op for None). Never raises."""
+    if run is None:
+        return
+    try:
+        run.finish(results)
+    except Exception as e:
+        log_action(f"Telemetry export failed: {e}", is_error=True)
@@ -0,0 +1,76 @@
+from logger import log_action
+from history_store import load_aggregates, window_stats, sketch_quantile
+
+# --- Constants ---
+PRIORITY_WINDOW = 50  # Most recent results considered per test
+FAILURE_HALF_LIFE = 10  # A result this many runs old weighs half as much as the newest one
+RECENT_FAILURE_RUNS = 3  # Failed in any of the last N runs -> "recently failing"
+DEFAULT_DURATION_MS = 10000  # Assumed runtime for tests without timing history
+ORDER_MODES = ("defined", "history")
+
+# Tiers, run in this order; within a tier tests are ranked by failure probability per second.
+TIER_RECENTLY_FAILING = 0
+TIER_FLAKY_OR_NEW = 1
+TIER_OTHER = 2
+TIER_NAMES = {TIER_RECENTLY_FAILING: "recently_failing", TIER_FLAKY_OR_NEW: "flaky_or_new", TIER_OTHER: "ranked"}
+
+_DECAY = 0.5 ** (1 / FAILURE_HALF_LIFE)
+
+def failure_probability(agg, window=PRIORITY_WINDOW):
+    """
+    Recency-weighted failure rate over the newest `window` results, with a
+    Laplace prior so tests with little history are neither 0 nor 1.
+    """
+    stats = window_stats(agg, window)
+    failures = weight = 0.0
+    for i in range(stats["results"]):
+        w = _DECAY ** i
+        weight += w
+        failures += w * (stats["fail_bits"] >> i & 1)
+    return (failures + 1) / (weight + 2)
+
+def _classify(agg, window):
+    if agg is None or not agg["results"]:
+        return TIER_FLAKY_OR_NEW
+    stats = window_stats(agg, window)
+    if stats["fail_bits"] & ((1 << RECENT_FAILURE_RUNS) - 1):
+        return TIER_RECENTLY_FAILING
+    if stats["passes"] and stats["failures"]:
+        return TIER_FLAKY_OR_NEW
+    return TIER_OTHER
+
+def prioritize(test_names, window=PRIORITY_WINDOW):
+    """
+    Orders tests so the likely failures come first: recently failing tests, then
+    flaky and new ones, then the rest, each group ranked by failure probability
+    per second of expected runtime (median from the duration sketch).
+    :return: List of dicts (name, tier, failure_probability, expected_ms, score) in run order.
+    """
+    test_names = list(test_names)
+    try:
+        aggregates = {agg["test_name"]: agg for agg in load_aggregates()}
+    except Exception as e:
+        log_action(f"Could not load test history, keeping the defined order: {e}", is_error=True)
+        return [{"name": name, "tier": TIER_OTHER, "failure_probability": None, "expected_ms": None, "score": None}
+                for name in test_names]
+
+    known = [sketch_quantile(agg["duration_sketch"], 0.5) for agg in aggregates.values()]
+    known = sorted(ms for ms in known if ms)
+    fallback_ms = known[len(known) // 2] if known else DEFAULT_DURATION_MS
+
+    ranked = []
+    for position, name in enumerate(test_names):
+        agg = aggregates.get(name)
+        probability = failure_probability(agg, window) if agg else 0.5
+        expected_ms = (sketch_quantile(agg["duration_sketch"], 0.5) if agg else None) or fallback_ms
+        score = probability / max(expected_ms / 1000, 0.001)
+        ranked.append({"name": name, "tier": _classify(agg, window), "failure_probability": round(probability, 4),
+                       "expected_ms": expected_ms, "score": round(score, 6), "_position": position})
+
+    # Ties keep the defined order.
+    ranked.sort(key=lambda entry: (entry["tier"], -entry["score"], entry["_position"]))
+    for entry in ranked:
+        del entry["_position"]
+    counts = {TIER_NAMES[tier]: sum(1 for entry in ranked if entry["tier"] == tier) for tier in TIER_NAMES}
+    log_action(f"Prioritized {len(ranked)} tests by history: {counts}.")
+    return ranked
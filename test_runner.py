@@ -1,27 +1,42 @@
 import os
 import json
 import csv
+import tempfile
+import time
 import subprocess
 import datetime
 from logger import log_action
 from diagnostics import run_diagnostics
-from performance_tracker import PerformanceTracker
+from performance_tracker import PerformanceTracker, flush_baselines
+from spans import SPAN_FILE_ENV, read_span_file
+from telemetry import start_run, finish_run
+from event_log import install_event_log, event_context, context_env, log_event, new_run_id, flush_events
+from scenario_repository import LazyScenarios, SCENARIOS_DIR, LEGACY_SCENARIO_FILE
+from execution_planner import build_plan, count_steps, execute_plan
+from test_prioritizer import prioritize, ORDER_MODES
+from test_sharding import (select_shard, parse_shard, validate_shard, validate_shard_mode, SHARD_ENV, SHARD_MODE_ENV,
+                           SHARD_PLAN_ENV, DEFAULT_WORKER_MODE)
+from job_queue import connect_queue
 
 # --- Constants ---
 REPORTS_DIR = "reports"
 SCREENSHOTS_DIR = os.path.join(REPORTS_DIR, "screenshots")
-SCENARIO_FILE = os.path.join("knowledge_base", "scenarios.json")
 PYTHON_CMD = "python" # or "python3"
+SMART_CURSOR_SCRIPT = "smart_cursor.py"
+SHARE_PREFIXES_ENV = "TACHTACH_SHARE_PREFIXES"  # Set to "0" to replay every scenario from its first step
+TEST_ORDER_ENV = "TACHTACH_TEST_ORDER"  # "defined" or "history"
+MAX_FAILURES_ENV = "TACHTACH_MAX_FAILURES"  # Fail-fast cutoff for scenario suites
+COORDINATOR_POLL_SECONDS = 2  # How often a distributed run checks its batch
+BATCH_TIMEOUT_SECONDS = 6 * 3600  # A distributed run gives up on unfinished jobs after this long
 
 # --- Helper Functions ---
 
 def get_scenarios():
-    """Loads all test scenarios from the JSON file."""
-    if not os.path.exists(SCENARIO_FILE):
-        log_action(f"Scenario file not found at {SCENARIO_FILE}", is_error=True)
+    """Returns a lazy {name: steps} view of all test scenarios (each loads when first used)."""
+    if not os.path.isdir(SCENARIOS_DIR) and not os.path.exists(LEGACY_SCENARIO_FILE):
+        log_action(f"Scenario directory not found at {SCENARIOS_DIR}", is_error=True)
         return None
-    with open(SCENARIO_FILE, 'r') as f:
-        return json.load(f)
+    return LazyScenarios()
 
 def _substitute_placeholders(steps, data_row):
     """Substitutes placeholders like {column_name} in steps with data from a row."""
@@ -39,43 +54,79 @@ def _substitute_placeholders(steps, data_row):
 
 def run_single_test(scenario_name, steps):
     """Runs a single, fully-defined test case and returns the result dictionary."""
+    with event_context(scenario=scenario_name):
+        log_event("test.started", steps=len(steps))
+        result = _execute_test(scenario_name, steps)
+        log_event("test.finished", level="INFO" if result["status"] == "PASSED" else "ERROR", status=result["status"],
+                  duration_ms=result["performance"]["total_duration_ms"], failed_step=result.get("failed_step"))
+        return result
+
+def _execute_test(scenario_name, steps):
     log_action(f"--- Running Test: {scenario_name} ---")
     perf_tracker = PerformanceTracker(scenario_name)
 
     for i, step in enumerate(steps):
-        action = step.get('action')
-        target = step.get('target')
-        timeout = step.get('timeout')
-
-        log_action(f"  Executing Step {i+1}/{len(steps)}: {action} -> '{target}'")
-
-        command = [PYTHON_CMD, "smart_cursor.py", f"--{action}", target]
-        if timeout:
-            command.append(str(timeout))
-
-        perf_tracker.start_step(i)
-        result = subprocess.run(command, capture_output=True, text=True, check=False)
-        perf_tracker.stop_step(i)
-
-        if result.returncode != 0:
-            log_action(f"  >> STEP FAILED! Return code: {result.returncode}", is_error=True)
-            diagnostics_data = run_diagnostics(scenario_name, i)
-            performance_data = perf_tracker.finalize()
-            step_description = f"{action} '{target}'" + (f" (timeout: {timeout}s)" if timeout else "")
-            main_screenshot = diagnostics_data["screenshots"][0] if diagnostics_data.get("screenshots") else None
-
-            return {
-                "name": scenario_name,
-                "status": "FAILED",
-                "failed_step": i + 1,
-                "step_description": step_description,
-                "error": result.stdout.strip() or result.stderr.strip(),
-                "screenshot": main_screenshot,
-                "diagnostics": diagnostics_data,
-                "performance": performance_data
-            }
-
-    performance_data = perf_tracker.finalize()
+        with event_context(step=i + 1, action=step.get('action')):
+            log_action(f"  Executing Step {i+1}/{len(steps)}: {step.get('action')} -> '{step.get('target')}'")
+            info = _run_step_process(step)
+            perf_tracker.record_step(i, info["duration_ms"], info["started_at"], info["spans"])
+
+            if not info["ok"]:
+                return _failed_result(scenario_name, i, step, info, run_diagnostics(scenario_name, i),
+                                      perf_tracker.finalize(record_baseline=False))
+
+    return _passed_result(scenario_name, steps, perf_tracker.finalize())
+
+def _run_step_process(step):
+    """
+    Runs one step in a smart_cursor subprocess.
+    :return: A dict (ok, output, returncode, started_at, duration_ms, spans).
+    """
+    action = step.get('action')
+    target = step.get('target')
+    timeout = step.get('timeout')
+
+    command = [PYTHON_CMD, SMART_CURSOR_SCRIPT, f"--{action}", target]
+    if timeout:
+        command.append(str(timeout))
+
+    fd, span_file = tempfile.mkstemp(prefix="tachtach_spans_", suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, **{SPAN_FILE_ENV: span_file}, **context_env())
+
+    started_at, start = time.time(), time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True, check=False, env=env)
+    duration_ms = (time.perf_counter() - start) * 1000
+    log_event("step.finished", level="INFO" if result.returncode == 0 else "ERROR",
+              duration_ms=round(duration_ms, 2), returncode=result.returncode)
+    if result.returncode != 0:
+        log_action(f"  >> STEP FAILED! Return code: {result.returncode}", is_error=True)
+
+    return {
+        "ok": result.returncode == 0,
+        "output": result.stdout.strip() or result.stderr.strip(),
+        "returncode": result.returncode,
+        "started_at": started_at,
+        "duration_ms": duration_ms,
+        "spans": read_span_file(span_file)
+    }
+
+def _failed_result(scenario_name, index, step, info, diagnostics_data, performance_data):
+    timeout = step.get('timeout')
+    step_description = f"{step.get('action')} '{step.get('target')}'" + (f" (timeout: {timeout}s)" if timeout else "")
+    main_screenshot = diagnostics_data["screenshots"][0] if diagnostics_data.get("screenshots") else None
+    return {
+        "name": scenario_name,
+        "status": "FAILED",
+        "failed_step": index + 1,
+        "step_description": step_description,
+        "error": info["output"],
+        "screenshot": main_screenshot,
+        "diagnostics": diagnostics_data,
+        "performance": performance_data
+    }
+
+def _passed_result(scenario_name, steps, performance_data):
     return {
         "name": scenario_name,
         "status": "PASSED",
@@ -83,25 +134,232 @@ def run_single_test(scenario_name, steps):
         "performance": performance_data
     }
 
+# --- Prefix-Sharing Execution ---
+
+def run_planned_tests(tests_to_run, max_failures=None, keep_going=None):
+    """
+    Runs scenarios through the prefix-sharing planner (see execution_planner.py):
+    common leading steps run once, and each branch starts from a restored checkpoint.
+    :param tests_to_run: {name: steps}
+    :param max_failures: Stop after this many failed tests; unrun tests are left out of the results.
+    :param keep_going: Optional keep_going(finished_tests) -> bool, checked between steps; False stops the run.
+    :return: Result dicts in the same shape and order as run_single_test would give.
+    """
+    plan = build_plan(tests_to_run)
+    total_steps = sum(len(steps) for steps in tests_to_run.values())
+    log_action(f"Execution plan: {count_steps(plan)} unique steps for {len(tests_to_run)} tests ({total_steps} steps in total).")
+
+    def run_step(step, index, names):
+        context = {"action": step.get('action')}
+        if names:
+            context.update(scenario=names[0], step=index + 1)
+            if len(names) > 1:
+                context["shared_by"] = len(names)
+        with event_context(**context):
+            label = f"Step {index + 1}" if index is not None else "Restore step"
+            shared = f" (shared by {len(names)} tests)" if len(names) > 1 else ""
+            log_action(f"  {label}{shared}: {step.get('action')} -> '{step.get('target')}'")
+            info = _run_step_process(step)
+            if not info["ok"] and names:
+                info["diagnostics"] = run_diagnostics(names[0], index)
+            return info
+
+    should_stop = (lambda outcomes: not keep_going(len(outcomes))) if keep_going else None
+    outcomes, stats = execute_plan(plan, run_step, max_failures, should_stop)
+    log_action(f"Executed {stats['executed']} of {total_steps} scenario steps "
+               f"({stats['restores']} checkpoint restores, {stats['replays']} replays).")
+
+    results = []
+    for name, steps in tests_to_run.items():
+        outcome = outcomes.get(name)
+        if outcome is None:
+            continue  # Not run: the fail-fast cutoff was reached or the run was stopped
+        with event_context(scenario=name):
+            perf_tracker = PerformanceTracker(name)
+            for i, info in enumerate(outcome["steps"]):
+                perf_tracker.record_step(i, info["duration_ms"], info["started_at"], info["spans"])
+            if outcome["failed"]:
+                index = len(outcome["steps"]) - 1
+                info = outcome["steps"][-1]
+                result = _failed_result(name, index, steps[index], info, info.get("diagnostics", {}),
+                                        perf_tracker.finalize(record_baseline=False))
+            else:
+                result = _passed_result(name, steps, perf_tracker.finalize())
+            log_event("test.finished", level="INFO" if result["status"] == "PASSED" else "ERROR",
+                      status=result["status"], duration_ms=result["performance"]["total_duration_ms"],
+                      failed_step=result.get("failed_step"))
+        results.append(result)
+    return results
+
+# --- Distributed Execution ---
+
+def run_on_queue(queue, tests_to_run, max_failures=None, source="runner", keep_going=None):
+    """
+    Runs scenarios on the workers of a queue.
+    :param tests_to_run: {name: steps}, in the order jobs should be leased.
+    :param max_failures: Fail fast: cancel the batch's remaining jobs after this many failed tests.
+    :param keep_going: Optional keep_going(finished_tests) -> bool, checked at each poll; False cancels the batch.
+    :return: Result dicts in run order; cancelled jobs are left out.
+    """
+    batch_id = queue.submit([{"scenario": name, "steps": steps} for name, steps in tests_to_run.items()], source)
+    log_action(f"Submitted {len(tests_to_run)} tests to the job queue as batch {batch_id}.")
+    log_event("batch.submitted", batch_id=batch_id, tests=len(tests_to_run))
+
+    reported, failures = set(), 0
+    deadline = time.monotonic() + BATCH_TIMEOUT_SECONDS
+    while True:
+        status = queue.batch(batch_id)
+        for job in status["jobs"]:
+            if job["status"] != "done" or job["job_id"] in reported:
+                continue
+            reported.add(job["job_id"])
+            result = job["result"]
+            failures += result.get("status") != "PASSED"
+            log_action(f"  [{len(reported)}/{status['total']}] '{job['scenario']}' {result.get('status')} "
+                       f"on {job['worker'] or 'no worker'}.")
+        if not status["counts"].get("queued") and not status["counts"].get("leased"):
+            break
+        if keep_going is not None and not keep_going(len(reported)):
+            log_action(f"Run stopped; cancelling {queue.cancel(batch_id)} remaining jobs.", is_error=True)
+            continue
+        if max_failures and failures >= max_failures:
+            log_action(f"Fail-fast: {failures} failures; cancelling {queue.cancel(batch_id)} remaining jobs.",
+                       is_error=True)
+            continue  # One more poll picks up results that raced the cancel
+        if time.monotonic() > deadline:
+            log_action(f"Batch {batch_id} timed out; cancelling {queue.cancel(batch_id)} unfinished jobs.",
+                       is_error=True)
+            continue
+        time.sleep(COORDINATOR_POLL_SECONDS)
+
+    results = [job["result"] for job in status["jobs"] if job["status"] == "done"]
+    log_event("batch.finished", batch_id=batch_id, finished=len(results), cancelled=status["counts"].get("cancelled", 0))
+    return results
+
 # --- Test Suite Execution Modes ---
 
-def run_scenario_based_suite(test_names=None):
-    """Runs a standard test suite based on scenario names."""
+def run_scenario_based_suite(test_names=None, share_prefixes=None, order=None, max_failures=None, shard=None,
+                             shard_mode=None, queue=None, progress=None):
+    """
+    Runs a standard test suite based on scenario names.
+    :param share_prefixes: Run common leading steps once (defaults to $TACHTACH_SHARE_PREFIXES, on).
+    :param order: "defined" (repository order) or "history" (likely failures first, see
+                  test_prioritizer.py); defaults to $TACHTACH_TEST_ORDER, else "defined".
+    :param max_failures: Fail fast: stop after this many failed tests (defaults to $TACHTACH_MAX_FAILURES, off).
+    :param shard: Run only this worker's share of the tests, as (index, count) or "index/count" (1-based;
+                  defaults to $TACHTACH_SHARD). Shards are balanced by expected duration (see test_sharding.py).
+    :param shard_mode: "balanced" or "stable" (defaults to $TACHTACH_SHARD_MODE, else "stable"). Ignored
+                       when $TACHTACH_SHARD_PLAN names a plan file shared by all workers.
+    :raises ValueError: For a malformed shard or unknown shard mode, before anything runs.
+    :param queue: Run on the workers of this job queue (a url or "local"; defaults to $TACHTACH_QUEUE_URL,
+                  else in this process). See distributed_runner.py.
+    :param progress: Optional progress(done, total), called as tests finish; returning False
+                     cancels the run (checked between steps, so the current step completes).
+    """
+    install_event_log()
+    if share_prefixes is None:
+        share_prefixes = os.environ.get(SHARE_PREFIXES_ENV, "1").lower() not in ("0", "false", "off")
+    order = order or os.environ.get(TEST_ORDER_ENV, "defined")
+    if order not in ORDER_MODES:
+        log_action(f"Unknown test order '{order}', using the defined order.", is_error=True)
+        order = "defined"
+    if max_failures is None and os.environ.get(MAX_FAILURES_ENV):
+        try:
+            max_failures = int(os.environ[MAX_FAILURES_ENV])
+        except ValueError:
+            log_action(f"Ignoring invalid {MAX_FAILURES_ENV}={os.environ[MAX_FAILURES_ENV]!r}; "
+                       f"expected a number of failures.", is_error=True)
+    shard = tuple(shard) if isinstance(shard, (tuple, list)) else parse_shard(shard or os.environ.get(SHARD_ENV))
+    if shard:
+        validate_shard(shard)
+    shard_mode = shard_mode or os.environ.get(SHARD_MODE_ENV, DEFAULT_WORKER_MODE)
+    validate_shard_mode(shard_mode)
+    with event_context(run_id=new_run_id(), suite="scenario_suite"):
+        try:
+            return _run_scenarios(test_names, share_prefixes, order, max_failures or None, shard, shard_mode,
+                                  connect_queue(queue), progress)
+        finally:
+            flush_events()
+
+def _run_scenarios(test_names, share_prefixes, order, max_failures, shard, shard_mode, queue, progress):
     log_action("Standard test suite run initiated.")
+    telemetry_run = start_run("scenario_suite")
+    results = None
+    try:
+        results = _run_scenario_tests(test_names, share_prefixes, order, max_failures, shard, shard_mode, queue,
+                                      progress)
+        return results
+    finally:
+        finish_run(telemetry_run, results)  # Also on errors: it releases the run's log listener
+
+def _run_scenario_tests(test_names, share_prefixes, order, max_failures, shard, shard_mode, queue, progress):
     scenarios = get_scenarios()
-    if not scenarios: return []
+    if not scenarios:
+        return []
 
-    tests_to_run = scenarios
+    names = list(scenarios)
     if test_names and "all" not in test_names:
-        tests_to_run = {name: steps for name, steps in scenarios.items() if name in test_names}
+        names = [name for name in names if name in test_names]
+    if shard:
+        names = select_shard(names, shard[0], shard[1], shard_mode, os.environ.get(SHARD_PLAN_ENV))
+    if order == "history":
+        names = [entry["name"] for entry in prioritize(names)]
+    tests_to_run = {name: scenarios[name] for name in names}
+
+    cancelled = []
+    def keep_going(done):
+        if not cancelled and progress is not None and progress(done, len(tests_to_run)) is False:
+            cancelled.append(done)
+        return not cancelled
 
-    results = [run_single_test(name, steps) for name, steps in tests_to_run.items()]
+    if queue is not None:
+        results = run_on_queue(queue, tests_to_run, max_failures, "scenario_suite", keep_going)
+    elif share_prefixes:
+        results = run_planned_tests(tests_to_run, max_failures, keep_going)
+    else:
+        results = []
+        for name, steps in tests_to_run.items():
+            if not keep_going(len(results)):
+                break
+            results.append(run_single_test(name, steps))
+            if max_failures and sum(1 for r in results if r["status"] != "PASSED") >= max_failures:
+                break
+    keep_going(len(results))
+    if cancelled and len(results) < len(tests_to_run):
+        log_action(f"Run cancelled; {len(tests_to_run) - len(results)} of {len(tests_to_run)} tests were not run.",
+                   is_error=True)
+        log_event("suite.cancelled", level="ERROR", skipped=len(tests_to_run) - len(results))
+    elif len(results) < len(tests_to_run) and max_failures:
+        log_action(f"Fail-fast: stopped after {max_failures} failures; {len(tests_to_run) - len(results)} "
+                   f"of {len(tests_to_run)} tests were not run.", is_error=True)
+        log_event("suite.fail_fast", level="ERROR", max_failures=max_failures,
+                  skipped=len(tests_to_run) - len(results))
+    flush_baselines()
     return results
 
-def run_data_driven_suite(scenario_name, data_file_path):
-    """Runs a single scenario multiple times with data from a CSV file."""
+def run_data_driven_suite(scenario_name, data_file_path, progress=None):
+    """
+    Runs a single scenario multiple times with data from a CSV file.
+    :param progress: Optional progress(done, total) per row; returning False stops before the next row.
+    """
+    install_event_log()
+    with event_context(run_id=new_run_id(), suite="data_driven_suite"):
+        try:
+            return _run_data_driven(scenario_name, data_file_path, progress)
+        finally:
+            flush_events()
+
+def _run_data_driven(scenario_name, data_file_path, progress):
     log_action(f"Data-driven test for '{scenario_name}' with '{data_file_path}' initiated.")
+    telemetry_run = start_run("data_driven_suite", scenario=scenario_name, data_file=data_file_path)
+    results = None
+    try:
+        results = _run_data_driven_iterations(scenario_name, data_file_path, progress)
+        return results
+    finally:
+        finish_run(telemetry_run, results)
 
+def _run_data_driven_iterations(scenario_name, data_file_path, progress):
     scenarios = get_scenarios()
     if scenario_name not in scenarios:
         return [{"name": scenario_name, "status": "ERROR", "error": "Base scenario not found."}]
@@ -113,14 +371,21 @@ def run_data_driven_suite(scenario_name, data_file_path):
     results = []
     try:
         with open(data_file_path, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader):
-                iteration_name = f"{scenario_name}_[row_{i+1}]"
-                iteration_steps = _substitute_placeholders(base_steps, row)
-                result = run_single_test(iteration_name, iteration_steps)
-                results.append(result)
+            rows = list(csv.DictReader(f))
+        for i, row in enumerate(rows):
+            if progress is not None and progress(i, len(rows)) is False:
+                log_action(f"Data-driven run cancelled after {i} of {len(rows)} rows.", is_error=True)
+                break
+            iteration_name = f"{scenario_name}_[row_{i+1}]"
+            iteration_steps = _substitute_placeholders(base_steps, row)
+            result = run_single_test(iteration_name, iteration_steps)
+            results.append(result)
+        if progress is not None and len(results) == len(rows):
+            progress(len(rows), len(rows))
     except Exception as e:
         return [{"name": scenario_name, "status": "ERROR", "error": f"Failed to process CSV: {e}"}]
+    finally:
+        flush_baselines()
 
     return results
 
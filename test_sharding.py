@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import math
+import heapq
+import zlib
+import argparse
+import statistics
+from logger import log_action
+from performance_tracker import get_baseline_store
+from history_store import load_aggregates, sketch_quantile
+from scenario_repository import load_index
+
+# --- Constants ---
+SHARD_ENV = "TACHTACH_SHARD"  # "<index>/<count>", 1-based, e.g. "2/4"
+SHARD_MODE_ENV = "TACHTACH_SHARD_MODE"  # "balanced" or "stable"
+SHARD_PLAN_ENV = "TACHTACH_SHARD_PLAN"  # Plan file written by `test_sharding.py --output`, shared by all workers
+SHARD_MODES = ("balanced", "stable")
+DEFAULT_WORKER_MODE = "stable"  # Each worker plans on its own data; only stable plans agree across workers
+DEFAULT_STEP_MS = 2000  # Per-step estimate when no scenario has any timing history
+STABLE_BUCKET_RATIO = 1.5  # Stable mode rounds durations to buckets this far apart
+
+# Shards are packed longest-processing-time first: tests sorted by expected
+# duration (longest first) each go to the currently least-loaded shard, which
+# keeps the slowest shard within 4/3 of the optimum. Expected durations come
+# from the PerformanceTracker baselines (sum of step medians), then from the
+# history aggregates, else the median per-step time times the step count.
+# "stable" mode trades some balance for reproducibility: durations are rounded
+# to coarse log buckets and each test goes to the first shard in a hash-derived
+# preference order that stays under the average load plus one test (bounded-load
+# rendezvous hashing). Timing noise and added/removed tests then move only a few
+# tests between shards instead of reshuffling the whole plan.
+#
+# Every worker must arrive at the same plan, or tests run twice or not at all.
+# A worker that plans on its own (from its local baselines and history) therefore
+# defaults to "stable"; LPT is sensitive enough that a few percent of timing
+# difference between machines reshuffles it. To use "balanced", plan once with
+#   python test_sharding.py --shards 4 --output shard_plan.json
+# and give every worker the file ($TACHTACH_SHARD_PLAN).
+
+# --- Durations ---
+
+def expected_durations(names):
+    """
+    Expected runtime per test in ms.
+    :return: A tuple ({name: ms}, {name: source}) with source "baseline", "history" or "estimate".
+    """
+    durations, sources = {}, {}
+    try:
+        store = get_baseline_store()
+        for name in names:
+            baseline = store.get(name)
+            steps = (baseline or {}).get("steps", [])
+            if steps and all(step.get("samples") for step in steps):
+                durations[name] = sum(statistics.median(step["samples"]) for step in steps)
+                sources[name] = "baseline"
+    except Exception as e:
+        log_action(f"Could not read performance baselines for sharding: {e}", is_error=True)
+
+    missing = [name for name in names if name not in durations]
+    if missing:
+        try:
+            aggregates = {agg["test_name"]: agg for agg in load_aggregates()}
+        except Exception as e:
+            log_action(f"Could not read test history for sharding: {e}", is_error=True)
+            aggregates = {}
+        for name in missing:
+            median = sketch_quantile(aggregates[name]["duration_sketch"], 0.5) if name in aggregates else None
+            if median:
+                durations[name] = median
+                sources[name] = "history"
+
+    missing = [name for name in names if name not in durations]
+    if missing:
+        index = load_index()
+        per_step = [durations[name] / index[name]["steps"] for name in durations
+                    if name in index and index[name]["steps"]]
+        step_ms = statistics.median(per_step) if per_step else DEFAULT_STEP_MS
+        for name in missing:
+            durations[name] = step_ms * max(index.get(name, {}).get("steps", 1), 1)
+            sources[name] = "estimate"
+    return durations, sources
+
+def _stable_duration(ms):
+    return STABLE_BUCKET_RATIO ** round(math.log(max(ms, 1), STABLE_BUCKET_RATIO))
+
+# --- Planning ---
+
+def plan_shards(names, count, mode="balanced", durations=None):
+    """
+    Splits tests into `count` shards ("balanced": LPT bin packing; "stable": see above).
+    :param durations: Optional {name: ms}; looked up with expected_durations() if omitted.
+    :return: A list of `count` dicts (tests, expected_ms), each shard's tests in their original order.
+    """
+    validate_shard_mode(mode)
+    names = list(names)
+    if durations is None:
+        durations = expected_durations(names)[0]
+    if mode == "stable":
+        assignment = _stable_assignment(names, count, {name: _stable_duration(durations[name]) for name in names})
+    else:
+        assignment = _lpt_assignment(names, count, durations)
+
+    shards = [{"tests": [], "expected_ms": 0.0} for _ in range(count)]
+    for name in names:
+        shard = shards[assignment[name]]
+        shard["tests"].append(name)
+        shard["expected_ms"] += durations[name]
+    for shard in shards:
+        shard["expected_ms"] = round(shard["expected_ms"], 1)
+    return shards
+
+def _lpt_assignment(names, count, durations):
+    loads = [(0.0, shard) for shard in range(count)]  # Heap of (planned load, shard); ties go to the lowest shard
+    assignment = {}
+    positions = {name: position for position, name in enumerate(names)}
+    for name in sorted(names, key=lambda n: (-durations[n], positions[n])):
+        load, shard = heapq.heappop(loads)
+        assignment[name] = shard
+        heapq.heappush(loads, (load + durations[name], shard))
+    return assignment
+
+def _stable_assignment(names, count, weights):
+    """
+    Bounded-load rendezvous hashing: each test prefers shards in an order derived
+    from its name and takes the first one with room under the capacity limit.
+    """
+    capacity = sum(weights.values()) / count + max(weights.values(), default=0)
+    loads = [0.0] * count
+    assignment = {}
+    # Longest first, so the big tests get their preferred shard and small ones fill the gaps.
+    for name in sorted(names, key=lambda n: (-weights[n], zlib.crc32(n.encode("utf-8")), n)):
+        preference = sorted(range(count), key=lambda shard: zlib.crc32(f"{shard}:{name}".encode("utf-8")))
+        shard = next((shard for shard in preference if loads[shard] + weights[name] <= capacity),
+                     min(range(count), key=loads.__getitem__))
+        assignment[name] = shard
+        loads[shard] += weights[name]
+    return assignment
+
+def select_shard(names, index, count, mode=DEFAULT_WORKER_MODE, plan_path=None):
+    """
+    The tests one worker runs.
+    :param index: 1-based shard number (1..count).
+    :param plan_path: A plan file shared by all workers; tests it doesn't list are spread by name hash.
+    """
+    validate_shard((index, count))
+    if plan_path:
+        return _select_from_plan(names, index, count, plan_path)
+    if mode == "balanced":
+        log_action("Shard mode 'balanced' without a shared plan: workers with different timing data will "
+                   "disagree on the split (tests run twice or not at all).", is_error=True)
+    shards = plan_shards(names, count, mode)
+    makespan = max(shard["expected_ms"] for shard in shards)
+    log_action(f"Shard {index}/{count} ({mode}): {len(shards[index - 1]['tests'])} of {len(names)} tests, "
+               f"~{shards[index - 1]['expected_ms'] / 1000:.0f}s (slowest shard ~{makespan / 1000:.0f}s).")
+    return shards[index - 1]["tests"]
+
+def _select_from_plan(names, index, count, plan_path):
+    with open(plan_path, 'r') as f:
+        shards = json.load(f)["shards"]
+    if len(shards) != count:
+        raise ValueError(f"Shard plan {plan_path} has {len(shards)} shards, not {count}")
+    planned = {name: shard for shard, entry in enumerate(shards) for name in entry["tests"]}
+    selected = [name for name in names
+                if planned.get(name, zlib.crc32(name.encode("utf-8")) % count) == index - 1]
+    unplanned = sum(1 for name in names if name not in planned)
+    log_action(f"Shard {index}/{count} (plan {plan_path}): {len(selected)} of {len(names)} tests"
+               + (f"; {unplanned} tests not in the plan were spread by name." if unplanned else "."))
+    return selected
+
+def validate_shard(shard):
+    """Raises ValueError unless shard is (index, count) with 1 <= index <= count."""
+    index, count = shard
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard {index}/{count} is out of range (expected 1..count)")
+
+def validate_shard_mode(mode):
+    if mode not in SHARD_MODES:
+        raise ValueError(f"Unknown shard mode '{mode}' (expected one of {SHARD_MODES})")
+
+def parse_shard(value):
+    """Parses "<index>/<count>" (e.g. "2/4") into a validated (index, count); None for empty values."""
+    if not value:
+        return None
+    index, separator, count = str(value).partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        shard = None
+    if not separator or shard is None:
+        raise ValueError(f"Invalid shard '{value}' (expected '<index>/<count>', e.g. '2/4')")
+    validate_shard(shard)
+    return shard
+
+# --- Main function for standalone execution ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan duration-balanced test shards.")
+    parser.add_argument("--shards", type=int, required=True, help="Number of workers/machines.")
+    parser.add_argument("--index", type=int, help="Print only this shard's tests (1-based).")
+    parser.add_argument("--mode", choices=SHARD_MODES, default="balanced")
+    parser.add_argument("--output", help="Write the plan to this file, for workers to share via $TACHTACH_SHARD_PLAN.")
+    args = parser.parse_args(argv)
+
+    names = list(load_index())
+    if args.index:
+        print("\n".join(select_shard(names, args.index, args.shards, args.mode, os.environ.get(SHARD_PLAN_ENV))))
+        return
+    durations, sources = expected_durations(names)
+    shards = plan_shards(names, args.shards, args.mode, durations)
+    plan = json.dumps({
+        "mode": args.mode,
+        "makespan_ms": max((shard["expected_ms"] for shard in shards), default=0),
+        "total_ms": round(sum(durations.values()), 1),
+        "duration_sources": {source: list(sources.values()).count(source) for source in set(sources.values())},
+        "shards": shards
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(plan)
+        log_action(f"Wrote a {args.shards}-shard plan for {len(names)} tests to {args.output}.")
+    else:
+        print(plan)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        log_action(f"Shard planning failed: {e}", is_error=True)
+        sys.exit(1)
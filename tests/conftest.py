@@ -0,0 +1,28 @@
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_BACKENDS_DIR = os.path.join(REPO_ROOT, "benchmarks", "fake_backends")
+
+# Set before any framework module is imported: no console echo, no exporters,
+# and the desktop libraries replaced by the benchmark fakes.
+os.environ.setdefault("TACHTACH_LOG_CONSOLE", "0")
+os.environ.setdefault("TACHTACH_TELEMETRY", "0")
+sys.path[:0] = [FAKE_BACKENDS_DIR, REPO_ROOT]
+
+@pytest.fixture(autouse=True, scope="session")
+def sandbox():
+    """Runs the suite in a throwaway directory, so history.log, reports and the knowledge base stay untouched."""
+    original_cwd = os.getcwd()
+    path = tempfile.mkdtemp(prefix="tachtach_tests_")
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        from logger import flush_logs
+        flush_logs()
+        os.chdir(original_cwd)
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,49 @@
+import datetime
+import pytest
+from cron import CronExpression
+
+MONDAY = datetime.datetime(2026, 10, 19, 12, 0, 30)  # 2026-10-19 is a Monday
+
+def _next(expression, moment=MONDAY):
+    return CronExpression(expression).next_after(moment)
+
+def test_next_after_is_strictly_later():
+    assert _next("* * * * *") == datetime.datetime(2026, 10, 19, 12, 1)
+    assert _next("0 12 * * *", datetime.datetime(2026, 10, 19, 12, 0)) == datetime.datetime(2026, 10, 20, 12, 0)
+
+def test_steps_and_ranges():
+    assert _next("*/15 * * * *") == datetime.datetime(2026, 10, 19, 12, 15)
+    assert _next("10-50/20 * * * *") == datetime.datetime(2026, 10, 19, 12, 10)
+    assert _next("0 */5 * * *") == datetime.datetime(2026, 10, 19, 15, 0)
+    assert _next("5/20 * * * *") == datetime.datetime(2026, 10, 19, 12, 5)
+
+def test_restricted_day_fields_fire_on_either():
+    # The 25th, or any Wednesday: Wednesday 2026-10-21 comes first.
+    assert _next("0 0 25 * 3") == datetime.datetime(2026, 10, 21, 0, 0)
+    # The 20th comes before the next Sunday.
+    assert _next("0 0 20 * 0") == datetime.datetime(2026, 10, 20, 0, 0)
+
+def test_unrestricted_day_field_requires_the_other():
+    assert _next("0 0 * * 3") == datetime.datetime(2026, 10, 21, 0, 0)
+    assert _next("0 0 25 * *") == datetime.datetime(2026, 10, 25, 0, 0)
+
+def test_seven_is_sunday():
+    sunday = datetime.datetime(2026, 10, 25, 0, 0)
+    assert _next("0 0 * * 7") == sunday
+    assert _next("0 0 * * 0") == sunday
+    assert _next("0 0 * * 5-7") == datetime.datetime(2026, 10, 23, 0, 0)
+
+def test_aliases_and_month_rollover():
+    assert _next("@monthly") == datetime.datetime(2026, 11, 1, 0, 0)
+    assert _next("0 0 1 1 *") == datetime.datetime(2027, 1, 1, 0, 0)
+
+def test_leap_day():
+    assert _next("0 0 29 2 *") == datetime.datetime(2028, 2, 29, 0, 0)
+
+def test_never_firing_expression_returns_none():
+    assert _next("30 2 31 2 *") is None
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* * 0 * *", "*/0 * * * *", "5-1 * * * *"])
+def test_invalid_expressions_raise(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression)
@@ -0,0 +1,29 @@
+import math
+import random
+from drift_detector import detect_change_points, cusum_threshold
+
+def _series(seed, count, sigma, shift_at=None, shift=1.0):
+    rng = random.Random(seed)
+    return [(i, 100 * math.exp(rng.gauss(0, sigma)) * (shift if shift_at is not None and i >= shift_at else 1))
+            for i in range(count)]
+
+def test_threshold_matches_known_arl():
+    # h = 5 with k = 0.5 is the textbook two-sided CUSUM with an ARL of ~465.
+    assert abs(cusum_threshold(465, 0.5) - 5.0) < 0.05
+
+def test_stationary_noise_has_no_findings():
+    for seed in range(20):
+        for sigma in (0.02, 0.05, 0.1):
+            assert detect_change_points(_series(seed, 300, sigma)) == [], (seed, sigma)
+
+def test_quiet_step_ignores_creep_below_minimum_shift():
+    samples = _series(1, 300, 0.001, shift_at=150, shift=1.015)
+    assert detect_change_points(samples) == []
+
+def test_level_shift_is_detected():
+    changes = detect_change_points(_series(3, 400, 0.05, shift_at=200, shift=1.2))
+    assert len(changes) == 1
+    change = changes[0]
+    assert change["direction"] == "slower"
+    assert 195 <= change["change_index"] <= 205
+    assert 15 <= change["shift_percent"] <= 25
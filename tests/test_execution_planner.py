@@ -0,0 +1,101 @@
+from execution_planner import build_plan, count_steps, execute_plan
+
+def _step(target, restore=None):
+    step = {"action": "click-uia", "target": target}
+    if restore:
+        step["restore"] = [_step(name) for name in restore]
+    return step
+
+class Recorder:
+    """run_step stand-in: records every call and fails the listed (target, attempt) pairs."""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def __call__(self, step, index, names):
+        self.calls.append((step["target"], tuple(names)))
+        attempt = sum(1 for target, _ in self.calls if target == step["target"])
+        return {"target": step["target"], "ok": (step["target"], attempt) not in self.failing}
+
+    @property
+    def targets(self):
+        return [target for target, _ in self.calls]
+
+def test_shared_prefix_runs_once_and_restores_to_the_checkpoint():
+    root = build_plan({
+        "A": [_step("start"), _step("login", restore=["home"]), _step("a")],
+        "B": [_step("start"), _step("login"), _step("b")]
+    })
+    assert count_steps(root) == 4
+    recorder = Recorder()
+    outcomes, stats = execute_plan(root, recorder)
+    assert recorder.targets == ["start", "login", "a", "home", "b"]
+    assert recorder.calls[1] == ("login", ("A", "B"))
+    assert recorder.calls[3] == ("home", ())
+    assert stats == {"executed": 5, "restores": 1, "replays": 0, "failed": 0}
+    assert [info["target"] for info in outcomes["B"]["steps"]] == ["start", "login", "b"]
+    assert not outcomes["A"]["failed"] and not outcomes["B"]["failed"]
+
+def test_without_checkpoint_the_shared_steps_are_replayed():
+    root = build_plan({"A": [_step("start"), _step("a")], "B": [_step("start"), _step("b")]})
+    recorder = Recorder()
+    outcomes, stats = execute_plan(root, recorder)
+    assert recorder.targets == ["start", "a", "start", "b"]
+    assert recorder.calls[2] == ("start", ())
+    assert stats["replays"] == 1 and stats["restores"] == 0
+    assert not outcomes["B"]["failed"]
+
+def test_failed_restore_falls_back_to_replay():
+    root = build_plan({
+        "A": [_step("start", restore=["home"]), _step("a")],
+        "B": [_step("start"), _step("b")]
+    })
+    recorder = Recorder(failing=[("home", 1)])
+    outcomes, stats = execute_plan(root, recorder)
+    assert recorder.targets == ["start", "a", "home", "start", "b"]
+    assert stats["restores"] == 1 and stats["replays"] == 1
+    assert not outcomes["B"]["failed"]
+
+def test_shared_step_failure_fails_every_scenario_through_it():
+    root = build_plan({
+        "A": [_step("start"), _step("login"), _step("a")],
+        "B": [_step("start"), _step("login"), _step("b")],
+        "C": [_step("start"), _step("c")]
+    })
+    outcomes, stats = execute_plan(root, Recorder(failing=[("login", 1)]))
+    assert outcomes["A"]["failed"] and outcomes["B"]["failed"]
+    assert [info["target"] for info in outcomes["A"]["steps"]] == ["start", "login"]
+    assert not outcomes["C"]["failed"]
+    assert stats["failed"] == 2
+
+def test_branch_failure_only_fails_its_scenario():
+    root = build_plan({"A": [_step("start"), _step("a")], "B": [_step("start"), _step("b")]})
+    outcomes, _ = execute_plan(root, Recorder(failing=[("a", 1)]))
+    assert outcomes["A"]["failed"]
+    assert not outcomes["B"]["failed"]
+
+def test_failed_replay_is_attributed_to_the_next_branch():
+    root = build_plan({"A": [_step("start"), _step("a")], "B": [_step("start"), _step("b")]})
+    recorder = Recorder(failing=[("start", 2)])
+    outcomes, _ = execute_plan(root, recorder)
+    assert not outcomes["A"]["failed"]
+    assert outcomes["B"]["failed"]
+    assert [info["target"] for info in outcomes["B"]["steps"]] == ["start"]
+    assert "b" not in recorder.targets
+
+def test_siblings_run_in_suite_order():
+    root = build_plan({"B": [_step("start"), _step("b")], "A": [_step("start"), _step("a")]})
+    recorder = Recorder()
+    execute_plan(root, recorder)
+    assert recorder.targets.index("b") < recorder.targets.index("a")
+
+def test_max_failures_leaves_the_rest_without_outcome():
+    root = build_plan({
+        "A": [_step("start"), _step("a")],
+        "B": [_step("start"), _step("b")],
+        "C": [_step("start"), _step("c")]
+    })
+    outcomes, _ = execute_plan(root, Recorder(failing=[("a", 1)]), max_failures=1)
+    assert outcomes["A"]["failed"]
+    assert "B" not in outcomes and "C" not in outcomes
@@ -0,0 +1,68 @@
+import pytest
+from job_queue import SqliteQueue, MAX_ATTEMPTS
+
+EXPIRED = -1  # A lease that has already run out by the next call
+
+@pytest.fixture
+def queue(tmp_path):
+    return SqliteQueue(str(tmp_path / "queue.db"))
+
+def _submit(queue, *names):
+    return queue.submit([{"scenario": name, "steps": [{"action": "wait", "seconds": 0}]} for name in names])
+
+def test_jobs_are_leased_in_order_once(queue):
+    batch_id = _submit(queue, "A", "B")
+    first = queue.lease("w1")
+    second = queue.lease("w2")
+    assert (first["scenario"], second["scenario"]) == ("A", "B")
+    assert first["batch_id"] == batch_id and first["attempt"] == 1
+    assert first["steps"] == [{"action": "wait", "seconds": 0}]
+    assert queue.lease("w3") is None
+
+def test_expired_lease_is_requeued(queue):
+    _submit(queue, "A")
+    job = queue.lease("w1", lease_seconds=EXPIRED)
+    assert not queue.heartbeat(job["job_id"], "w2")
+    retry = queue.lease("w2")
+    assert retry["job_id"] == job["job_id"] and retry["attempt"] == 2
+    assert not queue.heartbeat(job["job_id"], "w1")
+    assert queue.heartbeat(job["job_id"], "w2")
+
+def test_job_is_given_up_after_max_attempts(queue):
+    batch_id = _submit(queue, "A")
+    for _ in range(MAX_ATTEMPTS):
+        assert queue.lease("w1", lease_seconds=EXPIRED) is not None
+    assert queue.lease("w1") is None
+    job = queue.batch(batch_id)["jobs"][0]
+    assert job["status"] == "done" and job["attempts"] == MAX_ATTEMPTS
+    assert job["result"]["status"] == "ERROR"
+
+def test_late_result_is_rejected_once_the_job_is_re_leased(queue):
+    batch_id = _submit(queue, "A")
+    job = queue.lease("w1", lease_seconds=EXPIRED)
+    queue.lease("w2")
+    assert not queue.complete(job["job_id"], "w1", {"name": "A", "status": "PASSED"})
+    assert queue.complete(job["job_id"], "w2", {"name": "A", "status": "FAILED"})
+    done = queue.batch(batch_id)["jobs"][0]
+    assert done["worker"] == "w2" and done["result"]["status"] == "FAILED"
+
+def test_late_result_is_taken_while_the_job_waits_for_a_retry(queue):
+    batch_id = _submit(queue, "A")
+    job = queue.lease("w1", lease_seconds=EXPIRED)
+    assert queue.batch(batch_id)["jobs"][0]["status"] == "queued"
+    assert queue.complete(job["job_id"], "w1", {"name": "A", "status": "PASSED"})
+    assert queue.lease("w2") is None
+
+def test_cancel_drops_queued_and_running_jobs(queue):
+    batch_id = _submit(queue, "A", "B", "C")
+    running = queue.lease("w1")
+    finished = queue.lease("w2")
+    assert queue.complete(finished["job_id"], "w2", {"name": "B", "status": "PASSED"})
+    assert queue.cancel(batch_id) == 2
+    assert queue.lease("w3") is None
+    assert not queue.heartbeat(running["job_id"], "w1")
+    assert not queue.complete(running["job_id"], "w1", {"name": "A", "status": "PASSED"})
+    assert queue.batch(batch_id)["counts"] == {"cancelled": 2, "done": 1}
+
+def test_unknown_batch(queue):
+    assert queue.batch("missing") is None
@@ -0,0 +1,80 @@
+import json
+import random
+import pytest
+import test_sharding
+from test_sharding import plan_shards, select_shard, parse_shard, validate_shard_mode
+
+def _durations(count, seed=0):
+    rng = random.Random(seed)
+    return {f"test_{i:03d}": rng.uniform(500, 60000) for i in range(count)}
+
+def _assert_partition(shards, names):
+    assigned = [name for shard in shards for name in shard]
+    assert sorted(assigned) == sorted(names)
+    assert len(assigned) == len(set(assigned))
+
+@pytest.mark.parametrize("mode", ["balanced", "stable"])
+@pytest.mark.parametrize("count", [1, 3, 8])
+def test_plan_assigns_every_test_exactly_once(mode, count):
+    durations = _durations(50)
+    shards = plan_shards(list(durations), count, mode, durations)
+    assert len(shards) == count
+    _assert_partition([shard["tests"] for shard in shards], list(durations))
+    for shard in shards:
+        assert shard["tests"] == [name for name in durations if name in shard["tests"]]
+        assert shard["expected_ms"] == pytest.approx(sum(durations[name] for name in shard["tests"]), abs=0.1)
+
+def test_more_shards_than_tests_leaves_some_empty():
+    durations = _durations(2)
+    shards = plan_shards(list(durations), 4, "balanced", durations)
+    _assert_partition([shard["tests"] for shard in shards], list(durations))
+    assert sum(1 for shard in shards if not shard["tests"]) == 2
+
+def test_balanced_plan_is_within_the_lpt_bound():
+    durations = _durations(50)
+    shards = plan_shards(list(durations), 4, "balanced", durations)
+    optimum = max(sum(durations.values()) / 4, max(durations.values()))
+    assert max(shard["expected_ms"] for shard in shards) <= optimum * 4 / 3
+
+def test_stable_plan_moves_few_tests_when_one_is_added():
+    durations = _durations(60)
+    before = plan_shards(list(durations), 4, "stable", durations)
+    durations["test_new"] = 5000
+    after = plan_shards(list(durations), 4, "stable", durations)
+    shard_of = lambda shards: {name: i for i, shard in enumerate(shards) for name in shard["tests"]}
+    old, new = shard_of(before), shard_of(after)
+    assert sum(1 for name in old if old[name] != new[name]) <= 6
+
+def test_workers_without_a_plan_cover_every_test(monkeypatch):
+    durations = _durations(40)
+    monkeypatch.setattr(test_sharding, "expected_durations", lambda names: (durations, {}))
+    names = list(durations)
+    _assert_partition([select_shard(names, index, 5) for index in range(1, 6)], names)
+
+def test_workers_sharing_a_plan_file_cover_every_test(tmp_path):
+    durations = _durations(30)
+    plan_path = tmp_path / "shard_plan.json"
+    plan_path.write_text(json.dumps({"shards": plan_shards(list(durations), 3, "balanced", durations)}))
+    # Tests added after planning are spread by name hash, still exactly once.
+    names = list(durations) + ["test_added_1", "test_added_2"]
+    _assert_partition([select_shard(names, index, 3, plan_path=str(plan_path)) for index in range(1, 4)], names)
+
+def test_plan_file_with_another_shard_count_is_rejected(tmp_path):
+    plan_path = tmp_path / "shard_plan.json"
+    plan_path.write_text(json.dumps({"shards": [{"tests": []}, {"tests": []}]}))
+    with pytest.raises(ValueError):
+        select_shard(["a"], 1, 3, plan_path=str(plan_path))
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    assert parse_shard("") is None
+    assert parse_shard(None) is None
+
+@pytest.mark.parametrize("value", ["2", "0/4", "5/4", "1/0", "a/b", "2/4/1", "-1/4"])
+def test_parse_shard_rejects_malformed_values(value):
+    with pytest.raises(ValueError):
+        parse_shard(value)
+
+def test_unknown_shard_mode_is_rejected():
+    with pytest.raises(ValueError):
+        validate_shard_mode("random")
@@ -0,0 +1,61 @@
+import random
+import threading
+from logger import log_action, remove_log_listener
+from event_log import event_context, new_run_id
+from telemetry import RunTelemetry
+
+def _messages(run):
+    with run._lock:
+        return [record["message"] for record in run._logs]
+
+def test_concurrent_runs_only_collect_their_own_logs():
+    runs, ready, done = {}, threading.Barrier(2), threading.Barrier(2)
+
+    def job(name):
+        with event_context(run_id=new_run_id()):
+            runs[name] = RunTelemetry(name)
+            ready.wait()
+            log_action(f"from {name}")
+            done.wait()
+        log_action(f"after {name}")
+
+    threads = [threading.Thread(target=job, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log_action("outside any run")
+    for run in runs.values():
+        remove_log_listener(run._on_log)
+    assert _messages(runs["a"]) == ["from a"]
+    assert _messages(runs["b"]) == ["from b"]
+
+def test_run_without_run_id_collects_its_own_thread():
+    run = RunTelemetry("plain")
+    log_action("same thread")
+    other = threading.Thread(target=log_action, args=("other thread",))
+    other.start()
+    other.join()
+    with event_context(run_id=new_run_id()):
+        log_action("another run")
+    remove_log_listener(run._on_log)
+    assert _messages(run) == ["same thread"]
+
+def test_logs_link_to_the_innermost_window():
+    rng = random.Random(7)
+    run = RunTelemetry("windows")
+    remove_log_listener(run._on_log)
+    windows = []
+    for scenario in range(20):
+        start = scenario * 10.0
+        windows.append((start, start + 9, f"scenario{scenario}"))
+        for step in range(5):
+            windows.append((start + step * 1.5, start + step * 1.5 + rng.uniform(0.5, 1.5), f"s{scenario}.{step}"))
+    run._logs = [{"time": rng.uniform(-5, 205), "level": "INFO", "message": str(i)} for i in range(500)]
+
+    by_length = sorted(windows, key=lambda w: w[1] - w[0])
+    expected = {record["message"]: next((span_id for start, end, span_id in by_length if start <= record["time"] <= end),
+                                        run.suite_span_id)
+                for record in run._logs}
+    logs = run._build_logs(sorted(windows))
+    assert {log["body"]["stringValue"]: log["spanId"] for log in logs} == expected
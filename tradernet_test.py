@@ -2,25 +2,15 @@
 Automated test script for tradernet.com using TachTachAI framework.
 This script creates a test scenario for checking tradernet.com website.
 """
-import json
 import os
 import time
 import pyautogui
-
-# Paths
-SCENARIO_FILE = os.path.join("knowledge_base", "scenarios.json")
+from json_store import update_json
+from scenario_repository import save_scenario, shard_path
 
 def create_tradernet_scenario():
     """Creates a test scenario for tradernet.com"""
 
-    # Load existing scenarios
-    scenarios = {}
-    if os.path.exists(SCENARIO_FILE):
-        with open(SCENARIO_FILE, 'r') as f:
-            content = f.read()
-            if content:
-                scenarios = json.loads(content)
-
     # Define tradernet.com test scenario
     # Note: This scenario takes a screenshot to verify the page loaded
     tradernet_scenario = [
@@ -28,16 +18,13 @@ def create_tradernet_scenario():
         {"action": "assert-visuals", "target": "tradernet_homepage"},  # Visual verification
     ]
 
-    scenarios["tradernet_basic_check"] = tradernet_scenario
-
-    # Save scenarios
-    with open(SCENARIO_FILE, 'w') as f:
-        json.dump(scenarios, f, indent=4)
+    # Save it as its own file in the scenario repository
+    save_scenario("tradernet_basic_check", tradernet_scenario)
 
     print("[+] Created scenario: tradernet_basic_check")
-    print(f"[+] Scenario saved to: {SCENARIO_FILE}")
+    print(f"[+] Scenario saved to: {shard_path('tradernet_basic_check')}")
 
-    return scenarios
+    return {"tradernet_basic_check": tradernet_scenario}
 
 def take_screenshot_for_learning(element_name):
     """Helper to take a screenshot of a specific area for learning"""
@@ -64,17 +51,9 @@ def take_screenshot_for_learning(element_name):
 
     # Update knowledge base
     kb_file = os.path.join(kb_dir, "kb.json")
-    kb = {}
-    if os.path.exists(kb_file):
-        with open(kb_file, 'r') as f:
-            content = f.read()
-            if content:
-                kb = json.loads(content)
-
-    kb[element_name] = img_path
-
-    with open(kb_file, 'w') as f:
-        json.dump(kb, f, indent=4)
+    def add_element(kb):
+        kb[element_name] = img_path
+    update_json(kb_file, add_element)
 
     print(f"[+] Updated knowledge base with '{element_name}'")
 
@@ -1,72 +1,64 @@
-import os
 import json
-from collections import defaultdict
 from logger import log_action
+from history_store import recent_runs, load_aggregates, window_stats, status_history, sketch_quantile
+from report_stream import read_report_header
 
 # --- Constants ---
-HISTORY_DIR = os.path.join("reports", "history")
-TREND_ANALYSIS_WINDOW = 10 # Analyze the last 10 reports
-
-def load_reports(limit=TREND_ANALYSIS_WINDOW):
-    """Loads the most recent reports from the history directory."""
-    if not os.path.exists(HISTORY_DIR):
-        return []
+TREND_ANALYSIS_WINDOW = 1000 # Analyze each test's last 1000 results, for tests seen in the last 1000 runs (aggregates make this as cheap as 10)
+FLAKY_HISTORY_PREVIEW = 20 # Statuses shown per flaky test
 
+def load_aggregates_for_window(limit=TREND_ANALYSIS_WINDOW):
+    """
+    Loads the per-test running aggregates for tests seen in the last `limit` runs.
+    :return: A tuple (list of aggregates, number of runs covered).
+    """
     try:
-        report_files = sorted(
-            [os.path.join(HISTORY_DIR, f) for f in os.listdir(HISTORY_DIR) if f.endswith('.json')],
-            key=os.path.getmtime,
-            reverse=True
-        )
-
-        reports = []
-        for report_file in report_files[:limit]:
-            with open(report_file, 'r') as f:
-                reports.append(json.load(f))
-        return reports
+        runs = recent_runs(limit)
+        if not runs:
+            return [], 0
+        return load_aggregates(active_since=runs[-1][1]), len(runs)
     except Exception as e:
-        log_action(f"Error loading historical reports: {e}", is_error=True)
-        return []
+        log_action(f"Error loading historical aggregates: {e}", is_error=True)
+        return [], 0
 
 def analyze_trends():
     """
     Analyzes historical data to find failure patterns, flaky tests, and performance trends.
+    Works from the aggregates history_store maintains as reports arrive, so the
+    cost depends on the number of tests, not on the size of the window.
     :return: A dictionary containing trend analysis insights.
     """
     log_action("Starting trend analysis...")
-    reports = load_reports()
+    aggregates, run_count = load_aggregates_for_window()
 
-    if not reports:
+    if not aggregates:
         return {"summary": "No historical data to analyze."}
 
-    failure_counts = defaultdict(int)
-    status_history = defaultdict(list)
-    perf_regressions = defaultdict(int)
-
-    for report in reports:
-        for test in report.get("tests", []):
-            test_name = test.get("name")
-            status = test.get("status")
-            if not test_name or not status:
-                continue
+    failure_counts = {}
+    perf_regressions = {}
+    flaky_tests = []
+    durations = []
 
-            status_history[test_name].append(status)
-            if status == "FAILED":
-                failure_counts[test_name] += 1
+    for agg in aggregates:
+        stats = window_stats(agg, TREND_ANALYSIS_WINDOW)
+        test_name = agg["test_name"]
+        if stats["failures"]:
+            failure_counts[test_name] = stats["failures"]
+        if stats["regressions"]:
+            perf_regressions[test_name] = stats["regressions"]
 
-            if test.get("performance", {}).get("has_regression"):
-                perf_regressions[test_name] += 1
+        # Identify flaky tests: it has both passed and failed within the window
+        if stats["results"] > 2 and stats["passes"] and stats["failures"]:
+            flaky_tests.append({
+                "name": test_name,
+                "pass_count": stats["passes"],
+                "fail_count": stats["failures"],
+                "history": status_history(agg, FLAKY_HISTORY_PREVIEW)
+            })
 
-    # Identify flaky tests (alternating PASS/FAIL in recent history)
-    flaky_tests = []
-    for test_name, history in status_history.items():
-        if len(history) > 2 and len(set(history)) > 1:
-             # A simple heuristic: if it has both passed and failed recently
-             if "PASSED" in history and "FAILED" in history:
-                flaky_tests.append({
-                    "name": test_name,
-                    "history": history
-                })
+        p90 = sketch_quantile(agg["duration_sketch"], 0.9)
+        if p90 is not None:
+            durations.append({"name": test_name, "p50_ms": sketch_quantile(agg["duration_sketch"], 0.5), "p90_ms": p90})
 
     # Find most frequent failures
     top_failures = sorted(failure_counts.items(), key=lambda item: item[1], reverse=True)
@@ -77,15 +69,22 @@ def analyze_trends():
         for name, count in perf_regressions.items() if count > 1
     ]
 
+    # Header only: the latest report's tests are already folded into the aggregates.
+    latest = read_report_header() or {}
+
     log_action("Trend analysis complete.")
     return {
-        "analysis_window": len(reports),
+        # The window counts each test's own results; a test that skipped some runs reaches further back.
+        "results_window": TREND_ANALYSIS_WINDOW,
+        "runs_covered": run_count,
+        "latest_run": {"timestamp": latest.get("timestamp"), "summary": latest.get("summary")},
         "flaky_tests": flaky_tests,
         "top_failures": [{"name": name, "fail_count": count} for name, count in top_failures[:3]],
-        "persistent_perf_regressions": persistent_perf_regressions
+        "persistent_perf_regressions": persistent_perf_regressions,
+        "slowest_tests": sorted(durations, key=lambda d: d["p90_ms"], reverse=True)[:3]
     }
 
 if __name__ == '__main__':
     # For standalone testing of this module
     trends = analyze_trends()
-    print(json.dumps(trends, indent=2))
\ No newline at end of file
+    print(json.dumps(trends, indent=2))
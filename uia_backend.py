@@ -1,6 +1,7 @@
 import os
 import platform
 from logger import log_action
+from spans import traced
 
 # --- OS-specific imports and setup ---
 if platform.system() == "Windows":
@@ -18,6 +19,7 @@ _last_found_element = None
 
 # --- Application Management ---
 
+@traced("uia.start")
 def start_app(path, timeout=30):
     """Starts an application and connects to its main window."""
     global _app, _main_window
@@ -33,6 +35,7 @@ def start_app(path, timeout=30):
         log_action(f"Failed to start application {path}: {e}", is_error=True)
         return False
 
+@traced("uia.connect")
 def connect_to_app(title, timeout=30):
     """Connects to an already running application by its window title."""
     global _app, _main_window
@@ -50,6 +53,7 @@ def connect_to_app(title, timeout=30):
 
 # --- Element Finding ---
 
+@traced("uia.lookup")
 def find_element_by_name(name, timeout=10):
     """Finds an element and stores it as the last found element."""
     global _last_found_element
@@ -67,6 +71,7 @@ def find_element_by_name(name, timeout=10):
         _last_found_element = None
         return None
 
+@traced("uia.lookup")
 def find_element_by_automation_id(automation_id, timeout=10):
     """Finds an element and stores it as the last found element."""
     global _last_found_element
@@ -86,6 +91,7 @@ def find_element_by_automation_id(automation_id, timeout=10):
 
 # --- Element Interaction ---
 
+@traced("uia.input")
 def click_element(element=None):
     """Clicks a UIA element. If element is not provided, clicks the last found element."""
     target_element = element or _last_found_element
@@ -100,6 +106,7 @@ def click_element(element=None):
         log_action(f"Failed to click element {target_element}: {e}", is_error=True)
         return False
 
+@traced("uia.input")
 def type_into_element(text, element=None):
     """Types text into a UIA element. If element is not provided, uses the last found one."""
     target_element = element or _last_found_element
@@ -114,6 +121,7 @@ def type_into_element(text, element=None):
         log_action(f"Failed to type into element {target_element}: {e}", is_error=True)
         return False
 
+@traced("uia.read")
 def get_element_text(element=None):
     """Gets the text from a UIA element. If element is not provided, uses the last found one."""
     target_element = element or _last_found_element